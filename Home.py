@@ -1,5 +1,5 @@
 import streamlit as st
-from utils.load_data import load_and_preprocess
+from utils.load_data import invalidate_dataset, load_dataset
 
 # Page config
 st.set_page_config(page_title="Home Credit Dashboard", page_icon="🏦", layout="wide")
@@ -24,12 +24,19 @@ Use the sidebar to navigate between different analysis modules:
 st.markdown("---")
 st.subheader("Upload / Use Default Dataset")
 
+def use_uploaded_file():
+    # A replaced or removed upload's frame is no longer needed
+    previous = st.session_state.get('dataset_source')
+    if previous is not None:
+        invalidate_dataset(previous)
+        st.session_state.get('upload_digests', {}).pop(previous.file_id, None)
+    # Shared with every page; None falls back to the default application_train.csv
+    st.session_state.dataset_source = st.session_state.dataset_upload
+
 # File uploader
-uploaded_file = st.file_uploader("Upload your Home Credit CSV file (application_train.csv)", type=["csv"])
-if uploaded_file:
-    df = load_and_preprocess(uploaded_file)
-else:
-    df = load_and_preprocess()  # Load default application_train.csv from utils
+st.file_uploader("Upload your Home Credit CSV file (application_train.csv)", type=["csv"],
+                 key="dataset_upload", on_change=use_uploaded_file)
+df = load_dataset()
 
 # Show sample data
 st.dataframe(df.head(100))
@@ -0,0 +1,147 @@
+"""
+Per-stage timings of load_and_preprocess: the original pipeline vs the current
+one, then the per-column stages run serially vs on a process pool.
+
+Usage:
+    python -m benchmarks.preprocess [path/to/application_train.csv] [workers]
+"""
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from utils import load_data
+from utils.schema import read_application_csv
+
+
+# ---- Baseline: the original load_and_preprocess, split into stages ----
+def baseline_read(file_path):
+    return pd.read_csv(file_path)
+
+
+def baseline_features(df):
+    df['AGE_YEARS'] = -(df['DAYS_BIRTH'] / 365.25).astype(int)
+    df['EMPLOYMENT_YEARS'] = -(df['DAYS_EMPLOYED'] / 365.25)
+    df['EMPLOYMENT_YEARS'] = df['EMPLOYMENT_YEARS'].clip(lower=0, upper=60)
+    df['DTI'] = df['AMT_ANNUITY'] / df['AMT_INCOME_TOTAL']
+    df['LOAN_TO_INCOME'] = df['AMT_CREDIT'] / df['AMT_INCOME_TOTAL']
+    df['ANNUITY_TO_CREDIT'] = df['AMT_ANNUITY'] / df['AMT_CREDIT']
+    return df
+
+
+def baseline_drop(df):
+    missing = df.isnull().mean() * 100
+    return df.drop(columns=missing[missing > 60].index)
+
+
+def baseline_impute(df):
+    for col in df.columns:
+        if df[col].dtype == "object":
+            df[col] = df[col].fillna(df[col].mode()[0])
+        else:
+            df[col] = df[col].fillna(df[col].median())
+    return df
+
+
+def baseline_rare(df):
+    for col in df.select_dtypes(include="object").columns:
+        freqs = df[col].value_counts(normalize=True)
+        rare = freqs[freqs < 0.01].index
+        df[col] = df[col].replace(rare, "Other")
+    return df
+
+
+def baseline_winsorize(df):
+    for col in ['AMT_INCOME_TOTAL', 'AMT_CREDIT', 'AMT_ANNUITY']:
+        lower, upper = df[col].quantile([0.01, 0.99])
+        df[col] = np.clip(df[col], lower, upper)
+    return df
+
+
+def baseline_bracket(df):
+    q1, q2, q3 = df['AMT_INCOME_TOTAL'].quantile([0.25, 0.5, 0.75])
+    def income_bracket(x):
+        if x <= q1: return "Low"
+        elif x <= q3: return "Mid"
+        else: return "High"
+    df['INCOME_BRACKET'] = df['AMT_INCOME_TOTAL'].apply(income_bracket)
+    return df
+
+
+BASELINE_STAGES = [
+    ("read_csv", baseline_read),
+    ("features", baseline_features),
+    ("drop sparse", baseline_drop),
+    ("impute", baseline_impute),
+    ("rare categories", baseline_rare),
+    ("winsorize", baseline_winsorize),
+    ("income bracket", baseline_bracket),
+]
+
+CURRENT_STAGES = [
+    ("read_csv", lambda path: read_application_csv(path, skip_columns=load_data.skipped_columns(path))),
+    ("features", load_data.add_features),
+    ("drop sparse", load_data.drop_sparse_columns),
+    ("impute", load_data.impute_missing),
+    ("rare categories", load_data.merge_rare_categories),
+    ("winsorize", load_data.winsorize),
+    ("income bracket", load_data.add_income_bracket),
+]
+
+
+def run_stages(df, stages):
+    timings = {}
+    for name, stage in stages:
+        start = time.perf_counter()
+        df = stage(df)
+        timings[name] = time.perf_counter() - start
+    return df, timings
+
+
+def comparable(df):
+    """Categories as plain objects and numbers as float64, so only the values are compared."""
+    df = df.copy()
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype(object)
+        elif pd.api.types.is_numeric_dtype(df[col]):
+            df[col] = df[col].astype("float64")
+    return df
+
+
+def compare_parallel(df, workers):
+    start = time.perf_counter()
+    serial = load_data.winsorize(load_data.merge_rare_categories(load_data.impute_missing(df)))
+    serial_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    parallel = load_data.preprocess_columns(df, workers)
+    parallel_time = time.perf_counter() - start
+
+    pd.testing.assert_frame_equal(serial, parallel)
+    print(f"{'per-column stages':<18}{serial_time:>9.3f}s{parallel_time:>9.3f}s"
+          f"{serial_time / parallel_time:>9.1f}x  ({workers} workers, outputs identical)")
+
+
+def main(file_path=load_data.DEFAULT_DATA_PATH, workers=4):
+    baseline, before = run_stages(file_path, BASELINE_STAGES)
+    current, after = run_stages(file_path, CURRENT_STAGES)
+
+    pd.testing.assert_frame_equal(comparable(baseline[current.columns]), comparable(current))
+
+    print(f"{len(current):,} rows")
+    print(f"{'stage':<18}{'baseline':>10}{'current':>10}{'speedup':>10}")
+    for name, _ in BASELINE_STAGES:
+        print(f"{name:<18}{before[name]:>9.3f}s{after[name]:>9.3f}s{before[name] / after[name]:>9.1f}x")
+    total_before, total_after = sum(before.values()), sum(after.values())
+    print(f"{'total':<18}{total_before:>9.3f}s{total_after:>9.3f}s{total_before / total_after:>9.1f}x")
+    print("values identical")
+
+    print()
+    raw = read_application_csv(file_path, skip_columns=load_data.skipped_columns(file_path))
+    compare_parallel(load_data.drop_sparse_columns(load_data.add_features(raw)), int(workers))
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:])
@@ -1,15 +1,26 @@
 import streamlit as st
 import matplotlib.pyplot as plt
-from utils.load_data import load_and_preprocess
+from utils.load_data import load_dataset
 from utils.filters import global_filters
-import numpy as np
-import pandas as pd
+from utils.chart_cache import chart_backend_toggle, render_chart
+from utils.sections import lazy_section
+from utils.interactive_charts import bar_chart, box_chart, histogram_chart, pie_chart
+from utils.boxplots import draw_boxplot, grouped_box_stats
+from utils.histograms import histogram
+from utils.kpis import OVERVIEW_KPIS, approximate_kpis, interval_help
+from utils.sampling import rerun_when_done
+from utils.warmup import record_visit
 
 # Load and preprocess data
-df = load_and_preprocess()
+df = load_dataset()
+record_visit("overview")
 
 # Apply global filters
-filtered_df = global_filters(df)
+filtered_df, filter_spec = global_filters(df)
+if filtered_df.empty:
+    st.info("No applicants match the selected filters")
+    st.stop()
+chart_backend_toggle()
 
 # Show filtered data
 st.write("Filtered Data", filtered_df.head(10))
@@ -17,16 +28,17 @@ st.write("Filtered Data", filtered_df.head(10))
 st.title("📊 Overview & Data Quality")
 
 #============= KPIs ==============
-total_applicants = filtered_df['SK_ID_CURR'].nunique()
-default_rate = filtered_df['TARGET'].mean() * 100
-repaid_rate = (1 - filtered_df['TARGET'].mean()) * 100
+kpis, intervals, pending = approximate_kpis(df, filtered_df, filter_spec, OVERVIEW_KPIS)
+total_applicants = kpis['total_applicants']
+default_rate = kpis['default_rate']
+repaid_rate = kpis['repaid_rate']
 total_features = filtered_df.shape[1]
 avg_missing_per_feature = filtered_df.isnull().mean().mean() * 100
-numerical_features = filtered_df.select_dtypes(include=['int', 'float']).columns
-categorical_features = filtered_df.select_dtypes(include=['object']).columns
-median_age = filtered_df['AGE_YEARS'].median()
-median_annual_income = filtered_df['AMT_INCOME_TOTAL'].median()
-avg_credit_amount = filtered_df['AMT_CREDIT'].mean()
+numerical_features = filtered_df.select_dtypes(include=['number']).columns
+categorical_features = filtered_df.select_dtypes(include=['object', 'category']).columns
+median_age = kpis['median_age']
+median_annual_income = kpis['median_income']
+avg_credit_amount = kpis['avg_credit']
 
 col1, col2, col3, col4, col5 = st.columns(5)
 col1.metric("Total Applicants", total_applicants)
@@ -38,9 +50,16 @@ col5.metric("Avg Missing %", f"{avg_missing_per_feature:.2f}%")
 col6, col7, col8, col9, col10 = st.columns(5)
 col6.metric("Numerical Features", f"{len(numerical_features):,}")
 col7.metric("Categorical Features", f"{len(categorical_features):,}")
-col8.metric("Median Age", f"{median_age:,.2f} years")
-col9.metric("Median Annual Income", f"${median_annual_income:,.2f}")
-col10.metric("Avg Credit Amount", f"${avg_credit_amount:,.2f}")
+col8.metric("Median Age", f"{median_age:,.2f} years",
+            help=interval_help(intervals, 'median_age', "{:,.2f} years"))
+col9.metric("Median Annual Income", f"${median_annual_income:,.2f}",
+            help=interval_help(intervals, 'median_income', "${:,.2f}"))
+col10.metric("Avg Credit Amount", f"${avg_credit_amount:,.2f}",
+             help=interval_help(intervals, 'avg_credit', "${:,.2f}"))
+
+if pending is not None:
+    st.caption("⏳ KPIs are estimated from a stratified sample (hover for 95% intervals); exact values follow.")
+    rerun_when_done(pending)
 
 st.markdown("---")
 
@@ -71,140 +90,198 @@ def style_axis(ax):
     ax.spines['top'].set_color('none')
 
 # Plotting starts here
-col1, col2 = st.columns(2)
-
-# Pie / Donut — Target distribution
-with col1:
-    target_counts = filtered_df['TARGET'].value_counts()
-    fig1, ax1 = plt.subplots(figsize=(5, 4.5))
-    ax1.pie(
-        target_counts,
-        labels=['Repaid (0)', 'Default (1)'],
-        autopct='%1.1f%%',
-        startangle=90,
-        colors=colors['target'],
-        textprops={'color': 'white'}
-    )
-    ax1.set_title("Target Distribution", fontsize=14, color='white')
-    st.pyplot(fig1)
-
-# Bar — Top 20 missing features
-with col2:
-    missing_features = filtered_df.isnull().mean().sort_values(ascending=False).head(20) * 100
-    if missing_features.sum() == 0:
-        st.write("✅ No missing features!")
-    else:
-        fig2, ax2 = plt.subplots(figsize=(5, 4.5))
-        ax2.barh(missing_features.index[::-1], missing_features.values[::-1], color=colors['missing'])
-        ax2.set_title("Top 20 Missing Features", fontsize=14, color='white')
-        ax2.set_xlabel("Missing %", fontsize=12, color='white')
-        ax2.tick_params(axis='x', colors='white')
-        ax2.tick_params(axis='y', colors='white')
-        style_axis(ax2)
-        st.pyplot(fig2)
-
-col3, col4 = st.columns(2)
-
-# Histogram — Age
-with col3:
-    fig3, ax3 = plt.subplots(figsize=(5, 4.5))
-    ax3.hist(filtered_df['AGE_YEARS'].dropna(), bins=30, color=colors['age'], edgecolor='white')
-    ax3.set_title("Age Distribution", fontsize=14, color='white')
-    ax3.set_xlabel("Age", fontsize=12, color='white')
-    ax3.set_ylabel("Frequency", fontsize=12, color='white')
-    ax3.tick_params(axis='x', colors='white')
-    ax3.tick_params(axis='y', colors='white')
-    style_axis(ax3)
-    st.pyplot(fig3)
-
-# Histogram — Annual Income
-with col4:
-    fig4, ax4 = plt.subplots(figsize=(5, 4.5))
-    ax4.hist(filtered_df['AMT_INCOME_TOTAL'].dropna(), bins=30, color=colors['income'], edgecolor='white')
-    ax4.set_title("Annual Income Distribution", fontsize=14, color='white')
-    ax4.set_xlabel("Income", fontsize=12, color='white')
-    ax4.set_ylabel("Frequency", fontsize=12, color='white')
-    ax4.tick_params(axis='x', colors='white')
-    ax4.tick_params(axis='y', colors='white')
-    style_axis(ax4)
-    st.pyplot(fig4)
-
-col5, col6 = st.columns(2)
-
-# Histogram — Credit Amount
-with col5:
-    fig5, ax5 = plt.subplots(figsize=(5, 4.5))
-    ax5.hist(filtered_df['AMT_CREDIT'].dropna(), bins=30, color=colors['credit'], edgecolor='white')
-    ax5.set_title("Credit Amount Distribution", fontsize=14, color='white')
-    ax5.set_xlabel("Credit Amount", fontsize=12, color='white')
-    ax5.set_ylabel("Frequency", fontsize=12, color='white')
-    ax5.tick_params(axis='x', colors='white')
-    ax5.tick_params(axis='y', colors='white')
-    style_axis(ax5)
-    st.pyplot(fig5)
-
-# Boxplot — Annual Income
-with col6:
-    fig6, ax6 = plt.subplots(figsize=(5, 4.5))
-    ax6.boxplot(filtered_df['AMT_INCOME_TOTAL'].dropna(), vert=True, patch_artist=True,
-                boxprops=dict(facecolor=colors['box_income']))
-    ax6.set_title("Boxplot: Annual Income", fontsize=14, color='white')
-    ax6.set_ylabel("Annual Income", fontsize=12, color='white')
-    ax6.tick_params(axis='y', colors='white')
-    style_axis(ax6)
-    st.pyplot(fig6)
-
-col7, col8 = st.columns(2)
-
-# Boxplot — Credit Amount
-with col7:
-    fig7, ax7 = plt.subplots(figsize=(5, 4.5))
-    ax7.boxplot(filtered_df['AMT_CREDIT'].dropna(), vert=True, patch_artist=True,
-                boxprops=dict(facecolor=colors['box_credit']))
-    ax7.set_title("Boxplot: Credit Amount", fontsize=14, color='white')
-    ax7.set_ylabel("Credit Amount", fontsize=12, color='white')
-    ax7.tick_params(axis='y', colors='white')
-    style_axis(ax7)
-    st.pyplot(fig7)
-
-# Countplot — Gender
-with col8:
-    gender_counts = filtered_df['CODE_GENDER'].value_counts()
-    fig8, ax8 = plt.subplots(figsize=(5, 4.5))
-    bars = ax8.bar(gender_counts.index, gender_counts.values, color=colors['gender'])
-    ax8.set_title("Gender Distribution", fontsize=14, color='white')
-    ax8.set_ylabel("Count", fontsize=12, color='white')
-    ax8.tick_params(axis='x', colors='white')
-    ax8.tick_params(axis='y', colors='white')
-    style_axis(ax8)
-    ax8.legend(bars, ["Female", "Male", "Other"], fontsize=10)
-    st.pyplot(fig8)
-
-col9, col10 = st.columns(2)
-
-# Countplot — Family Status
-with col9:
-    fam_counts = filtered_df['NAME_FAMILY_STATUS'].value_counts()
-    fig9, ax9 = plt.subplots(figsize=(6, 4.5))
-    bars = ax9.bar(fam_counts.index, fam_counts.values, color=colors['family'])
-    ax9.set_title("Family Status", fontsize=14, color='white')
-    ax9.set_ylabel("Count", fontsize=12, color='white')
-    ax9.tick_params(axis='x', rotation=45, colors='white')
-    ax9.tick_params(axis='y', colors='white')
-    style_axis(ax9)
-    st.pyplot(fig9)
-
-# Countplot — Education Type
-with col10:
-    edu_counts = filtered_df['NAME_EDUCATION_TYPE'].value_counts()
-    fig10, ax10 = plt.subplots(figsize=(6, 4.5))
-    bars = ax10.bar(edu_counts.index, edu_counts.values, color=colors['education'])
-    ax10.set_title("Education Type", fontsize=14, color='white')
-    ax10.set_ylabel("Count", fontsize=12, color='white')
-    ax10.tick_params(axis='x', rotation=90, colors='white')
-    ax10.tick_params(axis='y', colors='white')
-    style_axis(ax10)
-    st.pyplot(fig10)
+def show_target_and_missing():
+    col1, col2 = st.columns(2)
+
+    # Pie / Donut — Target distribution
+    with col1:
+        target_counts = filtered_df['TARGET'].value_counts()
+        def plot_target_distribution():
+            fig1, ax1 = plt.subplots(figsize=(5, 4.5))
+            ax1.pie(
+                target_counts,
+                labels=['Repaid (0)', 'Default (1)'],
+                autopct='%1.1f%%',
+                startangle=90,
+                colors=colors['target'],
+                textprops={'color': 'white'}
+            )
+            ax1.set_title("Target Distribution", fontsize=14, color='white')
+            return fig1
+        render_chart("overview/target_distribution", plot_target_distribution, df, filter_spec,
+                     interactive=lambda: pie_chart(target_counts.sort_index().rename({0: 'Repaid (0)', 1: 'Default (1)'}),
+                                                   colors['target'], title="Target Distribution"))
+
+    # Bar — Top 20 missing features
+    with col2:
+        missing_features = filtered_df.isnull().mean().sort_values(ascending=False).head(20) * 100
+        if missing_features.sum() == 0:
+            st.write("✅ No missing features!")
+        else:
+            def plot_missing_features():
+                fig2, ax2 = plt.subplots(figsize=(5, 4.5))
+                ax2.barh(missing_features.index[::-1], missing_features.values[::-1], color=colors['missing'])
+                ax2.set_title("Top 20 Missing Features", fontsize=14, color='white')
+                ax2.set_xlabel("Missing %", fontsize=12, color='white')
+                ax2.tick_params(axis='x', colors='white')
+                ax2.tick_params(axis='y', colors='white')
+                style_axis(ax2)
+                return fig2
+            render_chart("overview/missing_features", plot_missing_features, df, filter_spec,
+                         interactive=lambda: bar_chart(missing_features, [colors['missing']], "Feature", "Missing %",
+                                                       title="Top 20 Missing Features", horizontal=True))
+lazy_section("Target & missing values", show_target_and_missing, key="overview/target_and_missing", expanded=True)
+
+def show_age_and_income():
+    col3, col4 = st.columns(2)
+
+    # Histogram — Age
+    with col3:
+        def plot_age_histogram():
+            fig3, ax3 = plt.subplots(figsize=(5, 4.5))
+            counts, edges = histogram(df, 'AGE_YEARS', filter_spec)
+            ax3.hist(edges[:-1], bins=edges, weights=counts, color=colors['age'], edgecolor='white')
+            ax3.set_title("Age Distribution", fontsize=14, color='white')
+            ax3.set_xlabel("Age", fontsize=12, color='white')
+            ax3.set_ylabel("Frequency", fontsize=12, color='white')
+            ax3.tick_params(axis='x', colors='white')
+            ax3.tick_params(axis='y', colors='white')
+            style_axis(ax3)
+            return fig3
+        render_chart("overview/age_histogram", plot_age_histogram, df, filter_spec,
+                     interactive=lambda: histogram_chart(*histogram(df, 'AGE_YEARS', filter_spec), [colors['age']], "Age",
+                                                         "Frequency", title="Age Distribution"))
+
+    # Histogram — Annual Income
+    with col4:
+        def plot_income_histogram():
+            fig4, ax4 = plt.subplots(figsize=(5, 4.5))
+            counts, edges = histogram(df, 'AMT_INCOME_TOTAL', filter_spec)
+            ax4.hist(edges[:-1], bins=edges, weights=counts, color=colors['income'], edgecolor='white')
+            ax4.set_title("Annual Income Distribution", fontsize=14, color='white')
+            ax4.set_xlabel("Income", fontsize=12, color='white')
+            ax4.set_ylabel("Frequency", fontsize=12, color='white')
+            ax4.tick_params(axis='x', colors='white')
+            ax4.tick_params(axis='y', colors='white')
+            style_axis(ax4)
+            return fig4
+        render_chart("overview/income_histogram", plot_income_histogram, df, filter_spec,
+                     interactive=lambda: histogram_chart(*histogram(df, 'AMT_INCOME_TOTAL', filter_spec),
+                                                         [colors['income']], "Income", "Frequency",
+                                                         title="Annual Income Distribution"))
+lazy_section("Age & income distributions", show_age_and_income, key="overview/age_and_income")
+
+def show_credit_and_income_spread():
+    col5, col6 = st.columns(2)
+
+    # Histogram — Credit Amount
+    with col5:
+        def plot_credit_histogram():
+            fig5, ax5 = plt.subplots(figsize=(5, 4.5))
+            counts, edges = histogram(df, 'AMT_CREDIT', filter_spec)
+            ax5.hist(edges[:-1], bins=edges, weights=counts, color=colors['credit'], edgecolor='white')
+            ax5.set_title("Credit Amount Distribution", fontsize=14, color='white')
+            ax5.set_xlabel("Credit Amount", fontsize=12, color='white')
+            ax5.set_ylabel("Frequency", fontsize=12, color='white')
+            ax5.tick_params(axis='x', colors='white')
+            ax5.tick_params(axis='y', colors='white')
+            style_axis(ax5)
+            return fig5
+        render_chart("overview/credit_histogram", plot_credit_histogram, df, filter_spec,
+                     interactive=lambda: histogram_chart(*histogram(df, 'AMT_CREDIT', filter_spec), [colors['credit']],
+                                                         "Credit Amount", "Frequency",
+                                                         title="Credit Amount Distribution"))
+
+    # Boxplot — Annual Income
+    with col6:
+        def plot_income_boxplot():
+            fig6, ax6 = plt.subplots(figsize=(5, 4.5))
+            draw_boxplot(ax6, grouped_box_stats(df, 'AMT_INCOME_TOTAL', spec=filter_spec),
+                         boxprops=dict(facecolor=colors['box_income']))
+            ax6.set_title("Boxplot: Annual Income", fontsize=14, color='white')
+            ax6.set_ylabel("Annual Income", fontsize=12, color='white')
+            ax6.tick_params(axis='y', colors='white')
+            style_axis(ax6)
+            return fig6
+        render_chart("overview/income_boxplot", plot_income_boxplot, df, filter_spec,
+                     interactive=lambda: box_chart(grouped_box_stats(df, 'AMT_INCOME_TOTAL', spec=filter_spec),
+                                                   [colors['box_income']], "Annual Income",
+                                                   title="Boxplot: Annual Income", labels={None: ""}))
+lazy_section("Credit amount & income spread", show_credit_and_income_spread, key="overview/credit_and_income_spread")
+
+def show_credit_spread_and_gender():
+    col7, col8 = st.columns(2)
+
+    # Boxplot — Credit Amount
+    with col7:
+        def plot_credit_boxplot():
+            fig7, ax7 = plt.subplots(figsize=(5, 4.5))
+            draw_boxplot(ax7, grouped_box_stats(df, 'AMT_CREDIT', spec=filter_spec),
+                         boxprops=dict(facecolor=colors['box_credit']))
+            ax7.set_title("Boxplot: Credit Amount", fontsize=14, color='white')
+            ax7.set_ylabel("Credit Amount", fontsize=12, color='white')
+            ax7.tick_params(axis='y', colors='white')
+            style_axis(ax7)
+            return fig7
+        render_chart("overview/credit_boxplot", plot_credit_boxplot, df, filter_spec,
+                     interactive=lambda: box_chart(grouped_box_stats(df, 'AMT_CREDIT', spec=filter_spec),
+                                                   [colors['box_credit']], "Credit Amount",
+                                                   title="Boxplot: Credit Amount", labels={None: ""}))
+
+    # Countplot — Gender
+    with col8:
+        gender_counts = filtered_df['CODE_GENDER'].value_counts().loc[lambda counts: counts > 0]
+        def plot_gender_counts():
+            fig8, ax8 = plt.subplots(figsize=(5, 4.5))
+            bars = ax8.bar(gender_counts.index, gender_counts.values, color=colors['gender'])
+            ax8.set_title("Gender Distribution", fontsize=14, color='white')
+            ax8.set_ylabel("Count", fontsize=12, color='white')
+            ax8.tick_params(axis='x', colors='white')
+            ax8.tick_params(axis='y', colors='white')
+            style_axis(ax8)
+            ax8.legend(bars, ["Female", "Male", "Other"], fontsize=10)
+            return fig8
+        render_chart("overview/gender_counts", plot_gender_counts, df, filter_spec,
+                     interactive=lambda: bar_chart(gender_counts,
+                                                   colors['gender'], "Gender", "Count", title="Gender Distribution"))
+lazy_section("Credit spread & gender", show_credit_spread_and_gender, key="overview/credit_spread_and_gender")
+
+def show_family_and_education():
+    col9, col10 = st.columns(2)
+
+    # Countplot — Family Status
+    with col9:
+        fam_counts = filtered_df['NAME_FAMILY_STATUS'].value_counts().loc[lambda counts: counts > 0]
+        def plot_family_status_counts():
+            fig9, ax9 = plt.subplots(figsize=(6, 4.5))
+            bars = ax9.bar(fam_counts.index, fam_counts.values, color=colors['family'])
+            ax9.set_title("Family Status", fontsize=14, color='white')
+            ax9.set_ylabel("Count", fontsize=12, color='white')
+            ax9.tick_params(axis='x', rotation=45, colors='white')
+            ax9.tick_params(axis='y', colors='white')
+            style_axis(ax9)
+            return fig9
+        render_chart("overview/family_status_counts", plot_family_status_counts, df, filter_spec,
+                     interactive=lambda: bar_chart(fam_counts,
+                                                   [colors['family']], "Family Status", "Count", title="Family Status"))
+
+    # Countplot — Education Type
+    with col10:
+        edu_counts = filtered_df['NAME_EDUCATION_TYPE'].value_counts().loc[lambda counts: counts > 0]
+        def plot_education_counts():
+            fig10, ax10 = plt.subplots(figsize=(6, 4.5))
+            bars = ax10.bar(edu_counts.index, edu_counts.values, color=colors['education'])
+            ax10.set_title("Education Type", fontsize=14, color='white')
+            ax10.set_ylabel("Count", fontsize=12, color='white')
+            ax10.tick_params(axis='x', rotation=90, colors='white')
+            ax10.tick_params(axis='y', colors='white')
+            style_axis(ax10)
+            return fig10
+        render_chart("overview/education_counts", plot_education_counts, df, filter_spec,
+                     interactive=lambda: bar_chart(edu_counts,
+                                                   [colors['education']], "Education Type", "Count",
+                                                   title="Education Type"))
+lazy_section("Family status & education", show_family_and_education, key="overview/family_and_education")
 
 st.markdown("---")
 
@@ -1,16 +1,28 @@
 import streamlit as st
 import seaborn as sns
 import matplotlib.pyplot as plt
-from utils.load_data import load_and_preprocess
+from utils.load_data import load_dataset
 from utils.filters import global_filters
+from utils.chart_cache import chart_backend_toggle, render_chart
+from utils.sections import lazy_section
+from utils.interactive_charts import bar_chart, box_chart, histogram_chart, stacked_bar_chart, violin_chart
+from utils.boxplots import draw_boxplot, grouped_box_stats
+from utils.histograms import histogram
+from utils.cube import dataset_cube
+from utils.density import draw_violins, violin_densities
+from utils.warmup import record_visit
 import pandas as pd
-import numpy as np
 
 
-df = load_and_preprocess()
+df = load_dataset()
+record_visit("risk")
 
 # Apply global filters
-filtered_df = global_filters(df)
+filtered_df, filter_spec = global_filters(df)
+if filtered_df.empty:
+    st.info("No applicants match the selected filters")
+    st.stop()
+chart_backend_toggle()
 
 # Show filtered data
 st.write("Filtered Data", filtered_df.head(10))
@@ -20,17 +32,19 @@ st.title("🎯Target & Risk Segmentation")
 
 #=============KPIs==============
 
-total_defaults = df['TARGET'].sum()
-default_rate = df['TARGET'].mean()*100
-default_by_gender = df.groupby('CODE_GENDER')['TARGET'].mean()*100
-default_by_education = df.groupby('NAME_EDUCATION_TYPE')['TARGET'].mean()*100
-default_by_family = df.groupby('NAME_FAMILY_STATUS')['TARGET'].mean()*100
-default_by_housing = df.groupby('NAME_HOUSING_TYPE')['TARGET'].mean()*100
-defaulters = df[df['TARGET'] == 1]
-avg_income_defaulters = defaulters['AMT_INCOME_TOTAL'].mean()
-avg_credit_defaulters = defaulters['AMT_CREDIT'].mean()
-avg_annuity_defaulters = defaulters['AMT_ANNUITY'].mean()
-avg_employment_years_defaulters = defaulters['EMPLOYMENT_YEARS'].mean()
+# Counts and default rates come from the pre-aggregated cube, filtered by filter_spec
+cube = dataset_cube(df)
+totals = cube.totals(filter_spec)
+total_defaults = int(totals['TARGET'])
+default_rate = totals['TARGET'] / totals['count'] * 100
+default_by_gender = cube.rate('CODE_GENDER', spec=filter_spec) * 100
+default_by_education = cube.rate('NAME_EDUCATION_TYPE', spec=filter_spec) * 100
+default_by_family = cube.rate('NAME_FAMILY_STATUS', spec=filter_spec) * 100
+default_by_housing = cube.rate('NAME_HOUSING_TYPE', spec=filter_spec) * 100
+avg_income_defaulters = totals['AMT_INCOME_TOTAL_TARGET'] / totals['TARGET']
+avg_credit_defaulters = totals['AMT_CREDIT_TARGET'] / totals['TARGET']
+avg_annuity_defaulters = totals['AMT_ANNUITY_TARGET'] / totals['TARGET']
+avg_employment_years_defaulters = totals['EMPLOYMENT_YEARS_TARGET'] / totals['TARGET']
 
 
 col1,col2,col3,col4,col5 = st.columns(5)
@@ -52,144 +66,204 @@ st.markdown("---")
 
 #1. Bar — Counts: Default vs Repaid
 
-col1, col2 = st.columns(2)
-with col1:
-    target_counts = df['TARGET'].value_counts().sort_index()
-    fig1, ax1 = plt.subplots(figsize=(10, 8))
-    bars = ax1.bar(["Repaid (0)", "Default (1)"], target_counts.values,
-                   color=["#07F10F", "#F31505"])
-    ax1.set_title("Counts: Default vs Repaid", fontsize=18)
-    ax1.set_ylabel("Count",fontsize=16)
-    ax1.grid(True, which='both', axis='y', linestyle='-')
-    ax1.tick_params(axis='x', labelsize=14)
-    st.pyplot(fig1)
-
-#2. Bar — Default % by Gender
-with col2:
-    gender_default = df.groupby('CODE_GENDER')['TARGET'].mean() * 100
-    fig2, ax2 = plt.subplots(figsize=(10, 8))
-    bars = ax2.bar(gender_default.index, gender_default.values,
-                   color=["#038DFD", "#FF6600"])
-    ax2.set_title("Default % by Gender", fontsize=18)
-    ax2.set_ylabel("Default Rate (%)", fontsize=14)
-    ax2.grid(True, which='both', axis='y', linestyle='-')
-    ax2.tick_params(axis='x', labelsize=14)
-    st.pyplot(fig2)
-
-col3, col4 = st.columns(2)
-
-#3. Bar — Default % by Education
-with col3:
-    edu_default = df.groupby('NAME_EDUCATION_TYPE')['TARGET'].mean().sort_values(ascending=False) * 100
-    fig3, ax3 = plt.subplots(figsize=(10, 8))
-    bars = ax3.bar(edu_default.index, edu_default.values, color="#D607FA")
-    ax3.set_title("Default % by Education", fontsize=18)
-    ax3.set_ylabel("Default Rate (%)", fontsize=16)
-    ax3.grid(True, which='both', axis='y', linestyle='-')
-    ax3.tick_params(axis='x', labelsize=14, rotation=90)
-    st.pyplot(fig3)
-
-#4. Bar — Default % by Family Status
-with col4:
-    fam_default = df.groupby('NAME_FAMILY_STATUS')['TARGET'].mean().sort_values(ascending=False) * 100
-    fig4, ax4 = plt.subplots(figsize=(10, 8))
-    bars = ax4.bar(fam_default.index, fam_default.values, color="#3C07FA")
-    ax4.set_title("Default % by Family Status", fontsize=18)
-    ax4.set_ylabel("Default Rate (%)", fontsize=16)
-    ax4.grid(True, which='both', axis='y', linestyle='-')
-    ax4.tick_params(axis='x', labelsize=14, rotation=90)
-    st.pyplot(fig4)
-
-col5, col6 = st.columns(2)
-
-#5. Bar — Default % by Housing Type
-with col5:
-    housing_default = df.groupby('NAME_HOUSING_TYPE')['TARGET'].mean().sort_values(ascending=False) * 100
-    fig5, ax5 = plt.subplots(figsize=(10, 8))
-    bars = ax5.bar(housing_default.index, housing_default.values, color="#FA8707")
-    ax5.set_title("Default % by Housing Type", fontsize=18)
-    ax5.set_ylabel("Default Rate (%)", fontsize=16)
-    ax5.grid(True, which='both', axis='y', linestyle='-')
-    ax5.tick_params(axis='x', labelsize=14, rotation=90)
-    st.pyplot(fig5)
-
-#Boxplot — Income by Target
-with col6:
-    fig6, ax6 = plt.subplots(figsize=(14, 12))
-    ax6.boxplot([df[df['TARGET'] == 0]['AMT_INCOME_TOTAL'],
-                  df[df['TARGET'] == 1]['AMT_INCOME_TOTAL']],
-                 labels=['Repaid (0)', 'Default (1)'],
-                 patch_artist=True,
-                 boxprops=dict(facecolor="#06F30E"),
-                 medianprops=dict(color='black'))
-    ax6.set_title("Income Distribution by Target", fontsize=24)
-    ax6.set_ylabel("Annual Income", fontsize=20)
-    ax6.tick_params(axis='x', labelsize=17)
-    st.pyplot(fig6)
-
-col7, col8 = st.columns(2)
-
-# Boxplot — Credit by Target
-with col7:
-    fig7, ax7 = plt.subplots(figsize=(14, 12))
-    ax7.boxplot([df[df['TARGET'] == 0]['AMT_CREDIT'],
-                  df[df['TARGET'] == 1]['AMT_CREDIT']],
-                 labels=['Repaid (0)', 'Default (1)'],
-                 patch_artist=True,
-                 boxprops=dict(facecolor="#1606F3"),
-                 medianprops=dict(color='yellow'))
-    ax7.set_title("Credit Amount Distribution by Target", fontsize=24)
-    ax7.set_ylabel("Credit Amount", fontsize=20)
-    ax7.tick_params(axis='x', labelsize=17)
-    st.pyplot(fig7)
-
-# Violin Plot — Age vs Target
-with col8:
-    fig8, ax8 = plt.subplots(figsize=(14, 12))
-    sns.violinplot(x='TARGET', y='AGE_YEARS', data=df, ax=ax8, palette=["#1606F3", "#F306A8"])
-    ax8.set_title("Age Distribution by Target", fontsize=24)
-    ax8.set_ylabel("Age", fontsize=22)
-    ax8.set_xlabel("Target", fontsize=20)
-    ax8.set_xticklabels(["Repaid (0)", "Default (1)"])
-    ax8.tick_params(axis='x', labelsize=17)
-    st.pyplot(fig8)
-
-col9, col10 = st.columns(2)
-
-# Stacked Histogram — Employment Years by Target
-with col9:
-    bins = [0, 1, 3, 5, 10, 20, 30, 40, 50]  # Define bins for employment years
-    fig9, ax9 = plt.subplots(figsize=(14, 12))
-    
-    ax9.hist([df[df['TARGET'] == 0]['EMPLOYMENT_YEARS'],
-              df[df['TARGET'] == 1]['EMPLOYMENT_YEARS']],
-             bins=bins,
-             stacked=True,
-             color=['#1606F3', "#F32606"],
-             label=['Repaid (0)', 'Default (1)'])
-    
-    ax9.set_xlabel("Employment Years", fontsize=20)
-    ax9.set_ylabel("Count", fontsize=20)
-    ax9.grid(True, which='both', axis='y', linestyle='-')
-    ax9.set_title("Employment Years Distribution by Target", fontsize=24)
-    ax9.legend(fontsize=16)
-    st.pyplot(fig9)
-
-# Stacked Bar Chart — Name Contract Type by Target
-with col10:
-    contract_counts = df.groupby(['NAME_CONTRACT_TYPE', 'TARGET']).size().unstack(fill_value=0)
+def show_defaults_and_gender():
+    col1, col2 = st.columns(2)
+    with col1:
+        target_counts = pd.Series([totals['count'] - totals['TARGET'], totals['TARGET']], index=[0, 1])
+        def plot_default_counts():
+            fig1, ax1 = plt.subplots(figsize=(10, 8))
+            bars = ax1.bar(["Repaid (0)", "Default (1)"], target_counts.values,
+                           color=["#07F10F", "#F31505"])
+            ax1.set_title("Counts: Default vs Repaid", fontsize=18)
+            ax1.set_ylabel("Count",fontsize=16)
+            ax1.grid(True, which='both', axis='y', linestyle='-')
+            ax1.tick_params(axis='x', labelsize=14)
+            return fig1
+        render_chart("risk/default_counts", plot_default_counts, df, filter_spec,
+                     interactive=lambda: bar_chart(target_counts.set_axis(["Repaid (0)", "Default (1)"]),
+                                                   ["#07F10F", "#F31505"], "Target", "Count",
+                                                   title="Counts: Default vs Repaid"))
+
+    #2. Bar — Default % by Gender
+    with col2:
+        def plot_default_by_gender():
+            gender_default = default_by_gender
+            fig2, ax2 = plt.subplots(figsize=(10, 8))
+            bars = ax2.bar(gender_default.index, gender_default.values,
+                           color=["#038DFD", "#FF6600"])
+            ax2.set_title("Default % by Gender", fontsize=18)
+            ax2.set_ylabel("Default Rate (%)", fontsize=14)
+            ax2.grid(True, which='both', axis='y', linestyle='-')
+            ax2.tick_params(axis='x', labelsize=14)
+            return fig2
+        render_chart("risk/default_by_gender", plot_default_by_gender, df, filter_spec,
+                     interactive=lambda: bar_chart(default_by_gender, ["#038DFD", "#FF6600"], "Gender",
+                                                   "Default Rate (%)", title="Default % by Gender"))
+lazy_section("Defaults & gender", show_defaults_and_gender, key="risk/defaults_and_gender", expanded=True)
+
+def show_education_and_family():
+    col3, col4 = st.columns(2)
+
+    #3. Bar — Default % by Education
+    with col3:
+        def plot_default_by_education():
+            edu_default = default_by_education.sort_values(ascending=False)
+            fig3, ax3 = plt.subplots(figsize=(10, 8))
+            bars = ax3.bar(edu_default.index, edu_default.values, color="#D607FA")
+            ax3.set_title("Default % by Education", fontsize=18)
+            ax3.set_ylabel("Default Rate (%)", fontsize=16)
+            ax3.grid(True, which='both', axis='y', linestyle='-')
+            ax3.tick_params(axis='x', labelsize=14, rotation=90)
+            return fig3
+        render_chart("risk/default_by_education", plot_default_by_education, df, filter_spec,
+                     interactive=lambda: bar_chart(default_by_education.sort_values(ascending=False), ["#D607FA"],
+                                                   "Education", "Default Rate (%)", title="Default % by Education"))
+
+    #4. Bar — Default % by Family Status
+    with col4:
+        def plot_default_by_family_status():
+            fam_default = default_by_family.sort_values(ascending=False)
+            fig4, ax4 = plt.subplots(figsize=(10, 8))
+            bars = ax4.bar(fam_default.index, fam_default.values, color="#3C07FA")
+            ax4.set_title("Default % by Family Status", fontsize=18)
+            ax4.set_ylabel("Default Rate (%)", fontsize=16)
+            ax4.grid(True, which='both', axis='y', linestyle='-')
+            ax4.tick_params(axis='x', labelsize=14, rotation=90)
+            return fig4
+        render_chart("risk/default_by_family_status", plot_default_by_family_status, df, filter_spec,
+                     interactive=lambda: bar_chart(default_by_family.sort_values(ascending=False), ["#3C07FA"],
+                                                   "Family Status", "Default Rate (%)",
+                                                   title="Default % by Family Status"))
+lazy_section("Education & family status", show_education_and_family, key="risk/education_and_family")
+
+def show_housing_and_income():
+    col5, col6 = st.columns(2)
+
+    #5. Bar — Default % by Housing Type
+    with col5:
+        def plot_default_by_housing():
+            housing_default = default_by_housing.sort_values(ascending=False)
+            fig5, ax5 = plt.subplots(figsize=(10, 8))
+            bars = ax5.bar(housing_default.index, housing_default.values, color="#FA8707")
+            ax5.set_title("Default % by Housing Type", fontsize=18)
+            ax5.set_ylabel("Default Rate (%)", fontsize=16)
+            ax5.grid(True, which='both', axis='y', linestyle='-')
+            ax5.tick_params(axis='x', labelsize=14, rotation=90)
+            return fig5
+        render_chart("risk/default_by_housing", plot_default_by_housing, df, filter_spec,
+                     interactive=lambda: bar_chart(default_by_housing.sort_values(ascending=False), ["#FA8707"],
+                                                   "Housing Type", "Default Rate (%)", title="Default % by Housing Type"))
+
+    #Boxplot — Income by Target
+    with col6:
+        def plot_income_by_target():
+            fig6, ax6 = plt.subplots(figsize=(14, 12))
+            draw_boxplot(ax6, grouped_box_stats(df, 'AMT_INCOME_TOTAL', by='TARGET', spec=filter_spec),
+                         labels={0: 'Repaid (0)', 1: 'Default (1)'},
+                         boxprops=dict(facecolor="#06F30E"),
+                         medianprops=dict(color='black'))
+            ax6.set_title("Income Distribution by Target", fontsize=24)
+            ax6.set_ylabel("Annual Income", fontsize=20)
+            ax6.tick_params(axis='x', labelsize=17)
+            return fig6
+        render_chart("risk/income_by_target", plot_income_by_target, df, filter_spec,
+                     interactive=lambda: box_chart(grouped_box_stats(df, 'AMT_INCOME_TOTAL', by='TARGET',
+                                                                     spec=filter_spec), ["#06F30E"],
+                                                   "Annual Income", title="Income Distribution by Target",
+                                                   labels={0: 'Repaid (0)', 1: 'Default (1)'}))
+lazy_section("Housing & income by target", show_housing_and_income, key="risk/housing_and_income")
+
+def show_credit_and_age():
+    col7, col8 = st.columns(2)
+
+    # Boxplot — Credit by Target
+    with col7:
+        def plot_credit_by_target():
+            fig7, ax7 = plt.subplots(figsize=(14, 12))
+            draw_boxplot(ax7, grouped_box_stats(df, 'AMT_CREDIT', by='TARGET', spec=filter_spec),
+                         labels={0: 'Repaid (0)', 1: 'Default (1)'},
+                         boxprops=dict(facecolor="#1606F3"),
+                         medianprops=dict(color='yellow'))
+            ax7.set_title("Credit Amount Distribution by Target", fontsize=24)
+            ax7.set_ylabel("Credit Amount", fontsize=20)
+            ax7.tick_params(axis='x', labelsize=17)
+            return fig7
+        render_chart("risk/credit_by_target", plot_credit_by_target, df, filter_spec,
+                     interactive=lambda: box_chart(grouped_box_stats(df, 'AMT_CREDIT', by='TARGET', spec=filter_spec),
+                                                   ["#1606F3"],
+                                                   "Credit Amount", title="Credit Amount Distribution by Target",
+                                                   labels={0: 'Repaid (0)', 1: 'Default (1)'}))
+
+    # Violin Plot — Age vs Target
+    with col8:
+        def plot_age_by_target():
+            fig8, ax8 = plt.subplots(figsize=(14, 12))
+            draw_violins(ax8, violin_densities(df, 'AGE_YEARS', by='TARGET', spec=filter_spec),
+                         sns.color_palette(["#1606F3", "#F306A8"], desat=0.75))
+            ax8.set_title("Age Distribution by Target", fontsize=24)
+            ax8.set_ylabel("Age", fontsize=22)
+            ax8.set_xlabel("Target", fontsize=20)
+            ax8.set_xticklabels(["Repaid (0)", "Default (1)"])
+            ax8.tick_params(axis='x', labelsize=17)
+            return fig8
+        render_chart("risk/age_by_target", plot_age_by_target, df, filter_spec,
+                     interactive=lambda: violin_chart(violin_densities(df, 'AGE_YEARS', by='TARGET', spec=filter_spec),
+                                                      ["#1606F3", "#F306A8"], "Age", "Target",
+                                                      title="Age Distribution by Target",
+                                                      labels=["Repaid (0)", "Default (1)"]))
+lazy_section("Credit & age by target", show_credit_and_age, key="risk/credit_and_age")
+
+def show_employment_and_contract():
+    col9, col10 = st.columns(2)
+
+    # Stacked Histogram — Employment Years by Target
+    with col9:
+        def plot_employment_by_target():
+            # Bins for employment years are fixed in utils.histograms.HISTOGRAM_EDGES
+            counts, bins = histogram(df, 'EMPLOYMENT_YEARS', filter_spec, by_target=True)
+            fig9, ax9 = plt.subplots(figsize=(14, 12))
     
-    fig10, ax10 = plt.subplots(figsize=(10, 8))
-    contract_counts.plot(kind='bar', stacked=True, color=["#0EF306", '#F306A8'], ax=ax10)
+            ax9.hist([bins[:-1], bins[:-1]],
+                     bins=bins,
+                     weights=[counts[0], counts[1]],
+                     stacked=True,
+                     color=['#1606F3', "#F32606"],
+                     label=['Repaid (0)', 'Default (1)'])
     
-    ax10.set_xlabel("Contract Type", fontsize=20)
-    ax10.set_ylabel("Count", fontsize=20)
-    ax10.grid(True, which='both', axis='y', linestyle='-')
-    ax10.set_title("Contract Type vs Target", fontsize=24)
-    ax10.legend(['Repaid (0)', 'Default (1)'], fontsize=16)
-    ax10.tick_params(axis='x', rotation=0)
+            ax9.set_xlabel("Employment Years", fontsize=20)
+            ax9.set_ylabel("Count", fontsize=20)
+            ax9.grid(True, which='both', axis='y', linestyle='-')
+            ax9.set_title("Employment Years Distribution by Target", fontsize=24)
+            ax9.legend(fontsize=16)
+            return fig9
+        render_chart("risk/employment_by_target", plot_employment_by_target, df, filter_spec,
+                     interactive=lambda: histogram_chart(*histogram(df, 'EMPLOYMENT_YEARS', filter_spec,
+                                                                    by_target=True),
+                                                         ['#1606F3', "#F32606"], "Employment Years",
+                                                         title="Employment Years Distribution by Target",
+                                                         labels={0: 'Repaid (0)', 1: 'Default (1)'}))
+
+    # Stacked Bar Chart — Name Contract Type by Target
+    with col10:
+        contract = cube.breakdown('NAME_CONTRACT_TYPE', filter_spec)
+        contract_counts = pd.DataFrame({0: contract['count'] - contract['TARGET'], 1: contract['TARGET']})
+
+        def plot_contract_type_by_target():
+            fig10, ax10 = plt.subplots(figsize=(10, 8))
+            contract_counts.plot(kind='bar', stacked=True, color=["#0EF306", '#F306A8'], ax=ax10)
     
-    st.pyplot(fig10)
+            ax10.set_xlabel("Contract Type", fontsize=20)
+            ax10.set_ylabel("Count", fontsize=20)
+            ax10.grid(True, which='both', axis='y', linestyle='-')
+            ax10.set_title("Contract Type vs Target", fontsize=24)
+            ax10.legend(['Repaid (0)', 'Default (1)'], fontsize=16)
+            ax10.tick_params(axis='x', rotation=0)
+            return fig10
+        render_chart("risk/contract_type_by_target", plot_contract_type_by_target, df, filter_spec,
+                     interactive=lambda: stacked_bar_chart(contract_counts.set_axis(['Repaid (0)', 'Default (1)'], axis=1),
+                                                           ["#0EF306", '#F306A8'], "Contract Type", "Count",
+                                                           title="Contract Type vs Target"))
+lazy_section("Employment & contract type by target", show_employment_and_contract, key="risk/employment_and_contract")
 
 st.markdown("---")
 
@@ -1,15 +1,27 @@
 import streamlit as st
 import seaborn as sns
 import matplotlib.pyplot as plt
-from utils.load_data import load_and_preprocess
+from utils.load_data import load_dataset
 from utils.filters import global_filters
+from utils.chart_cache import chart_backend_toggle, render_chart
+from utils.sections import lazy_section
+from utils.interactive_charts import bar_chart, box_chart, heatmap_chart, histogram_chart, pie_chart
+from utils.boxplots import draw_boxplot, grouped_box_stats
+from utils.histograms import histogram
+from utils.correlation import correlation
+from utils.cube import dataset_cube
+from utils.warmup import record_visit
 import pandas as pd
-import numpy as np
 
-df = load_and_preprocess()
+df = load_dataset()
+record_visit("demographics")
 
 # Apply global filters
-filtered_df = global_filters(df)
+filtered_df, filter_spec = global_filters(df)
+if filtered_df.empty:
+    st.info("No applicants match the selected filters")
+    st.stop()
+chart_backend_toggle()
 
 # Show filtered data
 st.write("Filtered Data", filtered_df.head(10))
@@ -18,20 +30,25 @@ st.title("👨‍👩‍👧‍👦Demographics & Household Profile")
 
 #=============KPIs==============
 
-gender_counts = df['CODE_GENDER'].value_counts(normalize=True) * 100
+# Shares and averages come from the pre-aggregated cube, filtered by filter_spec
+cube = dataset_cube(df)
+totals = cube.totals(filter_spec)
+gender_counts = cube.shares('CODE_GENDER', filter_spec) * 100
 male_pct = gender_counts.get('M', 0)
 female_pct = gender_counts.get('F', 0)
-avg_age_defaulters = df[df['TARGET'] == 1]['AGE_YEARS'].mean()
-avg_age_non_defaulters = df[df['TARGET'] == 0]['AGE_YEARS'].mean()
-pct_with_children = (df['CNT_CHILDREN'] > 0).mean() * 100
-avg_family_size = df['CNT_FAM_MEMBERS'].mean()
-pct_married_vs_single = df['NAME_FAMILY_STATUS'].value_counts(normalize=True) * 100
+avg_age_defaulters = totals['AGE_YEARS_TARGET'] / totals['TARGET']
+avg_age_non_defaulters = (totals['AGE_YEARS'] - totals['AGE_YEARS_TARGET']) / (totals['count'] - totals['TARGET'])
+pct_with_children = totals['HAS_CHILDREN'] / totals['count'] * 100
+avg_family_size = totals['CNT_FAM_MEMBERS'] / totals['count']
+pct_married_vs_single = cube.shares('NAME_FAMILY_STATUS', filter_spec) * 100
 married_pct = pct_married_vs_single.get('Married', 0)
 single_pct = pct_married_vs_single.get('Single / not married', 0)
-pct_high_education = (df['NAME_EDUCATION_TYPE'] == 'Higher education').mean() * 100
-pct_living_with_parents = (df['NAME_HOUSING_TYPE'] == 'With parents').mean() * 100
-pct_currently_employed = (df['EMPLOYMENT_YEARS'] > 0).mean() * 100
-avg_employment_years = df['EMPLOYMENT_YEARS'].mean()
+education_shares = cube.shares('NAME_EDUCATION_TYPE', filter_spec) * 100
+pct_high_education = education_shares.get('Higher education', 0)
+housing_shares = cube.shares('NAME_HOUSING_TYPE', filter_spec) * 100
+pct_living_with_parents = housing_shares.get('With parents', 0)
+pct_currently_employed = totals['EMPLOYED'] / totals['count'] * 100
+avg_employment_years = totals['EMPLOYMENT_YEARS'] / totals['count']
 
 col1,col2,col3,col4,col5,col6 = st.columns(6)
 col1.metric("Male %", f"{male_pct:.2f}%")
@@ -52,129 +69,199 @@ col12.metric("Avg Employment Years", f"{avg_employment_years:.2f}")
 st.markdown("---")
 
 
-col1, col2 = st.columns(2)
-
-# Histogram: Age distribution (all)
-
-with col1:
-    fig1, ax1 = plt.subplots(figsize=(10,6))
-    ax1.hist(df['AGE_YEARS'], bins=30, color="#1606F3", alpha=0.7, edgecolor="black")
-    ax1.set_title("Age Distribution (All Applicants)", fontsize=20)
-    ax1.set_xlabel("Age (years)", fontsize=16)
-    ax1.set_ylabel("Count", fontsize=16)
-    ax1.grid(True, which='both', axis='y', linestyle='-')
-    st.pyplot(fig1)
-
-# Histogram: Age distribution by Target (overlay)
-
-with col2:
-    fig2, ax2 = plt.subplots(figsize=(10,6))
-    ax2.hist(df[df['TARGET'] == 0]['AGE_YEARS'], bins=30, color="#04F40C", alpha=0.7, label='Non-Defaulters', edgecolor="black")
-    ax2.hist(df[df['TARGET'] == 1]['AGE_YEARS'], bins=30, color="#F40404", alpha=0.7, label='Defaulters', edgecolor="black")
-    ax2.set_title("Age Distribution by Target", fontsize=20)
-    ax2.set_xlabel("Age (years)", fontsize=16)
-    ax2.set_ylabel("Count", fontsize=16)
-    ax2.legend(fontsize=14)
-    ax2.grid(True, which='both', axis='y', linestyle='-')
-    st.pyplot(fig2)
-
-col3, col4 = st.columns(2)
-
-# Gender distribution
-
-with col3:
-    fig3, ax3 = plt.subplots(figsize=(10,6))
-    sns.countplot(data=df, x='CODE_GENDER', ax=ax3, palette=["#1606F3", "#F306A8", "#06F3F2"])
-    ax3.set_title("Gender Distribution", fontsize=20)
-    ax3.set_xlabel("Gender", fontsize=16)
-    ax3.set_ylabel("Count", fontsize=16)
-    ax3.grid(True, which='both', axis='y', linestyle='-')
-    ax3.legend(labels=["Male", "Female", "Other"], fontsize=14)
-    st.pyplot(fig3)
-
-# Family status distribution
-
-with col4:
-    fig4, ax4 = plt.subplots(figsize=(10,6))
-    sns.countplot(data=df, x='NAME_FAMILY_STATUS', ax=ax4, palette="Set2", order=df['NAME_FAMILY_STATUS'].value_counts().index)
-    ax4.set_title("Family Status Distribution", fontsize=20)
-    ax4.set_xlabel("Family Status", fontsize=16)
-    ax4.set_ylabel("Count", fontsize=16)
-    ax4.tick_params(axis='x', rotation=90)
-    ax4.grid(True, which='both', axis='y', linestyle='-')
-    st.pyplot(fig4)
-
-col5, col6 = st.columns(2)
-
-# Education Distribution
-
-with col5:
-    fig5, ax5 = plt.subplots(figsize=(10,6))
-    sns.countplot(data=df, x='NAME_EDUCATION_TYPE', ax=ax5, palette="Set2", order=df['NAME_EDUCATION_TYPE'].value_counts().index)
-    ax5.set_title("Education Distribution", fontsize=20)
-    ax5.set_xlabel("Education Level", fontsize=16)
-    ax5.set_ylabel("Count", fontsize=16)
-    ax5.tick_params(axis='x', rotation=90)
-    ax5.grid(True, which='both', axis='y', linestyle='-')
-    st.pyplot(fig5)
-
-## Occupation distribution (top 10)
-
-with col6:
-    top10_occup = df['OCCUPATION_TYPE'].value_counts().nlargest(10)
-
-    fig6, ax6 = plt.subplots(figsize=(10,6))
-    top10_occup.plot(kind='bar', color="#1606F3", ax=ax6)
-    ax6.set_title("Top 10 Occupation Types", fontsize=18)
-    ax6.set_xlabel("Occupation", fontsize=14)
-    ax6.set_ylabel("Count", fontsize=14)
-    ax6.tick_params(axis='x', rotation=45)
-    ax6.grid(True, which='both', axis='y', linestyle='-')
-    st.pyplot(fig6)
-
-col7, col8 = st.columns(2)
-
-# Pie - Housing type distribution
-
-with col7:
-    housing_counts = df['NAME_HOUSING_TYPE'].value_counts()
-    fig7, ax7 = plt.subplots(figsize=(8,8))
-    ax7.pie(housing_counts, labels=housing_counts.index, autopct='%1.1f%%', startangle=140, colors=sns.color_palette("Set2", len(housing_counts)))
-    ax7.set_title("Housing Type Distribution", fontsize=20)
-    st.pyplot(fig7)
-
-#Countplot — CNT_CHILDREN
-with col8:
-    fig8, ax8 = plt.subplots(figsize=(10,6))
-    sns.countplot(data=df, x='CNT_CHILDREN', ax=ax8, palette="Set1")
-    ax8.set_title("Number of Children Distribution", fontsize=20)
-    ax8.set_xlabel("Number of Children", fontsize=16)
-    ax8.set_ylabel("Count", fontsize=16)
-    ax8.grid(True, which='both', axis='y', linestyle='-')
-    st.pyplot(fig8)
-
-col9, col10 = st.columns(2)
-
-#Boxplot — Age vs Target
-
-with col9:
-    fig9, ax9 = plt.subplots(figsize=(10,6))
-    sns.boxplot(data=df, x='TARGET', y='AGE_YEARS', ax=ax9, palette=["#0424F4", "#F40404"])
-    ax9.set_title("Age vs Target", fontsize=20)
-    ax9.set_xlabel("Target", fontsize=16)
-    ax9.set_ylabel("Age (years)", fontsize=16)
-    st.pyplot(fig9)
-
-# Heatmap — Corr(Age, Children, Family Size, TARGET)
-
-with col10:
-    corr_data = df[['AGE_YEARS', 'CNT_CHILDREN', 'CNT_FAM_MEMBERS', 'TARGET']]
-    corr = corr_data.corr()
-
-    fig10, ax10 = plt.subplots(figsize=(8, 6))
-    sns.heatmap(corr, annot=True, fmt=".2f", cmap="coolwarm", ax=ax10)
-    ax10.set_title("Correlation Heatmap", fontsize=20)
-    st.pyplot(fig10)
+def show_age():
+    col1, col2 = st.columns(2)
+
+    # Histogram: Age distribution (all)
+
+    with col1:
+        def plot_age_histogram():
+            fig1, ax1 = plt.subplots(figsize=(10,6))
+            counts, edges = histogram(df, 'AGE_YEARS', filter_spec)
+            ax1.hist(edges[:-1], bins=edges, weights=counts, color="#1606F3", alpha=0.7, edgecolor="black")
+            ax1.set_title("Age Distribution (All Applicants)", fontsize=20)
+            ax1.set_xlabel("Age (years)", fontsize=16)
+            ax1.set_ylabel("Count", fontsize=16)
+            ax1.grid(True, which='both', axis='y', linestyle='-')
+            return fig1
+        render_chart("demographics/age_histogram", plot_age_histogram, df, filter_spec,
+                     interactive=lambda: histogram_chart(*histogram(df, 'AGE_YEARS', filter_spec), ["#1606F3"],
+                                                         "Age (years)",
+                                                         title="Age Distribution (All Applicants)"))
+
+    # Histogram: Age distribution by Target (overlay)
+
+    with col2:
+        def plot_age_histogram_by_target():
+            fig2, ax2 = plt.subplots(figsize=(10,6))
+            counts, edges = histogram(df, 'AGE_YEARS', filter_spec, by_target=True)
+            ax2.hist(edges[:-1], bins=edges, weights=counts[0], color="#04F40C", alpha=0.7, label='Non-Defaulters', edgecolor="black")
+            ax2.hist(edges[:-1], bins=edges, weights=counts[1], color="#F40404", alpha=0.7, label='Defaulters', edgecolor="black")
+            ax2.set_title("Age Distribution by Target", fontsize=20)
+            ax2.set_xlabel("Age (years)", fontsize=16)
+            ax2.set_ylabel("Count", fontsize=16)
+            ax2.legend(fontsize=14)
+            ax2.grid(True, which='both', axis='y', linestyle='-')
+            return fig2
+        render_chart("demographics/age_histogram_by_target", plot_age_histogram_by_target, df, filter_spec,
+                     interactive=lambda: histogram_chart(*histogram(df, 'AGE_YEARS', filter_spec, by_target=True),
+                                                         ["#04F40C", "#F40404"], "Age (years)",
+                                                         title="Age Distribution by Target",
+                                                         labels=['Non-Defaulters', 'Defaulters'], stack=False))
+lazy_section("Age distributions", show_age, key="demographics/age", expanded=True)
+
+def show_gender_and_family():
+    col3, col4 = st.columns(2)
+
+    # Gender distribution
+
+    with col3:
+        def plot_gender_counts():
+            gender_totals = cube.breakdown('CODE_GENDER', filter_spec)['count']
+            fig3, ax3 = plt.subplots(figsize=(10,6))
+            sns.barplot(x=gender_totals.index.astype(str), y=gender_totals.values, ax=ax3,
+                        palette=["#1606F3", "#F306A8", "#06F3F2"])
+            ax3.set_title("Gender Distribution", fontsize=20)
+            ax3.set_xlabel("Gender", fontsize=16)
+            ax3.set_ylabel("Count", fontsize=16)
+            ax3.grid(True, which='both', axis='y', linestyle='-')
+            ax3.legend(labels=["Male", "Female", "Other"], fontsize=14)
+            return fig3
+        render_chart("demographics/gender_counts", plot_gender_counts, df, filter_spec,
+                     interactive=lambda: bar_chart(cube.breakdown('CODE_GENDER', filter_spec)['count'],
+                                                   ["#1606F3", "#F306A8", "#06F3F2"], "Gender", "Count",
+                                                   title="Gender Distribution"))
+
+    # Family status distribution
+
+    with col4:
+        def plot_family_status_counts():
+            fig4, ax4 = plt.subplots(figsize=(10,6))
+            family_counts = pct_married_vs_single / 100 * totals['count']
+            sns.barplot(x=family_counts.index.astype(str), y=family_counts.values, ax=ax4, palette="Set2")
+            ax4.set_title("Family Status Distribution", fontsize=20)
+            ax4.set_xlabel("Family Status", fontsize=16)
+            ax4.set_ylabel("Count", fontsize=16)
+            ax4.tick_params(axis='x', rotation=90)
+            ax4.grid(True, which='both', axis='y', linestyle='-')
+            return fig4
+        render_chart("demographics/family_status_counts", plot_family_status_counts, df, filter_spec,
+                     interactive=lambda: bar_chart(pct_married_vs_single / 100 * totals['count'],
+                                                   sns.color_palette("Set2").as_hex(), "Family Status", "Count",
+                                                   title="Family Status Distribution"))
+lazy_section("Gender & family status", show_gender_and_family, key="demographics/gender_and_family")
+
+def show_education_and_occupations():
+    col5, col6 = st.columns(2)
+
+    # Education Distribution
+
+    with col5:
+        def plot_education_counts():
+            fig5, ax5 = plt.subplots(figsize=(10,6))
+            education_counts = education_shares / 100 * totals['count']
+            sns.barplot(x=education_counts.index.astype(str), y=education_counts.values, ax=ax5, palette="Set2")
+            ax5.set_title("Education Distribution", fontsize=20)
+            ax5.set_xlabel("Education Level", fontsize=16)
+            ax5.set_ylabel("Count", fontsize=16)
+            ax5.tick_params(axis='x', rotation=90)
+            ax5.grid(True, which='both', axis='y', linestyle='-')
+            return fig5
+        render_chart("demographics/education_counts", plot_education_counts, df, filter_spec,
+                     interactive=lambda: bar_chart(education_shares / 100 * totals['count'],
+                                                   sns.color_palette("Set2").as_hex(), "Education Level", "Count",
+                                                   title="Education Distribution"))
+
+    ## Occupation distribution (top 10)
+
+    with col6:
+        def plot_top_occupations():
+            top10_occup = cube.breakdown('OCCUPATION_TYPE', filter_spec)['count'].nlargest(10)
+
+            fig6, ax6 = plt.subplots(figsize=(10,6))
+            top10_occup.plot(kind='bar', color="#1606F3", ax=ax6)
+            ax6.set_title("Top 10 Occupation Types", fontsize=18)
+            ax6.set_xlabel("Occupation", fontsize=14)
+            ax6.set_ylabel("Count", fontsize=14)
+            ax6.tick_params(axis='x', rotation=45)
+            ax6.grid(True, which='both', axis='y', linestyle='-')
+            return fig6
+        render_chart("demographics/top_occupations", plot_top_occupations, df, filter_spec,
+                     interactive=lambda: bar_chart(cube.breakdown('OCCUPATION_TYPE', filter_spec)['count'].nlargest(10),
+                                                   ["#1606F3"], "Occupation", "Count", title="Top 10 Occupation Types"))
+lazy_section("Education & occupations", show_education_and_occupations, key="demographics/education_and_occupations")
+
+def show_housing_and_children():
+    col7, col8 = st.columns(2)
+
+    # Pie - Housing type distribution
+
+    with col7:
+        def plot_housing_shares():
+            housing_counts = housing_shares / 100 * totals['count']
+            fig7, ax7 = plt.subplots(figsize=(8,8))
+            ax7.pie(housing_counts, labels=housing_counts.index, autopct='%1.1f%%', startangle=140, colors=sns.color_palette("Set2", len(housing_counts)))
+            ax7.set_title("Housing Type Distribution", fontsize=20)
+            return fig7
+        render_chart("demographics/housing_shares", plot_housing_shares, df, filter_spec,
+                     interactive=lambda: pie_chart(housing_shares / 100 * totals['count'],
+                                                   sns.color_palette("Set2").as_hex(), title="Housing Type Distribution"))
+
+    #Countplot — CNT_CHILDREN, from the pre-binned counts (one bin per number of children)
+    def children_counts():
+        counts, edges = histogram(df, 'CNT_CHILDREN', filter_spec)
+        return pd.Series(counts, index=edges[:-1].astype(int))[counts > 0]
+
+    with col8:
+        def plot_children_counts():
+            children = children_counts()
+            fig8, ax8 = plt.subplots(figsize=(10,6))
+            sns.barplot(x=children.index.astype(str), y=children.values, ax=ax8, palette="Set1")
+            ax8.set_title("Number of Children Distribution", fontsize=20)
+            ax8.set_xlabel("Number of Children", fontsize=16)
+            ax8.set_ylabel("Count", fontsize=16)
+            ax8.grid(True, which='both', axis='y', linestyle='-')
+            return fig8
+        render_chart("demographics/children_counts", plot_children_counts, df, filter_spec,
+                     interactive=lambda: bar_chart(children_counts(),
+                                                   sns.color_palette("Set1").as_hex(), "Number of Children", "Count",
+                                                   title="Number of Children Distribution"))
+lazy_section("Housing & children", show_housing_and_children, key="demographics/housing_and_children")
+
+def show_age_and_household():
+    col9, col10 = st.columns(2)
+
+    #Boxplot — Age vs Target
+
+    with col9:
+        def plot_age_by_target():
+            fig9, ax9 = plt.subplots(figsize=(10,6))
+            draw_boxplot(ax9, grouped_box_stats(df, 'AGE_YEARS', by='TARGET', spec=filter_spec),
+                         colors={0: "#0424F4", 1: "#F40404"})
+            ax9.set_title("Age vs Target", fontsize=20)
+            ax9.set_xlabel("Target", fontsize=16)
+            ax9.set_ylabel("Age (years)", fontsize=16)
+            return fig9
+        render_chart("demographics/age_by_target", plot_age_by_target, df, filter_spec,
+                     interactive=lambda: box_chart(grouped_box_stats(df, 'AGE_YEARS', by='TARGET', spec=filter_spec),
+                                                   {0: "#0424F4", 1: "#F40404"}, "Age (years)", "Target",
+                                                   title="Age vs Target"))
+
+    # Heatmap — Corr(Age, Children, Family Size, TARGET)
+
+    with col10:
+        household_columns = ['AGE_YEARS', 'CNT_CHILDREN', 'CNT_FAM_MEMBERS', 'TARGET']
+        def plot_household_correlations():
+            corr = correlation(df, household_columns, filter_spec)
+
+            fig10, ax10 = plt.subplots(figsize=(8, 6))
+            sns.heatmap(corr, annot=True, fmt=".2f", cmap="coolwarm", ax=ax10)
+            ax10.set_title("Correlation Heatmap", fontsize=20)
+            return fig10
+        render_chart("demographics/household_correlations", plot_household_correlations, df, filter_spec,
+                     interactive=lambda: heatmap_chart(correlation(df, household_columns, filter_spec),
+                                                       title="Correlation Heatmap"))
+lazy_section("Age by target & household correlations", show_age_and_household, key="demographics/age_and_household")
 
 st.markdown("---")
 
@@ -1,15 +1,30 @@
 import streamlit as st
 import seaborn as sns
 import matplotlib.pyplot as plt
-from utils.load_data import load_and_preprocess
+from utils.load_data import load_dataset
 from utils.filters import global_filters
-import pandas as pd
-import numpy as np
-
-df = load_and_preprocess()
+from utils.chart_cache import chart_backend_toggle, render_chart
+from utils.sections import lazy_section
+from utils.interactive_charts import (bar_chart, box_chart, density_chart, heatmap_chart, histogram_chart,
+                                      scatter_chart)
+from utils.correlation import correlation
+from utils.boxplots import draw_boxplot, grouped_box_stats
+from utils.histograms import histogram
+from utils.density import draw_density_contours, joint_density
+from utils.kpis import FINANCIAL_KPIS, approximate_kpis, interval_help
+from utils.sampling import rerun_when_done
+from utils.scatter import OVERLAY_SAMPLE, draw_scatter
+from utils.warmup import record_visit
+
+df = load_dataset()
+record_visit("financial")
 
 # Apply global filters
-filtered_df = global_filters(df)
+filtered_df, filter_spec = global_filters(df)
+if filtered_df.empty:
+    st.info("No applicants match the selected filters")
+    st.stop()
+chart_backend_toggle()
 
 # Show filtered data
 st.write("Filtered Data", filtered_df.head(10))
@@ -18,156 +33,241 @@ st.title("💰Financial Health & Affordability")
 
 #=============KPIs==============
 
-avg_annual_income = df['AMT_INCOME_TOTAL'].mean()
-median_annual_income = df['AMT_INCOME_TOTAL'].median()
-avg_credit_amount = df['AMT_CREDIT'].mean()
-avg_annuity_amount = df['AMT_ANNUITY'].mean()
-avg_goods_price = df['AMT_GOODS_PRICE'].mean()
-avg_debt_to_income_ratio = (df['AMT_ANNUITY'] / df['AMT_INCOME_TOTAL']).mean() * 100
-avg_loan_to_income_ratio = (df['AMT_CREDIT'] / df['AMT_INCOME_TOTAL']).mean() * 100
-income_gap = df[df['TARGET'] == 0]['AMT_INCOME_TOTAL'].mean() - df[df['TARGET'] == 1]['AMT_INCOME_TOTAL'].mean()
-credit_gap = df[df['TARGET'] == 0]['AMT_CREDIT'].mean() - df[df['TARGET'] == 1]['AMT_CREDIT'].mean()
-pct_high_credit = (df['AMT_CREDIT'] > 1000000).mean() * 100
+kpis, intervals, pending = approximate_kpis(df, filtered_df, filter_spec, FINANCIAL_KPIS)
+avg_annual_income = kpis['avg_income']
+median_annual_income = kpis['median_income']
+avg_credit_amount = kpis['avg_credit']
+avg_annuity_amount = kpis['avg_annuity']
+avg_goods_price = kpis['avg_goods_price']
+avg_debt_to_income_ratio = kpis['avg_debt_to_income']
+avg_loan_to_income_ratio = kpis['avg_loan_to_income']
+income_gap = kpis['avg_income_repaid'] - kpis['avg_income_defaulters']
+credit_gap = kpis['avg_credit_repaid'] - kpis['avg_credit_defaulters']
+pct_high_credit = kpis['pct_high_credit']
 
 col1,col2,col3,col4,col5 = st.columns(5)
 
-col1.metric("Avg Annual Income", f"${avg_annual_income:,.2f}")
-col2.metric("Median Annual Income", f"${median_annual_income:,.2f}")
-col3.metric("Avg Credit Amount", f"${avg_credit_amount:,.2f}")
-col4.metric("Avg Annuity Amount", f"${avg_annuity_amount:,.2f}")
-col5.metric("Avg Goods Price", f"${avg_goods_price:,.2f}")
+col1.metric("Avg Annual Income", f"${avg_annual_income:,.2f}", help=interval_help(intervals, 'avg_income', "${:,.2f}"))
+col2.metric("Median Annual Income", f"${median_annual_income:,.2f}",
+            help=interval_help(intervals, 'median_income', "${:,.2f}"))
+col3.metric("Avg Credit Amount", f"${avg_credit_amount:,.2f}", help=interval_help(intervals, 'avg_credit', "${:,.2f}"))
+col4.metric("Avg Annuity Amount", f"${avg_annuity_amount:,.2f}",
+            help=interval_help(intervals, 'avg_annuity', "${:,.2f}"))
+col5.metric("Avg Goods Price", f"${avg_goods_price:,.2f}",
+            help=interval_help(intervals, 'avg_goods_price', "${:,.2f}"))
 
 col6,col7,col8,col9,col10 = st.columns(5)
-col6.metric("Avg Debt-to-Income Ratio", f"{avg_debt_to_income_ratio:.2f}%")
-col7.metric("Avg Loan-to-Income Ratio", f"{avg_loan_to_income_ratio:.2f}%")
+col6.metric("Avg Debt-to-Income Ratio", f"{avg_debt_to_income_ratio:.2f}%",
+            help=interval_help(intervals, 'avg_debt_to_income', "{:.2f}%"))
+col7.metric("Avg Loan-to-Income Ratio", f"{avg_loan_to_income_ratio:.2f}%",
+            help=interval_help(intervals, 'avg_loan_to_income', "{:.2f}%"))
 col8.metric("Income Gap (Non-Def vs Def)", f"${income_gap:,.2f}")
 col9.metric("Credit Gap (Non-Def vs Def)", f"${credit_gap:,.2f}")
-col10.metric("High Credit (> $1M) %", f"{pct_high_credit:.2f}%")
+col10.metric("High Credit (> $1M) %", f"{pct_high_credit:.2f}%",
+             help=interval_help(intervals, 'pct_high_credit', "{:.2f}%"))
+
+if pending is not None:
+    st.caption("⏳ KPIs are estimated from a stratified sample (hover for 95% intervals); exact values follow.")
+    rerun_when_done(pending)
 
 st.markdown("---")
 
-col1, col2 = st.columns(2)
-
-# Histogram: Income distribution (all)
-
-with col1:
-    fig1, ax1 = plt.subplots(figsize=(10,6))
-    ax1.hist(df['AMT_INCOME_TOTAL'], bins=30, color="#1606F3", alpha=0.7, edgecolor="black")
-    ax1.set_title("Annual Income Distribution (All Applicants)", fontsize=20)
-    ax1.set_xlabel("Annual Income ($)", fontsize=16)
-    ax1.set_ylabel("Count", fontsize=16)
-    ax1.grid(True, which='both', axis='y', linestyle='-')
-    st.pyplot(fig1)
-
-# Histogram: Credit Distribution (all)
-
-with col2:
-    fig2, ax2 = plt.subplots(figsize=(10,6))
-    ax2.hist(df['AMT_CREDIT'], bins=30, color="#F31616", alpha=0.7, edgecolor="black")
-    ax2.set_title("Credit Amount Distribution (All Applicants)", fontsize=20)
-    ax2.set_xlabel("Credit Amount ($)", fontsize=16)
-    ax2.set_ylabel("Count", fontsize=16)
-    ax2.grid(True, which='both', axis='y', linestyle='-')
-    st.pyplot(fig2)
-
-col3, col4 = st.columns(2)
-
-# Histogram: Annuity Distribution (all)
-
-with col3:
-    fig3, ax3 = plt.subplots(figsize=(10,6))
-    ax3.hist(df['AMT_ANNUITY'], bins=30, color="#16F316", alpha=0.7, edgecolor="black")
-    ax3.set_title("Annuity Amount Distribution (All Applicants)", fontsize=20)
-    ax3.set_xlabel("Annuity Amount ($)", fontsize=16)
-    ax3.set_ylabel("Count", fontsize=16)
-    ax3.grid(True, which='both', axis='y', linestyle='-')
-    st.pyplot(fig3)
-
-# Scatter: Income vs Credit
-
-with col4:
-    fig4, ax4 = plt.subplots(figsize=(10,6))
-    scatter = ax4.scatter(df['AMT_INCOME_TOTAL'], df['AMT_CREDIT'], c=df['TARGET'], cmap="coolwarm", alpha=0.7)
-    ax4.set_title("Income vs Credit Amount (Colored by Target)", fontsize=20)
-    ax4.set_xlabel("Annual Income ($)", fontsize=16)
-    ax4.set_ylabel("Credit Amount ($)", fontsize=16)
-    fig4.colorbar(scatter, ax=ax4, label="Target")
-    st.pyplot(fig4)
-
-col5, col6 = st.columns(2)
-
-# Scatter: Income vs Annuity
-
-with col5:
-    fig5, ax5 = plt.subplots(figsize=(10,6))
-    scatter = ax5.scatter(df['AMT_INCOME_TOTAL'], df['AMT_ANNUITY'], alpha=0.7)
-    ax5.set_title("Income vs Annuity Amount (Colored by Target)", fontsize=20)
-    ax5.set_xlabel("Annual Income ($)", fontsize=16)
-    ax5.set_ylabel("Annuity Amount ($)", fontsize=16)
-    fig5.colorbar(scatter, ax=ax5, label="Target")
-    st.pyplot(fig5)
-
-# Boxplot: Credit by Target
-
-with col6:
-    fig6, ax6 = plt.subplots(figsize=(10,6))
-    sns.boxplot(x='TARGET', y='AMT_CREDIT', data=df, ax=ax6)
-    ax6.set_title("Credit Amount by Target", fontsize=20)
-    ax6.set_xlabel("Target", fontsize=16)
-    ax6.set_ylabel("Credit Amount ($)", fontsize=16)
-    ax6.grid(True, which='both', axis='y', linestyle='-')
-    st.pyplot(fig6)
-
-col7, col8 = st.columns(2)
-
-# Boxplot: Income by Target
-
-with col7:
-    fig7, ax7 = plt.subplots(figsize=(10,6))
-    sns.boxplot(x='TARGET', y='AMT_INCOME_TOTAL', data=df, ax=ax7)
-    ax7.set_title("Income Amount by Target", fontsize=20)
-    ax7.set_xlabel("Target", fontsize=16)
-    ax7.set_ylabel("Income Amount ($)", fontsize=16)
-    ax7.grid(True, which='both', axis='y', linestyle='-')
-    st.pyplot(fig7)
-
-# KDE/Density: Joint Income Credit
-
-with col8:
-    fig8, ax8 = plt.subplots(figsize=(10,6))
-    sns.kdeplot(x='AMT_INCOME_TOTAL', y='AMT_CREDIT', data=df, ax=ax8, cmap="Blues", fill=True)
-    ax8.set_title("Joint Income and Credit Density", fontsize=20)
-    ax8.set_xlabel("Annual Income ($)", fontsize=16)
-    ax8.set_ylabel("Credit Amount ($)", fontsize=16)
-    st.pyplot(fig8)
-
-col9, col10 = st.columns(2)
-
-# Barplot: Income Bracket vs Default Rate
-
-with col9:
-    income_default_df = df.groupby('INCOME_BRACKET').agg(default_rate=('TARGET', 'mean')).reset_index()
-    income_default_df['default_rate'] = income_default_df['default_rate'] * 100
-    fig9, ax9 = plt.subplots(figsize=(10,6))
-    sns.barplot(x='INCOME_BRACKET', y='default_rate', data=income_default_df, ax=ax9)
-    ax9.set_title("Income Bracket vs Default Rate", fontsize=20)
-    ax9.set_xlabel("Income Bracket", fontsize=16)
-    ax9.set_ylabel("Default Rate (%)", fontsize=16)
-    ax9.grid(True, which='both', axis='y', linestyle='-')
-    st.pyplot(fig9)
-
-# Heatmap — Financial variable correlations (Income, Credit, Annuity, DTI, LTI, TARGET)
-
-with col10:
-    df['debt_to_income_ratio'] = df['AMT_CREDIT'] / df['AMT_INCOME_TOTAL']
-    df['loan_to_income_ratio'] = df['AMT_ANNUITY'] / df['AMT_INCOME_TOTAL']
-    financial_corr_data = df[['AMT_INCOME_TOTAL', 'AMT_CREDIT', 'AMT_ANNUITY', 'debt_to_income_ratio', 'loan_to_income_ratio', 'TARGET']]
-    financial_corr = financial_corr_data.corr()
-
-    fig10, ax10 = plt.subplots(figsize=(8, 6))
-    sns.heatmap(financial_corr, annot=True, fmt=".2f", cmap="coolwarm", ax=ax10)
-    ax10.set_title("Financial Variables Correlation Heatmap", fontsize=20)
-    st.pyplot(fig10)
+def show_income_and_credit():
+    col1, col2 = st.columns(2)
+
+    # Histogram: Income distribution (all)
+
+    with col1:
+        def plot_income_histogram():
+            fig1, ax1 = plt.subplots(figsize=(10,6))
+            counts, edges = histogram(df, 'AMT_INCOME_TOTAL', filter_spec)
+            ax1.hist(edges[:-1], bins=edges, weights=counts, color="#1606F3", alpha=0.7, edgecolor="black")
+            ax1.set_title("Annual Income Distribution (All Applicants)", fontsize=20)
+            ax1.set_xlabel("Annual Income ($)", fontsize=16)
+            ax1.set_ylabel("Count", fontsize=16)
+            ax1.grid(True, which='both', axis='y', linestyle='-')
+            return fig1
+        render_chart("financial/income_histogram", plot_income_histogram, df, filter_spec,
+                     interactive=lambda: histogram_chart(*histogram(df, 'AMT_INCOME_TOTAL', filter_spec), ["#1606F3"],
+                                                         "Annual Income ($)",
+                                                         title="Annual Income Distribution (All Applicants)"))
+
+    # Histogram: Credit Distribution (all)
+
+    with col2:
+        def plot_credit_histogram():
+            fig2, ax2 = plt.subplots(figsize=(10,6))
+            counts, edges = histogram(df, 'AMT_CREDIT', filter_spec)
+            ax2.hist(edges[:-1], bins=edges, weights=counts, color="#F31616", alpha=0.7, edgecolor="black")
+            ax2.set_title("Credit Amount Distribution (All Applicants)", fontsize=20)
+            ax2.set_xlabel("Credit Amount ($)", fontsize=16)
+            ax2.set_ylabel("Count", fontsize=16)
+            ax2.grid(True, which='both', axis='y', linestyle='-')
+            return fig2
+        render_chart("financial/credit_histogram", plot_credit_histogram, df, filter_spec,
+                     interactive=lambda: histogram_chart(*histogram(df, 'AMT_CREDIT', filter_spec), ["#F31616"],
+                                                         "Credit Amount ($)",
+                                                         title="Credit Amount Distribution (All Applicants)"))
+lazy_section("Income & credit distributions", show_income_and_credit,
+             key="financial/income_and_credit", expanded=True)
+
+def show_annuity_and_scatters():
+    overlay = st.checkbox("Overlay a sample of individual points on aggregated scatters")
+    sample = OVERLAY_SAMPLE if overlay else 0
+
+    col3, col4 = st.columns(2)
+
+    # Histogram: Annuity Distribution (all)
+
+    with col3:
+        def plot_annuity_histogram():
+            fig3, ax3 = plt.subplots(figsize=(10,6))
+            counts, edges = histogram(df, 'AMT_ANNUITY', filter_spec)
+            ax3.hist(edges[:-1], bins=edges, weights=counts, color="#16F316", alpha=0.7, edgecolor="black")
+            ax3.set_title("Annuity Amount Distribution (All Applicants)", fontsize=20)
+            ax3.set_xlabel("Annuity Amount ($)", fontsize=16)
+            ax3.set_ylabel("Count", fontsize=16)
+            ax3.grid(True, which='both', axis='y', linestyle='-')
+            return fig3
+        render_chart("financial/annuity_histogram", plot_annuity_histogram, df, filter_spec,
+                     interactive=lambda: histogram_chart(*histogram(df, 'AMT_ANNUITY', filter_spec), ["#16F316"],
+                                                         "Annuity Amount ($)",
+                                                         title="Annuity Amount Distribution (All Applicants)"))
+
+    # Scatter: Income vs Credit
+
+    with col4:
+        def plot_income_vs_credit():
+            fig4, ax4 = plt.subplots(figsize=(10,6))
+            scatter = draw_scatter(ax4, df, 'AMT_INCOME_TOTAL', 'AMT_CREDIT', filter_spec, hue='TARGET',
+                                   cmap="coolwarm",
+                                   sample=sample, alpha=0.7)
+            ax4.set_title("Income vs Credit Amount (Colored by Target)", fontsize=20)
+            ax4.set_xlabel("Annual Income ($)", fontsize=16)
+            ax4.set_ylabel("Credit Amount ($)", fontsize=16)
+            fig4.colorbar(scatter, ax=ax4, label="Target")
+            return fig4
+        render_chart("financial/income_vs_credit", plot_income_vs_credit, df, filter_spec, key=(sample,),
+                     interactive=lambda: scatter_chart(df, 'AMT_INCOME_TOTAL', 'AMT_CREDIT', "Annual Income ($)",
+                                                       "Credit Amount ($)", spec=filter_spec, hue='TARGET', sample=sample,
+                                                       title="Income vs Credit Amount (Colored by Target)"))
+
+    col5, col6 = st.columns(2)
+
+    # Scatter: Income vs Annuity
+
+    with col5:
+        def plot_income_vs_annuity():
+            fig5, ax5 = plt.subplots(figsize=(10,6))
+            scatter = draw_scatter(ax5, df, 'AMT_INCOME_TOTAL', 'AMT_ANNUITY', filter_spec, hue='TARGET',
+                                   cmap="coolwarm",
+                                   sample=sample, alpha=0.7)
+            ax5.set_title("Income vs Annuity Amount (Colored by Target)", fontsize=20)
+            ax5.set_xlabel("Annual Income ($)", fontsize=16)
+            ax5.set_ylabel("Annuity Amount ($)", fontsize=16)
+            fig5.colorbar(scatter, ax=ax5, label="Target")
+            return fig5
+        render_chart("financial/income_vs_annuity", plot_income_vs_annuity, df, filter_spec, key=(sample,),
+                     interactive=lambda: scatter_chart(df, 'AMT_INCOME_TOTAL', 'AMT_ANNUITY', "Annual Income ($)",
+                                                       "Annuity Amount ($)", spec=filter_spec, hue='TARGET', sample=sample,
+                                                       title="Income vs Annuity Amount (Colored by Target)"))
+
+    # Boxplot: Credit by Target
+
+    with col6:
+        def plot_credit_by_target():
+            fig6, ax6 = plt.subplots(figsize=(10,6))
+            draw_boxplot(ax6, grouped_box_stats(df, 'AMT_CREDIT', by='TARGET', spec=filter_spec), colors=["C0"])
+            ax6.set_title("Credit Amount by Target", fontsize=20)
+            ax6.set_xlabel("Target", fontsize=16)
+            ax6.set_ylabel("Credit Amount ($)", fontsize=16)
+            ax6.grid(True, which='both', axis='y', linestyle='-')
+            return fig6
+        render_chart("financial/credit_by_target", plot_credit_by_target, df, filter_spec,
+                     interactive=lambda: box_chart(grouped_box_stats(df, 'AMT_CREDIT', by='TARGET', spec=filter_spec),
+                                                   ["#1f77b4"],
+                                                   "Credit Amount ($)", "Target", title="Credit Amount by Target"))
+lazy_section("Annuity, income scatters & credit by target", show_annuity_and_scatters,
+             key="financial/annuity_and_scatters")
+
+def show_income_by_target_and_density():
+    col7, col8 = st.columns(2)
+
+    # Boxplot: Income by Target
+
+    with col7:
+        def plot_income_by_target():
+            fig7, ax7 = plt.subplots(figsize=(10,6))
+            draw_boxplot(ax7, grouped_box_stats(df, 'AMT_INCOME_TOTAL', by='TARGET', spec=filter_spec), colors=["C0"])
+            ax7.set_title("Income Amount by Target", fontsize=20)
+            ax7.set_xlabel("Target", fontsize=16)
+            ax7.set_ylabel("Income Amount ($)", fontsize=16)
+            ax7.grid(True, which='both', axis='y', linestyle='-')
+            return fig7
+        render_chart("financial/income_by_target", plot_income_by_target, df, filter_spec,
+                     interactive=lambda: box_chart(grouped_box_stats(df, 'AMT_INCOME_TOTAL', by='TARGET',
+                                                                     spec=filter_spec), ["#1f77b4"],
+                                                   "Income Amount ($)", "Target", title="Income Amount by Target"))
+
+    # KDE/Density: Joint Income Credit
+
+    with col8:
+        def plot_income_credit_density():
+            fig8, ax8 = plt.subplots(figsize=(10,6))
+            draw_density_contours(ax8, joint_density(df, 'AMT_INCOME_TOTAL', 'AMT_CREDIT', filter_spec), cmap="Blues")
+            ax8.set_title("Joint Income and Credit Density", fontsize=20)
+            ax8.set_xlabel("Annual Income ($)", fontsize=16)
+            ax8.set_ylabel("Credit Amount ($)", fontsize=16)
+            return fig8
+        render_chart("financial/income_credit_density", plot_income_credit_density, df, filter_spec,
+                     interactive=lambda: density_chart(joint_density(df, 'AMT_INCOME_TOTAL', 'AMT_CREDIT', filter_spec),
+                                                       "Annual Income ($)", "Credit Amount ($)",
+                                                       title="Joint Income and Credit Density"))
+lazy_section("Income by target & joint density", show_income_by_target_and_density,
+             key="financial/income_by_target_and_density")
+
+def show_brackets_and_correlations():
+    col9, col10 = st.columns(2)
+
+    # Barplot: Income Bracket vs Default Rate
+
+    with col9:
+        def income_bracket_default_rates():
+            return filtered_df.groupby('INCOME_BRACKET', observed=True)['TARGET'].mean() * 100
+
+        def plot_default_by_income_bracket():
+            income_default_df = income_bracket_default_rates().rename('default_rate').reset_index()
+            fig9, ax9 = plt.subplots(figsize=(10,6))
+            sns.barplot(x='INCOME_BRACKET', y='default_rate', data=income_default_df, ax=ax9)
+            ax9.set_title("Income Bracket vs Default Rate", fontsize=20)
+            ax9.set_xlabel("Income Bracket", fontsize=16)
+            ax9.set_ylabel("Default Rate (%)", fontsize=16)
+            ax9.grid(True, which='both', axis='y', linestyle='-')
+            return fig9
+        render_chart("financial/default_by_income_bracket", plot_default_by_income_bracket, df, filter_spec,
+                     interactive=lambda: bar_chart(income_bracket_default_rates(), ["#1f77b4"], "Income Bracket",
+                                                   "Default Rate (%)", title="Income Bracket vs Default Rate"))
+
+    # Heatmap — Financial variable correlations (Income, Credit, Annuity, DTI, LTI, TARGET)
+
+    with col10:
+        def financial_correlations():
+            # The ratios are precomputed at load: LOAN_TO_INCOME is credit / income, DTI annuity / income
+            ratio_labels = {'LOAN_TO_INCOME': 'debt_to_income_ratio', 'DTI': 'loan_to_income_ratio'}
+            corr = correlation(df, ['AMT_INCOME_TOTAL', 'AMT_CREDIT', 'AMT_ANNUITY', 'LOAN_TO_INCOME', 'DTI', 'TARGET'],
+                               filter_spec)
+            return corr.rename(index=ratio_labels, columns=ratio_labels)
+
+        def plot_financial_correlations():
+            fig10, ax10 = plt.subplots(figsize=(8, 6))
+            sns.heatmap(financial_correlations(), annot=True, fmt=".2f", cmap="coolwarm", ax=ax10)
+            ax10.set_title("Financial Variables Correlation Heatmap", fontsize=20)
+            return fig10
+        render_chart("financial/financial_correlations", plot_financial_correlations, df, filter_spec,
+                     interactive=lambda: heatmap_chart(financial_correlations(),
+                                                       title="Financial Variables Correlation Heatmap"))
+lazy_section("Income brackets & correlations", show_brackets_and_correlations,
+             key="financial/brackets_and_correlations")
 
 st.markdown("---")
 
@@ -1,30 +1,41 @@
 import streamlit as st
 import seaborn as sns
 import matplotlib.pyplot as plt
-from utils.load_data import load_and_preprocess
+from utils.load_data import load_dataset
 from utils.filters import global_filters
-import pandas as pd
+from utils.chart_cache import chart_backend_toggle, render_chart
+from utils.sections import lazy_section
+from utils.interactive_charts import INTERACTIVE_GRID_BINS, bar_chart, box_chart, heatmap_chart, scatter_chart
+from utils.boxplots import draw_boxplot, grouped_box_stats
+from utils.correlation import correlation
+from utils.cube import dataset_cube
+from utils.drivers import driver_ranking, woe_table
+from utils.rules import evaluate_rules
+from utils.scatter import OVERLAY_SAMPLE, SCATTER_GRID_BINS, draw_scatter
+from utils.warmup import record_visit
 import numpy as np
 
-df = load_and_preprocess()
+df = load_dataset()
+record_visit("correlations")
 
 # Apply global filters
-filtered_df = global_filters(df)
+filtered_df, filter_spec = global_filters(df)
+if filtered_df.empty:
+    st.info("No applicants match the selected filters")
+    st.stop()
+chart_backend_toggle()
 
 # Show filtered data
 st.write("Filtered Data", filtered_df.head(10))
 
 st.title("🔗Correlation, Drivers & Interactive Slice-and-Dice")
-st.write("Explore numeric correlations to TARGET and test candidate rules. All visuals respond to the global filters.")
+st.write("Explore numeric correlations to TARGET and test candidate rules. Every chart and table on this page is computed over the rows the global filters keep.")
 
 
 #=============KPIs==============
 
-# Keep only numeric columns for correlation
-numeric_df = df.select_dtypes(include=['number'])
-
-# Calculate correlations with TARGET
-corr_matrix = numeric_df.corr()
+# Correlations of all numeric columns over the filtered rows, from cached sufficient statistics
+corr_matrix = correlation(df, spec=filter_spec)
 target_corr = corr_matrix['TARGET'].sort_values(ascending=False)
 
 # Top Positive Correlations
@@ -81,174 +92,269 @@ with col4:
 
 st.markdown("---")
 
-c1,c2 = st.columns(2)
+def show_heatmap_and_drivers():
+    c1,c2 = st.columns(2)
 
-with c1:
-    st.subheader("Heatmap — Correlation (selected numerics)")
+    with c1:
+        st.subheader("Heatmap — Correlation (selected numerics)")
 
-    # Select numeric columns
-    numeric_cols = df.select_dtypes(include=np.number).columns.tolist()
+        # Select numeric columns
+        numeric_cols = df.select_dtypes(include=np.number).columns.tolist()
     
-    # Multiselect for columns
-    selected_columns = st.multiselect("Select numeric columns", numeric_cols, default=numeric_cols[:10])
+        # Multiselect for columns
+        selected_columns = st.multiselect("Select numeric columns", numeric_cols, default=numeric_cols[:10])
     
-    if selected_columns:
-        corr_matrix = df[selected_columns].corr()
-
-        # Plotting heatmap
-        fig, ax = plt.subplots(figsize=(8, 6))
-        sns.heatmap(corr_matrix, annot=True, fmt=".2f", cmap='coolwarm', linewidths=0.5, ax=ax)
-        ax.set_title("Correlation Heatmap", fontsize=14)
-
-        st.pyplot(fig)
-    else:
-        st.write("Please select at least one numeric column.")
-
-
-with c2:
-    st.subheader("|Correlation| vs TARGET (top features)")
-    # Select top N features
-    N = 10
-    top_features = target_corr.sort_values(ascending=False).head(N)
-    st.write(f"### Top {N} Features by |Correlation| with TARGET")
-    fig, ax = plt.subplots(figsize=(8, 5))
-    top_features.plot(kind='bar', ax=ax)
-    ax.set_xlabel("Features")
-    ax.set_ylabel("|Correlation|")
-    ax.set_title(f"Top {N} Correlated Features")
-    ax.grid(True, which='both', axis='y', linestyle='-')
-    plt.xticks(rotation=90, ha='right')
-    plt.tight_layout()
-    st.pyplot(fig)
-
-c3, c4 = st.columns(2)
-
-with c3:
-    st.write("### Scatter: Age vs Credit")
-    fig, ax = plt.subplots(figsize=(6, 5))
-    sns.scatterplot(
-        data=df,
-        x='AGE_YEARS',
-        y='AMT_CREDIT',
-        hue='TARGET',
-        palette='coolwarm',
-        alpha=0.6,
-        ax=ax
-    )
-    ax.set_xlabel("Age (years)")
-    ax.set_ylabel("Credit Amount")
-    ax.set_title("Age vs Credit by TARGET")
-    plt.tight_layout()
-    st.pyplot(fig)
-
-with c4:
-    st.write("### Scatter: Age vs Income")
-    fig, ax = plt.subplots(figsize=(6, 5))
-    sns.scatterplot(
-        data=df,
-        x='AGE_YEARS',
-        y='AMT_INCOME_TOTAL',
-        hue='TARGET',
-        palette='coolwarm',
-        alpha=0.6,
-        ax=ax
-    )
-    ax.set_xlabel("Age (years)")
-    ax.set_ylabel("Income")
-    ax.set_title("Age vs Income by TARGET")
-    plt.tight_layout()
-    st.pyplot(fig)
-
-c5, c6 = st.columns(2)
-
-with c5:
-    st.write("### Scatter: Employment Years vs TARGET (with jitter)")
-    fig, ax = plt.subplots(figsize=(6, 5))
-    # Add jitter by slightly randomizing the employment years
-    jitter = np.random.uniform(-0.3, 0.3, size=len(df))
-    sns.scatterplot(
-        x=df['EMPLOYMENT_YEARS'] + jitter,
-        y=df['TARGET'],
-        alpha=0.3
-    )
-    ax.set_xlabel("Years Employed")
-    ax.set_ylabel("TARGET")
-    ax.set_title("Employment Years vs TARGET with jitter")
-    plt.tight_layout()
-    st.pyplot(fig)
-
-with c6:
-    st.write("### Boxplot: Credit by Education")
-    fig, ax = plt.subplots(figsize=(6, 5))
-    sns.boxplot(
-        data=df,
-        x='NAME_EDUCATION_TYPE',
-        y='AMT_CREDIT'
-    )
-    ax.set_xlabel("Education Level")
-    ax.set_ylabel("Credit Amount")
-    ax.set_title("Credit by Education")
-    ax.grid(True, which='both', axis='y', linestyle='-')
-    plt.xticks(rotation=45, ha='right')
-    plt.tight_layout()
-    st.pyplot(fig)
-
-c7, c8 = st.columns(2)
-
-with c7:
-    st.write("### Boxplot: Income by Family Status")
-    fig, ax = plt.subplots(figsize=(6, 5))
-    sns.boxplot(
-        data=df,
-        x='NAME_FAMILY_STATUS',
-        y='AMT_INCOME_TOTAL'
-    )
-    ax.set_xlabel("Family Status")
-    ax.set_ylabel("Income")
-    ax.set_title("Income by Family Status")
-    ax.grid(True, which='both', axis='y', linestyle='-')
-    plt.xticks(rotation=45, ha='right')
-    plt.tight_layout()
-    st.pyplot(fig)
-
-with c8:
-    st.write("### Pair Plot: Income, Credit, Annuity, TARGET")
-    # Select the relevant columns
-    pair_df = df[['AMT_INCOME_TOTAL', 'AMT_CREDIT', 'AMT_ANNUITY', 'TARGET']]
-    # Optional: sample for performance if dataset is very large
-    if len(pair_df) > 1000:
-        pair_df = pair_df.sample(1000, random_state=42)
-    sns.pairplot(pair_df, hue='TARGET', diag_kind='kde', corner=True)
-    st.pyplot(plt.gcf())
-
-c9,c10 = st.columns(2)
-
-with c9:
-    st.write("### Default Rate by Gender")
-    gender_rate = filtered_df.groupby('CODE_GENDER')['TARGET'].mean().sort_values(ascending=False)
+        if selected_columns:
+            def plot_correlation_heatmap():
+                corr_matrix = correlation(df, selected_columns, filter_spec)
+
+                # Plotting heatmap
+                fig, ax = plt.subplots(figsize=(8, 6))
+                sns.heatmap(corr_matrix, annot=True, fmt=".2f", cmap='coolwarm', linewidths=0.5, ax=ax)
+                ax.set_title("Correlation Heatmap", fontsize=14)
+                return fig
+            render_chart("correlations/correlation_heatmap", plot_correlation_heatmap, df, filter_spec,
+                         key=tuple(selected_columns),
+                         interactive=lambda: heatmap_chart(correlation(df, selected_columns, filter_spec),
+                                                           title="Correlation Heatmap"))
+        else:
+            st.write("Please select at least one numeric column.")
+
+
+    with c2:
+        st.subheader("|Correlation| vs TARGET (top features)")
+        # Select top N features
+        N = 10
+        st.write(f"### Top {N} Features by |Correlation| with TARGET")
+        def plot_top_target_correlations():
+            top_features = target_corr.sort_values(ascending=False).head(N)
+            fig, ax = plt.subplots(figsize=(8, 5))
+            top_features.plot(kind='bar', ax=ax)
+            ax.set_xlabel("Features")
+            ax.set_ylabel("|Correlation|")
+            ax.set_title(f"Top {N} Correlated Features")
+            ax.grid(True, which='both', axis='y', linestyle='-')
+            plt.xticks(rotation=90, ha='right')
+            plt.tight_layout()
+            return fig
+        render_chart("correlations/top_target_correlations", plot_top_target_correlations, df, filter_spec,
+                     interactive=lambda: bar_chart(target_corr.sort_values(ascending=False).head(N), ["#1f77b4"],
+                                                   "Features", "|Correlation|", title=f"Top {N} Correlated Features"))
+lazy_section("Correlation heatmap & top drivers", show_heatmap_and_drivers,
+             key="correlations/heatmap_and_drivers", expanded=True)
+
+def show_driver_ranking():
+    d1, d2 = st.columns(2)
+
+    # Information Value also ranks non-linear and categorical drivers, which a correlation misses
+    ranking = driver_ranking(df, filter_spec)
+
+    with d1:
+        st.subheader("Information Value vs TARGET (top features)")
+        N = 15
+        top_drivers = ranking['iv'].head(N)
+        def plot_top_drivers():
+            fig, ax = plt.subplots(figsize=(8, 5))
+            top_drivers.plot(kind='bar', ax=ax, color="#ff7f0e")
+            ax.set_xlabel("Features")
+            ax.set_ylabel("Information Value")
+            ax.set_title(f"Top {N} Features by Information Value")
+            ax.grid(True, which='both', axis='y', linestyle='-')
+            plt.xticks(rotation=90, ha='right')
+            plt.tight_layout()
+            return fig
+        render_chart("correlations/top_drivers", plot_top_drivers, df, filter_spec,
+                     interactive=lambda: bar_chart(top_drivers, ["#ff7f0e"], "Features", "Information Value",
+                                                   title=f"Top {N} Features by Information Value"))
+
+    with d2:
+        st.subheader("Weight of evidence by bin")
+        driver = st.selectbox("Feature", ranking.index, key="woe_feature")
+        st.write(f"IV: {ranking.loc[driver, 'iv']:.4f} — "
+                 f"Mutual information: {ranking.loc[driver, 'mutual_info']:.5f} nats")
+        st.dataframe(woe_table(df, driver, filter_spec).style.format(
+            {'default_rate': "{:.2%}", 'woe': "{:.3f}", 'iv': "{:.4f}"}))
+lazy_section("Driver ranking — Information Value & weight of evidence", show_driver_ranking,
+             key="correlations/driver_ranking")
+
+def show_rule_testing():
+    st.subheader("Test candidate rules")
+    st.write("One rule per line, e.g. `DTI > 0.3 & AGE_YEARS < 30 & NAME_EDUCATION_TYPE == 'Higher education'`. "
+             "Compare columns with numbers or quoted values (`<`, `>=`, `==`, `!=`, `in [...]`) and combine "
+             "them with `&`, `|`, `~` and parentheses.")
+    rules_text = st.text_area("Rules", key="candidate_rules", height=150, value="\n".join([
+        "DTI > 0.3 & AGE_YEARS < 30 & NAME_EDUCATION_TYPE == 'Secondary / secondary special'",
+        "LOAN_TO_INCOME > 5 | AMT_INCOME_TOTAL < 50000",
+        "OCCUPATION_TYPE in ['Laborers', 'Drivers'] & FLAG_OWN_CAR == 'N'",
+    ]))
+    rules = list(dict.fromkeys(line.strip() for line in rules_text.splitlines() if line.strip()))
+    if not rules:
+        st.write("Please enter at least one rule.")
+        return
+    try:
+        results = evaluate_rules(df, rules, filter_spec)
+    except ValueError as error:
+        st.error(str(error))
+        return
+    st.dataframe(results.sort_values('lift', ascending=False).style.format(
+        {'coverage': "{:.2%}", 'default_rate': "{:.2%}", 'lift': "{:.2f}"}), use_container_width=True)
+lazy_section("Rule testing — coverage, default rate & lift", show_rule_testing, key="correlations/rule_testing")
+
+def show_scatters():
+    overlay = st.checkbox("Overlay a sample of individual points on aggregated scatters")
+    sample = OVERLAY_SAMPLE if overlay else 0
+
+    c3, c4 = st.columns(2)
+
+    with c3:
+        st.write("### Scatter: Age vs Credit")
+        def plot_age_vs_credit():
+            fig, ax = plt.subplots(figsize=(6, 5))
+            scatter = draw_scatter(ax, df, 'AGE_YEARS', 'AMT_CREDIT', filter_spec, hue='TARGET', cmap='coolwarm',
+                                   sample=sample, alpha=0.6)
+            fig.colorbar(scatter, ax=ax, label="TARGET")
+            ax.set_xlabel("Age (years)")
+            ax.set_ylabel("Credit Amount")
+            ax.set_title("Age vs Credit by TARGET")
+            plt.tight_layout()
+            return fig
+        render_chart("correlations/age_vs_credit", plot_age_vs_credit, df, filter_spec, key=(sample,),
+                     interactive=lambda: scatter_chart(df, 'AGE_YEARS', 'AMT_CREDIT', "Age (years)", "Credit Amount",
+                                                       spec=filter_spec,
+                                                       hue='TARGET', sample=sample, title="Age vs Credit by TARGET"))
+
+    with c4:
+        st.write("### Scatter: Age vs Income")
+        def plot_age_vs_income():
+            fig, ax = plt.subplots(figsize=(6, 5))
+            scatter = draw_scatter(ax, df, 'AGE_YEARS', 'AMT_INCOME_TOTAL', filter_spec, hue='TARGET', cmap='coolwarm',
+                                   sample=sample, alpha=0.6)
+            fig.colorbar(scatter, ax=ax, label="TARGET")
+            ax.set_xlabel("Age (years)")
+            ax.set_ylabel("Income")
+            ax.set_title("Age vs Income by TARGET")
+            plt.tight_layout()
+            return fig
+        render_chart("correlations/age_vs_income", plot_age_vs_income, df, filter_spec, key=(sample,),
+                     interactive=lambda: scatter_chart(df, 'AGE_YEARS', 'AMT_INCOME_TOTAL', "Age (years)", "Income",
+                                                       spec=filter_spec,
+                                                       hue='TARGET', sample=sample, title="Age vs Income by TARGET"))
+
+    c5, c6 = st.columns(2)
+
+    with c5:
+        st.write("### Scatter: Employment Years vs TARGET (with jitter)")
+        def plot_employment_vs_target():
+            fig, ax = plt.subplots(figsize=(6, 5))
+            # Add jitter by slightly randomizing the employment years; a thin grid strip per TARGET value when aggregated
+            draw_scatter(ax, df, 'EMPLOYMENT_YEARS', 'TARGET', filter_spec, sample=sample, jitter=0.3,
+                         bins=(SCATTER_GRID_BINS, (-0.25, 0.25, 0.75, 1.25)), alpha=0.3)
+            ax.set_xlabel("Years Employed")
+            ax.set_ylabel("TARGET")
+            ax.set_title("Employment Years vs TARGET with jitter")
+            plt.tight_layout()
+            return fig
+        render_chart("correlations/employment_vs_target", plot_employment_vs_target, df, filter_spec, key=(sample,),
+                     interactive=lambda: scatter_chart(df, 'EMPLOYMENT_YEARS', 'TARGET', "Years Employed", "TARGET",
+                                                       spec=filter_spec,
+                                                       sample=sample,
+                                                       bins=(INTERACTIVE_GRID_BINS, (-0.25, 0.25, 0.75, 1.25)),
+                                                       title="Employment Years vs TARGET"))
+
+    with c6:
+        st.write("### Boxplot: Credit by Education")
+        def plot_credit_by_education():
+            fig, ax = plt.subplots(figsize=(6, 5))
+            draw_boxplot(ax, grouped_box_stats(df, 'AMT_CREDIT', by='NAME_EDUCATION_TYPE', spec=filter_spec),
+                         colors=["C0"])
+            ax.set_xlabel("Education Level")
+            ax.set_ylabel("Credit Amount")
+            ax.set_title("Credit by Education")
+            ax.grid(True, which='both', axis='y', linestyle='-')
+            plt.xticks(rotation=45, ha='right')
+            plt.tight_layout()
+            return fig
+        render_chart("correlations/credit_by_education", plot_credit_by_education, df, filter_spec,
+                     interactive=lambda: box_chart(grouped_box_stats(df, 'AMT_CREDIT', by='NAME_EDUCATION_TYPE',
+                                                                     spec=filter_spec),
+                                                   ["#1f77b4"], "Credit Amount", "Education Level",
+                                                   title="Credit by Education"))
+lazy_section("Scatters & credit by education", show_scatters, key="correlations/scatters")
+
+def show_income_and_pairs():
+    c7, c8 = st.columns(2)
+
+    with c7:
+        st.write("### Boxplot: Income by Family Status")
+        def plot_income_by_family_status():
+            fig, ax = plt.subplots(figsize=(6, 5))
+            draw_boxplot(ax, grouped_box_stats(df, 'AMT_INCOME_TOTAL', by='NAME_FAMILY_STATUS', spec=filter_spec),
+                         colors=["C0"])
+            ax.set_xlabel("Family Status")
+            ax.set_ylabel("Income")
+            ax.set_title("Income by Family Status")
+            ax.grid(True, which='both', axis='y', linestyle='-')
+            plt.xticks(rotation=45, ha='right')
+            plt.tight_layout()
+            return fig
+        render_chart("correlations/income_by_family_status", plot_income_by_family_status, df, filter_spec,
+                     interactive=lambda: box_chart(grouped_box_stats(df, 'AMT_INCOME_TOTAL', by='NAME_FAMILY_STATUS',
+                                                                     spec=filter_spec),
+                                                   ["#1f77b4"], "Income", "Family Status",
+                                                   title="Income by Family Status"))
+
+    with c8:
+        st.write("### Pair Plot: Income, Credit, Annuity, TARGET")
+        def plot_pairs():
+            # Select the relevant columns
+            pair_df = filtered_df[['AMT_INCOME_TOTAL', 'AMT_CREDIT', 'AMT_ANNUITY', 'TARGET']]
+            # Optional: sample for performance if dataset is very large
+            if len(pair_df) > 1000:
+                pair_df = pair_df.sample(1000, random_state=42)
+            return sns.pairplot(pair_df, hue='TARGET', diag_kind='kde', corner=True).figure
+        render_chart("correlations/pairs", plot_pairs, df, filter_spec)
+lazy_section("Income by family status & pair plot", show_income_and_pairs, key="correlations/income_and_pairs")
+
+def show_default_rates():
+    c9,c10 = st.columns(2)
+
+    with c9:
+        st.write("### Default Rate by Gender")
+        gender_rate = dataset_cube(df).rate('CODE_GENDER', spec=filter_spec).sort_values(ascending=False)
+        def plot_default_by_gender():
     
-    fig, ax = plt.subplots(figsize=(6, 5))
-    sns.barplot(x=gender_rate.index, y=gender_rate.values, palette='dark', ax=ax)
-    ax.set_ylabel("Default Rate")
-    ax.set_xlabel("Gender")
-    ax.set_ylim(0, 0.2)
-    ax.set_title("Default Rate by Gender")
-    ax.grid(True, which='both', axis='y', linestyle='-')
-    st.pyplot(fig)
-
-with c10:
-    st.write("### Default Rate by Education")
-    edu_rate = filtered_df.groupby('NAME_EDUCATION_TYPE')['TARGET'].mean().sort_values(ascending=False)
+            fig, ax = plt.subplots(figsize=(6, 5))
+            sns.barplot(x=gender_rate.index.astype(str), y=gender_rate.values, palette='dark', ax=ax)
+            ax.set_ylabel("Default Rate")
+            ax.set_xlabel("Gender")
+            ax.set_ylim(0, 0.2)
+            ax.set_title("Default Rate by Gender")
+            ax.grid(True, which='both', axis='y', linestyle='-')
+            return fig
+        render_chart("correlations/default_by_gender", plot_default_by_gender, df, filter_spec,
+                     interactive=lambda: bar_chart(gender_rate,
+                                                   sns.color_palette('dark').as_hex(), "Gender", "Default Rate",
+                                                   title="Default Rate by Gender"))
+
+    with c10:
+        st.write("### Default Rate by Education")
+        edu_rate = dataset_cube(df).rate('NAME_EDUCATION_TYPE', spec=filter_spec).sort_values(ascending=False)
+        def plot_default_by_education():
     
-    fig, ax = plt.subplots(figsize=(6, 5))
-    sns.barplot(x=edu_rate.index, y=edu_rate.values, palette='dark', ax=ax)
-    ax.set_ylabel("Default Rate")
-    ax.set_xlabel("Education Level")
-    ax.set_ylim(0, 0.2)
-    ax.set_title("Default Rate by Education")
-    ax.grid(True, which='both', axis='y', linestyle='-')
-    plt.xticks(rotation=90, ha='right')
-    st.pyplot(fig)
+            fig, ax = plt.subplots(figsize=(6, 5))
+            sns.barplot(x=edu_rate.index.astype(str), y=edu_rate.values, palette='dark', ax=ax)
+            ax.set_ylabel("Default Rate")
+            ax.set_xlabel("Education Level")
+            ax.set_ylim(0, 0.2)
+            ax.set_title("Default Rate by Education")
+            ax.grid(True, which='both', axis='y', linestyle='-')
+            plt.xticks(rotation=90, ha='right')
+            return fig
+        render_chart("correlations/default_by_education", plot_default_by_education, df, filter_spec,
+                     interactive=lambda: bar_chart(edu_rate,
+                                                   sns.color_palette('dark').as_hex(), "Education Level", "Default Rate",
+                                                   title="Default Rate by Education"))
+lazy_section("Default rates by gender & education", show_default_rates, key="correlations/default_rates")
 
 st.markdown("---")
 
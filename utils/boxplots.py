@@ -0,0 +1,144 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from utils.filter_spec import FilterSpec
+from utils.filters import filtered_rows
+
+# Outlier points drawn per box; more are thinned to an evenly spaced sample
+MAX_FLIERS = 200
+
+# Whisker reach in IQRs, as in ax.boxplot and sns.boxplot
+WHIS = 1.5
+
+
+def box_stats(values: np.ndarray, label=None, max_fliers=MAX_FLIERS) -> dict:
+    """
+    Summarize values for ``ax.bxp`` without sorting them.
+
+    Quartiles use ``np.percentile`` (a partition, not a sort). Whiskers
+    reach the most extreme values within WHIS IQRs of the box, as in
+    ``ax.boxplot``. Only the fliers are sorted, and at most ``max_fliers``
+    of them are kept: evenly spaced in rank, always including the lowest
+    and highest, so the result is deterministic.
+
+    Args:
+        values (np.ndarray): Values of one box; NaNs are ignored.
+        label: Tick label of the box.
+        max_fliers (int): Cap on the outlier points kept.
+
+    Returns:
+        dict: Box statistics in the format ``ax.bxp`` expects.
+    """
+    values = values[~np.isnan(values)]
+    if len(values) == 0:
+        return {'label': label, 'med': np.nan, 'q1': np.nan, 'q3': np.nan, 'whislo': np.nan,
+                'whishi': np.nan, 'mean': np.nan, 'fliers': np.array([]), 'n': 0}
+    q1, med, q3 = np.percentile(values, [25, 50, 75])
+    iqr = q3 - q1
+    inside = values[(values >= q1 - WHIS * iqr) & (values <= q3 + WHIS * iqr)]
+    whislo, whishi = inside.min(), inside.max()
+    fliers = np.sort(values[(values < whislo) | (values > whishi)])
+    if len(fliers) > max_fliers:
+        fliers = fliers[np.linspace(0, len(fliers) - 1, max_fliers).round().astype(int)]
+    return {'label': label, 'med': med, 'q1': q1, 'q3': q3, 'whislo': whislo, 'whishi': whishi,
+            'mean': values.mean(), 'fliers': fliers, 'n': len(values)}
+
+
+def grouped_box_stats(df: pd.DataFrame, column: str, by: str = None, spec: FilterSpec = None) -> list:
+    """
+    Box statistics of a column, per group, over the rows a filter keeps.
+
+    Cached process-wide per dataset, filter, column and grouping.
+
+    Args:
+        df (pd.DataFrame): The full dataset from ``load_dataset``.
+        column (str): Numeric column to summarize.
+        by (str, optional): Categorical or integer column to group by; one
+            box per observed value, in category (or sorted) order.
+        spec (FilterSpec, optional): Filter to apply; all rows if None.
+
+    Returns:
+        list: One ``box_stats`` dict per group, ready for ``ax.bxp``.
+    """
+    digest = df.attrs.get("source_digest")
+    if digest is None:
+        return _grouped_box_stats(df, column, by, spec)
+    return _cached_box_stats(digest, column, by, spec, df)
+
+
+@st.cache_resource(max_entries=64, show_spinner=False)
+def _cached_box_stats(digest: str, column: str, by, spec, _df: pd.DataFrame) -> list:
+    return _grouped_box_stats(_df, column, by, spec)
+
+
+def _grouped_box_stats(df, column, by, spec):
+    rows = filtered_rows(df, spec)
+    values = df[column].to_numpy()
+    if rows is not None:
+        values = values[rows]
+    if by is None:
+        return [box_stats(values.astype(np.float64))]
+
+    groups = df[by]
+    if isinstance(groups.dtype, pd.CategoricalDtype):
+        labels, codes = groups.cat.categories, groups.cat.codes.to_numpy()
+    else:
+        labels, codes = np.unique(groups.to_numpy(), return_inverse=True)
+    if rows is not None:
+        codes = codes[rows]
+    # One stable sort of the small group codes, then one contiguous slice per group
+    order = np.argsort(codes, kind="stable")
+    bounds = np.searchsorted(codes[order], np.arange(len(labels) + 1))
+    return [box_stats(values[order[start:end]].astype(np.float64), label)
+            for label, start, end in zip(labels, bounds[:-1], bounds[1:]) if end > start]
+
+
+def box_labels(stats: list, labels: dict = None) -> list:
+    """
+    Tick label of each box: ``labels[group]`` where given, else the group value.
+
+    Keyed on the group value each box carries, not on position, since a
+    filter may leave some groups without rows.
+    """
+    labels = labels or {}
+    return [labels.get(box['label'], box['label']) for box in stats]
+
+
+def box_colors(stats: list, colors) -> list:
+    """
+    Face color of each box, from one color or a dict keyed by group value.
+
+    A list of several colors is cycled over the boxes in order.
+    """
+    if isinstance(colors, dict):
+        return [colors[box['label']] for box in stats]
+    return [colors[i % len(colors)] for i in range(len(stats))]
+
+
+def draw_boxplot(ax, stats: list, labels: dict = None, colors=None, **kwargs):
+    """
+    Draw precomputed box statistics with ``ax.bxp``.
+
+    With no boxes (the filter kept no rows), the axes only get a note.
+
+    Args:
+        ax: Matplotlib axes.
+        stats (list): Output of ``grouped_box_stats`` (not modified; it is shared).
+        labels (dict, optional): Tick label per group value, replacing the value.
+        colors (list | dict, optional): Face colors (see ``box_colors``).
+        **kwargs: Passed to ``ax.bxp``, e.g. boxprops or medianprops.
+
+    Returns:
+        dict: The artists ``ax.bxp`` returns; empty if there were no boxes.
+    """
+    if not stats:
+        ax.text(0.5, 0.5, "No data", ha="center", va="center", transform=ax.transAxes)
+        return {}
+    faces = None if colors is None else box_colors(stats, colors)
+    stats = [{**box, 'label': label} for box, label in zip(stats, box_labels(stats, labels))]
+    artists = ax.bxp(stats, patch_artist=True, **kwargs)
+    if faces is not None:
+        for box, color in zip(artists['boxes'], faces):
+            box.set_facecolor(color)
+    return artists
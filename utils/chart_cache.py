@@ -0,0 +1,186 @@
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+
+import matplotlib.pyplot as plt
+import pandas as pd
+import streamlit as st
+from PIL import Image
+
+from utils.filter_spec import FilterSpec
+
+# Memory for encoded chart images, shared by all sessions; override with HOME_CREDIT_CHART_CACHE_MB
+CHART_CACHE_BYTES = int(os.environ.get("HOME_CREDIT_CHART_CACHE_MB", 64)) << 20
+
+# Same encoding as st.pyplot, so cached charts look the same
+SAVEFIG_OPTIONS = {"bbox_inches": "tight", "dpi": 200, "format": "png"}
+
+# Streamlit's maximum content width; st.image downscales wider images on every call
+MAX_IMAGE_WIDTH = 2 * 730
+
+
+class ChartCache:
+    """
+    Least-recently-used store of encoded chart images, bounded in bytes.
+
+    Thread-safe, since Streamlit runs every session in its own thread.
+    Sessions missing the same image at once draw it only once: see
+    ``get_or_draw``.
+
+    Attributes:
+        max_bytes (int): Total image size kept; the oldest images are evicted beyond it.
+        size (int): Bytes currently held.
+        hits (int): Lookups answered from the cache.
+        misses (int): Lookups that had to draw the chart.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._images = OrderedDict()
+        self._drawing = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the image stored under key, or None, and count the hit or miss."""
+        with self._lock:
+            image = self._images.get(key)
+            if image is None:
+                self.misses += 1
+                return None
+            self._images.move_to_end(key)
+            self.hits += 1
+            return image
+
+    def get_or_draw(self, key, draw) -> bytes:
+        """
+        Return the image stored under key, calling ``draw()`` to make it on a miss.
+
+        While one caller draws a key, others asking for it wait for that
+        image instead of drawing it again.
+        """
+        image = self.get(key)
+        if image is not None:
+            return image
+        with self._lock:
+            drawing = self._drawing.setdefault(key, threading.Lock())
+        try:
+            with drawing:
+                with self._lock:
+                    image = self._images.get(key)
+                if image is None:
+                    image = draw()
+                    self.put(key, image)
+                return image
+        finally:
+            with self._lock:
+                if self._drawing.get(key) is drawing:
+                    del self._drawing[key]
+
+    def put(self, key, image: bytes):
+        """Store an image, evicting the least recently used ones to stay within max_bytes."""
+        if len(image) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._images.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous)
+            self._images[key] = image
+            self.size += len(image)
+            while self.size > self.max_bytes:
+                _, evicted = self._images.popitem(last=False)
+                self.size -= len(evicted)
+
+    def stats(self) -> dict:
+        """Return the entry count, bytes held, hits and misses."""
+        with self._lock:
+            return {'entries': len(self._images), 'bytes': self.size, 'hits': self.hits, 'misses': self.misses}
+
+
+@st.cache_resource(show_spinner=False)
+def chart_cache() -> ChartCache:
+    """Return the process-wide chart cache."""
+    return ChartCache(CHART_CACHE_BYTES)
+
+
+def style_digest() -> str:
+    """Digest of the Matplotlib style in effect (e.g. after ``plt.style.use``)."""
+    return hashlib.md5(repr(sorted(dict(plt.rcParams).items())).encode()).hexdigest()
+
+
+def encode_figure(fig) -> bytes:
+    """
+    Encode a figure as PNG like st.pyplot does, then close it to free its memory.
+
+    Images wider than MAX_IMAGE_WIDTH are downscaled here, once, the way
+    Streamlit would, so st.image can send the cached bytes unchanged.
+    """
+    buffer = io.BytesIO()
+    try:
+        fig.savefig(buffer, **SAVEFIG_OPTIONS)
+    finally:
+        plt.close(fig)
+    image = Image.open(buffer)
+    if image.width <= MAX_IMAGE_WIDTH:
+        return buffer.getvalue()
+    height = int(image.height * MAX_IMAGE_WIDTH / image.width)
+    resized = io.BytesIO()
+    image.resize((MAX_IMAGE_WIDTH, height), resample=Image.BILINEAR).save(resized, format="PNG")
+    return resized.getvalue()
+
+
+def chart_backend_toggle() -> bool:
+    """
+    Display the sidebar switch between static and interactive charts.
+
+    The choice is kept in the session, so it carries across pages.
+
+    Returns:
+        bool: True if the pages should send interactive Vega-Lite charts.
+    """
+    st.session_state.setdefault('interactive_charts', False)
+    interactive = st.sidebar.toggle(
+        "Interactive charts", value=st.session_state.interactive_charts, key='interactive_charts_toggle',
+        help="Render charts in the browser from aggregated data, with tooltips, zoom and legend filtering.")
+    st.session_state.interactive_charts = interactive
+    return interactive
+
+
+def render_chart(chart_id: str, draw, df: pd.DataFrame, spec: FilterSpec = None, key=(), interactive=None):
+    """
+    Show a chart: as a cached Matplotlib image, or as an interactive Vega-Lite chart.
+
+    Images are keyed by chart id, dataset digest, filter, extra key and
+    Matplotlib style, so a repeat view with the same inputs costs one
+    lookup. Every input of ``draw`` that can change between runs must
+    be in that key.
+
+    When ``chart_backend_toggle`` is on and the chart has an interactive
+    version, that is sent instead: a small spec with the aggregated data,
+    which the browser renders (tooltips, zoom and legend clicks need no
+    rerun).
+
+    Args:
+        chart_id (str): Unique name of the chart, e.g. "overview/age_histogram".
+        draw (callable): Builds and returns the figure; called on a miss.
+        df (pd.DataFrame): The full dataset from ``load_dataset``.
+        spec (FilterSpec, optional): Filter the chart depends on; None if it
+            shows all applicants.
+        key (tuple, optional): Any other inputs, e.g. widget values; hashable.
+        interactive (callable, optional): Builds the Altair chart, from
+            ``utils.interactive_charts``.
+    """
+    if interactive is not None and st.session_state.get('interactive_charts'):
+        st.altair_chart(interactive(), use_container_width=True)
+        return
+    digest = df.attrs.get("source_digest")
+    if digest is None:
+        image = encode_figure(draw())
+    else:
+        cache_key = (chart_id, digest, spec, key, style_digest())
+        image = chart_cache().get_or_draw(cache_key, lambda: encode_figure(draw()))
+    st.image(image, use_container_width=True)
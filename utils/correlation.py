@@ -0,0 +1,167 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from utils.filter_spec import FilterSpec
+from utils.filters import filtered_rows
+from utils.shared_store import shared_artifact
+
+# Rows per block when accumulating statistics; bounds the temporary memory
+CORR_CHUNK_ROWS = 32768
+
+
+class CorrStats:
+    """
+    Sufficient statistics for the Pearson correlations of a set of columns.
+
+    For every pair of columns (i, j), over the rows where both are present:
+    the row count, the sum and sum of squares of column i, and the sum of
+    products (X^T X). Any correlation matrix of these columns, or of a
+    subset, is read from them in O(p^2), with the same pairwise handling
+    of missing values as ``DataFrame.corr``.
+
+    Statistics of disjoint row sets add up (and subtract), provided they
+    share the same shift: values are offset by a fixed per-column shift
+    (e.g. the dataset means) before accumulating, which keeps the sums
+    small and the correlations accurate.
+
+    Attributes:
+        columns (pd.Index): Column names.
+        shift (np.ndarray): Value subtracted from each column.
+        count, sums, squares, cross (np.ndarray): (p, p) statistics.
+    """
+
+    def __init__(self, columns, shift, count, sums, squares, cross):
+        self.columns = pd.Index(columns)
+        self.shift = shift
+        self.count = count
+        self.sums = sums
+        self.squares = squares
+        self.cross = cross
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, columns=None, rows=None, shift=None) -> "CorrStats":
+        """
+        Accumulate the statistics of some columns and rows of a frame.
+
+        Args:
+            df (pd.DataFrame): Source frame.
+            columns (list, optional): Numeric columns; all numeric columns if None.
+            rows (np.ndarray, optional): Row positions; all rows if None.
+            shift (np.ndarray, optional): Per-column shift; the column means if None.
+        """
+        if columns is None:
+            columns = df.select_dtypes(include='number').columns
+        arrays = [df[column].to_numpy() for column in columns]
+        if shift is None:
+            shift = np.array([np.nanmean(a) if len(a) else 0.0 for a in arrays], dtype=np.float64)
+            shift = np.nan_to_num(shift)
+        p = len(arrays)
+        stats = [np.zeros((p, p)) for _ in range(4)]
+        n = len(df) if rows is None else len(rows)
+        for start in range(0, n, CORR_CHUNK_ROWS):
+            block = slice(start, start + CORR_CHUNK_ROWS) if rows is None else rows[start:start + CORR_CHUNK_ROWS]
+            x = np.column_stack([a[block] for a in arrays]).astype(np.float64) - shift
+            for total, part in zip(stats, _block_stats(x)):
+                total += part
+        return cls(columns, shift, *stats)
+
+    def __add__(self, other: "CorrStats") -> "CorrStats":
+        self._check_compatible(other)
+        return CorrStats(self.columns, self.shift, self.count + other.count, self.sums + other.sums,
+                         self.squares + other.squares, self.cross + other.cross)
+
+    def __sub__(self, other: "CorrStats") -> "CorrStats":
+        self._check_compatible(other)
+        return CorrStats(self.columns, self.shift, self.count - other.count, self.sums - other.sums,
+                         self.squares - other.squares, self.cross - other.cross)
+
+    def _check_compatible(self, other):
+        if not (self.columns.equals(other.columns) and np.array_equal(self.shift, other.shift)):
+            raise ValueError("CorrStats over different columns or shifts cannot be combined")
+
+    def corr(self, columns=None) -> pd.DataFrame:
+        """
+        Return the correlation matrix, like ``DataFrame.corr()``.
+
+        Args:
+            columns (list, optional): Subset of the columns, in the order
+                wanted; all columns if None.
+        """
+        if columns is None:
+            columns = self.columns
+        idx = self.columns.get_indexer(columns)
+        if (idx < 0).any():
+            raise KeyError(f"No statistics for columns: {list(pd.Index(columns)[idx < 0])}")
+        grid = np.ix_(idx, idx)
+        n, sums, squares, cross = self.count[grid], self.sums[grid], self.squares[grid], self.cross[grid]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            cov = n * cross - sums * sums.T
+            var = n * squares - sums ** 2
+            r = cov / np.sqrt(var * var.T)
+        r = np.where((var > 0) & (var.T > 0), np.clip(r, -1, 1), np.nan)
+        r[np.diag_indices_from(r)] = np.where(np.diag(var) > 0, 1.0, np.nan)
+        return pd.DataFrame(r, index=pd.Index(columns), columns=pd.Index(columns))
+
+
+def _block_stats(x):
+    # Count, sums, squares and cross products of one block, pairwise over present values
+    missing = np.isnan(x)
+    if not missing.any():
+        n, p = x.shape
+        count = np.full((p, p), float(n))
+        sums = np.repeat(x.sum(axis=0)[:, None], p, axis=1)
+        squares = np.repeat(np.einsum("ij,ij->j", x, x)[:, None], p, axis=1)
+        return count, sums, squares, x.T @ x
+    present = (~missing).astype(np.float64)
+    x = np.where(missing, 0.0, x)
+    return present.T @ present, x.T @ present, (x * x).T @ present, x.T @ x
+
+
+def corr_stats(df: pd.DataFrame, spec: FilterSpec = None) -> CorrStats:
+    """
+    Return the correlation statistics of every numeric column, over the rows a filter keeps.
+
+    Cached process-wide per dataset and filter. A filter keeping most of
+    the rows is computed as the full statistics minus those of the rows
+    it drops, so the cost follows the smaller side.
+    """
+    digest = df.attrs.get("source_digest")
+    if digest is None:
+        return _corr_stats(df, spec)
+    return _cached_corr_stats(digest, spec, df)
+
+
+@st.cache_resource(max_entries=32, show_spinner=False)
+def _cached_corr_stats(digest, spec, _df):
+    if spec is None:
+        return shared_artifact(_df, "corr_stats", CorrStats.from_frame)
+    return _corr_stats(_df, spec, total=_cached_corr_stats(digest, None, _df))
+
+
+def _corr_stats(df, spec, total=None):
+    if total is None:
+        total = CorrStats.from_frame(df)
+    rows = filtered_rows(df, spec)
+    if rows is None:
+        return total
+    if len(rows) <= len(df) // 2:
+        return CorrStats.from_frame(df, total.columns, rows, total.shift)
+    dropped = np.ones(len(df), dtype=bool)
+    dropped[rows] = False
+    return total - CorrStats.from_frame(df, total.columns, np.flatnonzero(dropped), total.shift)
+
+
+def correlation(df: pd.DataFrame, columns=None, spec: FilterSpec = None) -> pd.DataFrame:
+    """
+    Return the correlation matrix of numeric columns, over the rows a filter keeps.
+
+    Same result as ``df.iloc[rows][columns].corr()``, read from the cached
+    statistics of ``corr_stats``.
+
+    Args:
+        df (pd.DataFrame): The full dataset from ``load_dataset``.
+        columns (list, optional): Numeric columns; all of them if None.
+        spec (FilterSpec, optional): Filter to apply; all rows if None.
+    """
+    return corr_stats(df, spec).corr(columns)
@@ -0,0 +1,211 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from utils.filter_index import CATEGORY_FILTERS, INCOME_LABELS, filter_index, income_bins
+from utils.filter_spec import FilterSpec
+from utils.shared_store import shared_artifact
+
+# Cube dimensions: the global filter dimensions plus other low-cardinality breakdowns.
+# 'INCOME_BAND' is the sidebar income filter's INCOME_LABELS band, as in FilterSpec.selections(),
+# not the quartile INCOME_BRACKET column;
+# 'AGE_BAND' is AGE_YEARS in bands of AGE_BAND_YEARS, labelled by their first age.
+CUBE_DIMENSIONS = list(CATEGORY_FILTERS) + ['INCOME_BAND', 'NAME_CONTRACT_TYPE', 'OCCUPATION_TYPE', 'AGE_BAND']
+
+# Width of the age bands; an age range ending inside a band reads that band's rows from the FilterIndex
+AGE_BAND_YEARS = 5
+
+# Per-row quantities summed in every cell, over all rows and over defaulters (TARGET == 1)
+CUBE_MEASURES = {
+    'AMT_INCOME_TOTAL': lambda df: df['AMT_INCOME_TOTAL'],
+    'AMT_CREDIT': lambda df: df['AMT_CREDIT'],
+    'AMT_ANNUITY': lambda df: df['AMT_ANNUITY'],
+    'AGE_YEARS': lambda df: df['AGE_YEARS'],
+    'EMPLOYMENT_YEARS': lambda df: df['EMPLOYMENT_YEARS'],
+    'CNT_FAM_MEMBERS': lambda df: df['CNT_FAM_MEMBERS'],
+    'HAS_CHILDREN': lambda df: df['CNT_CHILDREN'] > 0,
+    'EMPLOYED': lambda df: df['EMPLOYMENT_YEARS'] > 0,
+}
+
+# Columns CUBE_MEASURES read, with TARGET
+CUBE_SOURCE_COLUMNS = ['TARGET', 'AMT_INCOME_TOTAL', 'AMT_CREDIT', 'AMT_ANNUITY', 'AGE_YEARS', 'EMPLOYMENT_YEARS',
+                       'CNT_FAM_MEMBERS', 'CNT_CHILDREN']
+
+
+class Cube:
+    """
+    Row counts, TARGET sums and measure sums per combination of dimension values.
+
+    Only combinations that occur are stored, so the number of cells is
+    bounded by the dimensions' cardinalities, not by the number of rows.
+    Filtered totals and breakdowns are reductions over the cells.
+
+    Ages are stored in bands, which keeps the cube small. A filter's age
+    range covers some bands entirely, read from the cells, and may end
+    inside at most two bands: the rows it keeps there are found with the
+    dataset's FilterIndex and summed directly.
+
+    Every cell has the columns ``count``, ``TARGET`` and, for each measure
+    in CUBE_MEASURES, ``<measure>`` (sum over all rows) and
+    ``<measure>_TARGET`` (sum over defaulters).
+
+    Attributes:
+        labels (dict): dimension -> pd.Index of its values.
+        columns (list): Names of the summed columns.
+        band_ages (np.ndarray): (youngest, oldest) age present in each age band.
+        source (pd.DataFrame): The dataset, for the rows of partly selected
+            bands; not published with the cube (see ``dataset_cube``).
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        codes = {}
+        self.labels = {}
+        for dim in CUBE_DIMENSIONS:
+            if dim == 'AGE_BAND':
+                ages = df['AGE_YEARS'].to_numpy()
+                first = ages.min() // AGE_BAND_YEARS
+                bands = ages // AGE_BAND_YEARS - first
+                self.labels[dim] = pd.RangeIndex(first * AGE_BAND_YEARS, (bands.max() + first + 1) * AGE_BAND_YEARS,
+                                                 AGE_BAND_YEARS, name=dim)
+                codes[dim] = bands.astype(np.int64)
+                extremes = pd.Series(ages).groupby(bands).agg(['min', 'max'])
+                self.band_ages = extremes.reindex(range(len(self.labels[dim]))).to_numpy(dtype=np.float64)
+                continue
+            if dim == 'INCOME_BAND':
+                series = pd.cut(df['AMT_INCOME_TOTAL'], bins=income_bins(df), labels=INCOME_LABELS)
+            else:
+                series = df[dim]
+            self.labels[dim] = pd.Index(series.cat.categories, name=dim)
+            dim_codes = series.cat.codes.to_numpy().astype(np.int64)
+            codes[dim] = np.where(dim_codes < 0, len(self.labels[dim]), dim_codes)  # missing -> extra slot
+
+        # One mixed-radix key per row, then one cell per distinct key
+        sizes = [len(self.labels[dim]) + 1 for dim in CUBE_DIMENSIONS]
+        key = np.zeros(len(df), dtype=np.int64)
+        for dim, size in zip(CUBE_DIMENSIONS, sizes):
+            key = key * size + codes[dim]
+        keys, cells = np.unique(key, return_inverse=True)
+        self.row_cells = cells.astype(np.int32)
+
+        self.codes = {}
+        for dim, size in reversed(list(zip(CUBE_DIMENSIONS, sizes))):
+            keys, self.codes[dim] = np.divmod(keys, size)
+
+        self.columns = ['count', 'TARGET']
+        for name in CUBE_MEASURES:
+            self.columns += [name, f'{name}_TARGET']
+        self.values = np.column_stack([np.bincount(cells, weights=column, minlength=len(keys))
+                                       for column in _row_columns(df)])
+        self.source = df
+
+    def __getstate__(self):
+        # Published without the dataset; dataset_cube sets it again in every process
+        return {**self.__dict__, 'source': None}
+
+    @property
+    def n_cells(self) -> int:
+        return len(self.values)
+
+    def cell_mask(self, spec: FilterSpec = None) -> np.ndarray:
+        """Boolean mask of the cells matching a filter, of the age bands it selects entirely."""
+        mask = np.ones(self.n_cells, dtype=bool)
+        if spec is None:
+            return mask
+        for dim, selection in spec.selections().items():
+            if dim == 'AGE_YEARS':
+                low, high = selection
+                whole = (self.band_ages[:, 0] >= low) & (self.band_ages[:, 1] <= high)
+                mask &= whole[self.codes['AGE_BAND']]
+            elif len(selection):
+                selected = self.labels[dim].get_indexer(list(selection))
+                mask &= np.isin(self.codes[dim], selected[selected >= 0])
+        return mask
+
+    def edge_rows(self, spec: FilterSpec = None) -> np.ndarray:
+        """Positions of the rows a filter keeps in the age bands it selects only partly."""
+        if spec is None or spec.age_range is None:
+            return np.empty(0, dtype=np.int64)
+        low, high = spec.age_range
+        youngest, oldest = self.band_ages[:, 0], self.band_ages[:, 1]
+        partial = (oldest >= low) & (youngest <= high) & ((youngest < low) | (oldest > high))
+        selections = spec.selections()
+        index = filter_index(self.source)
+        rows = [np.flatnonzero(index.mask({**selections, 'AGE_YEARS': (max(low, int(youngest[band])),
+                                                                       min(high, int(oldest[band])))}))
+                for band in np.flatnonzero(partial)]
+        return np.concatenate(rows) if rows else np.empty(0, dtype=np.int64)
+
+    def totals(self, spec: FilterSpec = None) -> pd.Series:
+        """Sum of every column over the rows matching a filter."""
+        sums = self.values[self.cell_mask(spec)].sum(axis=0)
+        rows = self.edge_rows(spec)
+        if len(rows):
+            sums = sums + np.column_stack(_row_columns(self._edge_frame(rows))).sum(axis=0)
+        return pd.Series(sums, index=self.columns)
+
+    def breakdown(self, dim: str, spec: FilterSpec = None) -> pd.DataFrame:
+        """
+        Sum every column per value of one dimension, over the rows matching a filter.
+
+        Like ``groupby(dim, observed=True).sum()``: values with no matching
+        rows and missing values are left out, and the rest keep the order
+        of the dimension's categories.
+        """
+        mask = self.cell_mask(spec)
+        size = len(self.labels[dim]) + 1
+        codes = self.codes[dim][mask]
+        sums = np.column_stack([np.bincount(codes, weights=column, minlength=size)
+                                for column in self.values[mask].T])
+        rows = self.edge_rows(spec)
+        if len(rows):
+            codes = self.codes[dim][self.row_cells[rows]]
+            sums = sums + np.column_stack([np.bincount(codes, weights=column, minlength=size)
+                                     for column in _row_columns(self._edge_frame(rows))])
+        frame = pd.DataFrame(sums[:-1], index=self.labels[dim], columns=self.columns)
+        return frame[frame['count'] > 0]
+
+    def rate(self, dim: str, column: str = 'TARGET', spec: FilterSpec = None) -> pd.Series:
+        """Mean of ``column`` per value of ``dim``, e.g. the default rate."""
+        frame = self.breakdown(dim, spec)
+        return frame[column] / frame['count']
+
+    def shares(self, dim: str, spec: FilterSpec = None) -> pd.Series:
+        """Row share of each value of ``dim``, largest first, like value_counts(normalize=True)."""
+        counts = self.breakdown(dim, spec)['count']
+        return (counts / counts.sum()).sort_values(ascending=False, kind="stable")
+
+
+    def _edge_frame(self, rows):
+        # Only the columns the measures read, at the given rows
+        columns = self.source.columns.get_indexer(CUBE_SOURCE_COLUMNS)
+        return self.source.iloc[rows, columns]
+
+
+def _row_columns(df):
+    # Per-row values of Cube.columns: count, TARGET, then each measure over all rows and defaulters
+    target = df['TARGET'].to_numpy().astype(np.float64)
+    columns = [np.ones(len(df)), target]
+    for measure in CUBE_MEASURES.values():
+        x = measure(df).to_numpy().astype(np.float64)
+        columns += [x, x * target]
+    return columns
+
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+def _cached_cube(digest: str, _df: pd.DataFrame) -> Cube:
+    cube = shared_artifact(_df, "cube", Cube)
+    cube.source = _df
+    return cube
+
+
+def dataset_cube(df: pd.DataFrame) -> Cube:
+    """
+    Return the Cube of a dataset, built once per dataset.
+
+    Frames from ``load_dataset`` are keyed by their source digest and share
+    one cube across sessions; any other frame gets a fresh cube.
+    """
+    digest = df.attrs.get("source_digest")
+    if digest is None:
+        return Cube(df)
+    return _cached_cube(digest, df)
@@ -0,0 +1,244 @@
+import colorsys
+import itertools
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+from matplotlib.colors import to_rgba_array
+
+from utils.boxplots import box_stats
+from utils.filter_spec import FilterSpec
+from utils.filters import filtered_rows
+
+# Bins per axis used to estimate the bandwidth before the density grid is known
+BANDWIDTH_BINS = 256
+
+# The kernel is truncated this many bandwidths from its center
+KERNEL_REACH = 4
+
+# seaborn defaults, so the plots keep their look
+VIOLIN_GRIDSIZE, VIOLIN_CUT = 100, 2
+JOINT_GRIDSIZE, JOINT_CUT = 200, 3
+
+
+def binned_kde(points: np.ndarray, gridsize: int, cut: float):
+    """
+    Gaussian KDE of 1-D or 2-D points, evaluated on a regular grid.
+
+    The points are linearly binned onto the grid and convolved with the
+    kernel by FFT, so the cost depends on the grid size rather than the
+    number of points (apart from the O(n) binning). The bandwidth follows
+    Scott's rule on the covariance of the binned data, as in
+    scipy.stats.gaussian_kde, and the grid spans ``cut`` bandwidths beyond
+    the data, as in seaborn.
+
+    Args:
+        points (np.ndarray): Array of shape (n, d), d in (1, 2), without NaNs.
+        gridsize (int): Grid points per axis.
+        cut (float): Bandwidths the grid extends past the data.
+
+    Returns:
+        tuple: (axes, density): a list of d grid coordinate arrays, and the
+        density on their product grid (shape (gridsize,) * d, indexed in
+        the order of the point columns). None if the points have no spread.
+    """
+    n, d = points.shape
+    lo, hi = points.min(axis=0), points.max(axis=0)
+    if n < 2 or np.any(hi <= lo):
+        return None
+
+    # Bandwidth from the moments of a first binning over the data range
+    counts, axes = _linear_bin(points, lo, hi, BANDWIDTH_BINS)
+    centers = np.stack([grid.ravel() for grid in np.meshgrid(*axes, indexing="ij")], axis=1)
+    weights = counts.ravel()
+    covariance = np.atleast_2d(np.cov(centers.T, aweights=weights))
+    if np.linalg.det(covariance) <= 0:
+        return None
+    kernel_cov = covariance * n ** (-2 / (d + 4))
+    bandwidth = np.sqrt(np.diag(kernel_cov))
+
+    # Density grid spanning `cut` bandwidths past the data
+    counts, axes = _linear_bin(points, lo - cut * bandwidth, hi + cut * bandwidth, gridsize)
+    step = np.array([grid[1] - grid[0] for grid in axes])
+
+    reach = np.minimum(np.ceil(KERNEL_REACH * bandwidth / step).astype(int), gridsize - 1)
+    offsets = np.meshgrid(*[np.arange(-r, r + 1) * s for r, s in zip(reach, step)], indexing="ij")
+    offsets = np.stack(offsets, axis=-1)
+    kernel = np.exp(-0.5 * np.einsum("...i,ij,...j->...", offsets, np.linalg.inv(kernel_cov), offsets))
+    kernel /= kernel.sum()
+
+    density = _fft_convolve(counts, kernel) / (n * np.prod(step))
+    return axes, np.clip(density, 0, None)
+
+
+def _linear_bin(points, lo, hi, size):
+    # Spread each point over its 2**d nearest grid nodes, weighted by proximity
+    n, d = points.shape
+    axes = [np.linspace(l, h, size) for l, h in zip(lo, hi)]
+    position = (points - lo) / ((hi - lo) / (size - 1))
+    base = np.clip(np.floor(position).astype(np.int64), 0, size - 2)
+    frac = np.clip(position - base, 0, 1)  # rounding can put the extreme points a hair past the grid
+    counts = np.zeros(size ** d)
+    for corner in itertools.product([0, 1], repeat=d):
+        corner = np.array(corner)
+        weight = np.prod(np.where(corner, frac, 1 - frac), axis=1)
+        flat = np.ravel_multi_index(tuple((base + corner).T), (size,) * d)
+        counts += np.bincount(flat, weights=weight, minlength=size ** d)
+    return counts.reshape((size,) * d), axes
+
+
+def _fft_convolve(counts, kernel):
+    # Linear (not circular) convolution, cropped back to the grid
+    shape = [c + k - 1 for c, k in zip(counts.shape, kernel.shape)]
+    full = np.fft.irfftn(np.fft.rfftn(counts, shape) * np.fft.rfftn(kernel, shape), shape)
+    crop = tuple(slice(k // 2, k // 2 + c) for c, k in zip(counts.shape, kernel.shape))
+    return full[crop]
+
+
+def iso_proportion_levels(density: np.ndarray, levels=10, thresh=0.05) -> np.ndarray:
+    """
+    Density values whose contours enclose fixed proportions of the mass.
+
+    Same levels as ``sns.kdeplot(levels=levels, thresh=thresh)``.
+    """
+    proportions = np.linspace(thresh, 1, levels)
+    values = np.sort(density.ravel())[::-1]
+    cumulative = np.cumsum(values) / values.sum()
+    return np.take(values, np.searchsorted(cumulative, 1 - proportions), mode="clip")
+
+
+# ---- Cached grids per dataset and filter ----
+def joint_density(df: pd.DataFrame, x: str, y: str, spec: FilterSpec = None):
+    """
+    Return the 2-D density of two columns over the rows a filter keeps.
+
+    Returns:
+        tuple | None: (xx, yy, density) for ``ax.contourf``, or None if the
+        density cannot be estimated.
+    """
+    digest = df.attrs.get("source_digest")
+    if digest is None:
+        return _joint_density(df, x, y, spec)
+    return _cached_joint_density(digest, x, y, spec, df)
+
+
+@st.cache_resource(max_entries=32, show_spinner=False)
+def _cached_joint_density(digest, x, y, spec, _df):
+    return _joint_density(_df, x, y, spec)
+
+
+def _joint_density(df, x, y, spec):
+    points = np.column_stack([_values(df, x, spec), _values(df, y, spec)]).astype(np.float64)
+    points = points[~np.isnan(points).any(axis=1)]
+    result = binned_kde(points, JOINT_GRIDSIZE, JOINT_CUT)
+    if result is None:
+        return None
+    (xs, ys), density = result
+    xx, yy = np.meshgrid(xs, ys)
+    return xx, yy, density.T
+
+
+def violin_densities(df: pd.DataFrame, column: str, by: str, spec: FilterSpec = None) -> list:
+    """
+    Return one density curve and box summary per group, for ``draw_violins``.
+
+    Returns:
+        list: dicts with 'label', 'support', 'density' (None if the group
+        has no spread) and 'stats' (see ``utils.boxplots.box_stats``).
+    """
+    digest = df.attrs.get("source_digest")
+    if digest is None:
+        return _violin_densities(df, column, by, spec)
+    return _cached_violin_densities(digest, column, by, spec, df)
+
+
+@st.cache_resource(max_entries=32, show_spinner=False)
+def _cached_violin_densities(digest, column, by, spec, _df):
+    return _violin_densities(_df, column, by, spec)
+
+
+def _violin_densities(df, column, by, spec):
+    values = _values(df, column, spec).astype(np.float64)
+    groups = _values(df, by, spec)
+    violins = []
+    for label in sorted(pd.unique(groups[~pd.isna(groups)]).tolist()):
+        group = values[groups == label]
+        group = group[~np.isnan(group)]
+        if len(group) == 0:
+            continue
+        result = binned_kde(group[:, None], VIOLIN_GRIDSIZE, VIOLIN_CUT)
+        support, density = (result[0][0], result[1]) if result is not None else (None, None)
+        violins.append({'label': label, 'support': support, 'density': density,
+                        'stats': box_stats(group, label)})
+    return violins
+
+
+def _values(df, column, spec):
+    values = df[column].to_numpy()
+    rows = filtered_rows(df, spec)
+    return values if rows is None else values[rows]
+
+
+# ---- Renderers ----
+def draw_violins(ax, violins: list, colors, width=0.8, linewidth=None):
+    """
+    Draw violins with an inner box, in the style of ``sns.violinplot``.
+
+    Every violin is scaled by the largest density of all of them, so they
+    share one area scale (seaborn's ``density_norm="area"``).
+
+    Args:
+        ax: Matplotlib axes.
+        violins (list): Output of ``violin_densities``.
+        colors (list): Face color per violin (cycled).
+        width (float): Width of the widest violin.
+        linewidth (float, optional): Outline width; seaborn's default if None.
+    """
+    import matplotlib as mpl
+
+    if linewidth is None:
+        linewidth = 1.25 * mpl.rcParams["patch.linewidth"]
+    colors = list(colors)
+    # Outline gray derived from the lightest-to-darkest palette, as seaborn does
+    lum = min(colorsys.rgb_to_hls(*rgb[:3])[1] for rgb in to_rgba_array(colors)) * .6
+    linecolor = (lum, lum, lum)
+    box_width = linewidth * 4.5
+
+    peaks = [v['density'].max() for v in violins if v['density'] is not None]
+    peak = max(peaks) if peaks else 1
+    for position, violin in enumerate(violins):
+        color = colors[position % len(colors)]
+        stats = violin['stats']
+        if violin['density'] is None:
+            ax.plot([position - width / 2, position + width / 2], [stats['mean']] * 2,
+                    color=linecolor, linewidth=linewidth)
+        else:
+            span = violin['density'] / peak * width / 2
+            ax.fill_betweenx(violin['support'], position - span, position + span,
+                             facecolor=color, edgecolor=linecolor, linewidth=linewidth)
+        ax.plot([position, position], [stats['whislo'], stats['whishi']],
+                color=linecolor, linewidth=box_width / 3)
+        ax.plot([position, position], [stats['q1'], stats['q3']], color=linecolor, linewidth=box_width)
+        ax.plot([position], [stats['med']], marker="_", markersize=box_width / 1.2,
+                markeredgewidth=box_width / 5, markeredgecolor="w", markerfacecolor="w", color=linecolor)
+
+    ax.set_xticks(range(len(violins)))
+    ax.set_xticklabels([str(v['label']) for v in violins])
+    ax.set_xlim(-0.5, len(violins) - 0.5)
+
+
+def draw_density_contours(ax, joint, levels=10, thresh=0.05, **contour_kws):
+    """
+    Draw a filled 2-D density like ``sns.kdeplot(x=..., y=..., fill=True)``.
+
+    Args:
+        ax: Matplotlib axes.
+        joint (tuple): Output of ``joint_density``; nothing is drawn if None.
+        levels (int): Number of iso-proportion levels.
+        thresh (float): Lowest iso-proportion level drawn.
+        **contour_kws: Passed to ``ax.contourf``, e.g. cmap.
+    """
+    if joint is None:
+        return None
+    xx, yy, density = joint
+    return ax.contourf(xx, yy, density, levels=iso_proportion_levels(density, levels, thresh), **contour_kws)
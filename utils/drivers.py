@@ -0,0 +1,242 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from utils.filter_spec import FilterSpec
+from utils.filters import filtered_rows
+from utils.shared_store import shared_artifact
+
+# Quantile bins per numeric column; columns with fewer distinct values keep one bin per value
+DRIVER_BINS = 10
+
+# Most frequent levels kept per categorical column; the rest share an "Other" bin
+DRIVER_MAX_LEVELS = 50
+
+# Added to every bin's counts so empty bins get a finite weight of evidence
+WOE_SMOOTHING = 0.5
+
+# Columns never ranked as drivers
+EXCLUDED_COLUMNS = ['TARGET', 'SK_ID_CURR']
+
+# Rows per block when counting; bounds the temporary memory
+DRIVER_CHUNK_ROWS = 32768
+
+
+class DriverIndex:
+    """
+    Every candidate driver column binned once into small integer codes.
+
+    Numeric columns are cut at quantiles of the full dataset, categorical
+    and object columns get one code per level, and missing values get a
+    bin of their own. The bins of all columns are numbered consecutively
+    (column j owns codes ``offsets[j]`` to ``offsets[j + 1] - 1``), so the
+    row and default counts of every bin of every column, for any set of
+    rows, come from one ``np.bincount``.
+
+    Attributes:
+        columns (pd.Index): Ranked columns.
+        codes (np.ndarray): (n_rows, n_columns) uint8 bin codes, per column.
+        offsets (np.ndarray): First global code of each column, plus the total.
+        labels (list): Bin labels (str) of each column.
+        target (np.ndarray): TARGET as float64.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        columns, codes, self.labels = [], [], []
+        for column in df.columns:
+            if column in EXCLUDED_COLUMNS:
+                continue
+            binned = _bin_column(df[column])
+            if binned is None:
+                continue
+            columns.append(column)
+            codes.append(binned[0])
+            self.labels.append(binned[1])
+        self.columns = pd.Index(columns)
+        self.codes = np.column_stack(codes).astype(np.uint8)
+        self.offsets = np.concatenate([[0], np.cumsum([len(labels) for labels in self.labels])])
+        self.target = df['TARGET'].to_numpy().astype(np.float64)
+
+    def bin_counts(self, rows=None):
+        """
+        Return the rows and defaults in every bin, over some rows.
+
+        Args:
+            rows (np.ndarray, optional): Row positions; all rows if None.
+
+        Returns:
+            tuple: (counts, defaults), float64 arrays indexed by global code.
+        """
+        size = self.offsets[-1]
+        counts, defaults = np.zeros(size), np.zeros(size)
+        n = len(self.codes) if rows is None else len(rows)
+        for start in range(0, n, DRIVER_CHUNK_ROWS):
+            block = slice(start, start + DRIVER_CHUNK_ROWS) if rows is None else rows[start:start + DRIVER_CHUNK_ROWS]
+            flat = self.codes[block].astype(np.int64) + self.offsets[:-1]
+            counts += np.bincount(flat.ravel(), minlength=size)
+            target = np.repeat(self.target[block], len(self.columns))
+            defaults += np.bincount(flat.ravel(), weights=target, minlength=size)
+        return counts, defaults
+
+
+def _bin_column(series: pd.Series):
+    # (codes, labels) of one column, missing values last; None if it cannot be binned
+    if isinstance(series.dtype, pd.CategoricalDtype) or series.dtype == object or series.dtype == bool:
+        values = series.astype(object)
+        levels = values.value_counts().index[:DRIVER_MAX_LEVELS]
+        codes = pd.Index(levels).get_indexer(values)
+        labels = [str(level) for level in levels]
+        other = values.notna().to_numpy() & (codes < 0)
+        if other.any():
+            codes = np.where(other, len(labels), codes)
+            labels.append("Other")
+    elif pd.api.types.is_numeric_dtype(series):
+        x = series.to_numpy().astype(np.float64)
+        present = x[~np.isnan(x)]
+        if len(present) == 0:
+            return None
+        distinct = np.unique(present)
+        if len(distinct) <= DRIVER_BINS:
+            codes = np.searchsorted(distinct, x)
+            labels = [f"{value:g}" for value in distinct]
+        else:
+            edges = np.unique(np.quantile(present, np.linspace(0, 1, DRIVER_BINS + 1)))
+            codes = np.clip(np.searchsorted(edges, x, side="right") - 1, 0, len(edges) - 2)
+            labels = [f"[{lo:g}, {hi:g})" for lo, hi in zip(edges[:-1], edges[1:])]
+            labels[-1] = labels[-1][:-1] + "]"
+        codes = np.where(np.isnan(x), -1, codes)
+    else:
+        return None
+    missing = codes < 0
+    if missing.any():
+        codes = np.where(missing, len(labels), codes)
+        labels.append("Missing")
+    return codes, labels
+
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+def _cached_driver_index(digest: str, _df: pd.DataFrame) -> DriverIndex:
+    return shared_artifact(_df, "driver_index", DriverIndex)
+
+
+def driver_index(df: pd.DataFrame) -> DriverIndex:
+    """Return the DriverIndex of a dataset, built once per dataset."""
+    digest = df.attrs.get("source_digest")
+    if digest is None:
+        return DriverIndex(df)
+    return _cached_driver_index(digest, df)
+
+
+def driver_ranking(df: pd.DataFrame, spec: FilterSpec = None) -> pd.DataFrame:
+    """
+    Rank every column by its Information Value and mutual information with TARGET.
+
+    All columns are scored in one batch from the bin counts of
+    ``DriverIndex``. Unlike a correlation, both measures pick up
+    non-linear and categorical drivers. Cached process-wide per dataset
+    and filter.
+
+    Args:
+        df (pd.DataFrame): The full dataset from ``load_dataset``.
+        spec (FilterSpec, optional): Filter to apply; all rows if None.
+
+    Returns:
+        pd.DataFrame: Indexed by column, with 'iv' (Information Value),
+        'mutual_info' (in nats) and 'bins', sorted by IV, largest first.
+    """
+    digest = df.attrs.get("source_digest")
+    if digest is None:
+        return _driver_ranking(df, spec)
+    return _cached_driver_ranking(digest, spec, df)
+
+
+def woe_table(df: pd.DataFrame, column: str, spec: FilterSpec = None) -> pd.DataFrame:
+    """
+    Return the weight-of-evidence table of one column.
+
+    Returns:
+        pd.DataFrame: One row per bin, with 'count', 'defaults',
+        'default_rate', 'woe' (log of the share of repaid over the share of
+        defaulters, so risky bins are negative) and 'iv' (the bin's share
+        of the Information Value).
+    """
+    index = driver_index(df)
+    j = index.columns.get_loc(column)
+    counts, defaults = _bin_counts(df, spec)
+    bins = slice(index.offsets[j], index.offsets[j + 1])
+    counts, defaults = counts[bins], defaults[bins]
+    woe, iv = _woe(counts, defaults, (counts - defaults).sum(), defaults.sum())
+    with np.errstate(invalid="ignore", divide="ignore"):
+        rate = defaults / counts
+    return pd.DataFrame({'count': counts.astype(np.int64), 'defaults': defaults.astype(np.int64),
+                         'default_rate': rate, 'woe': woe, 'iv': iv},
+                        index=pd.Index(index.labels[j], name=column))
+
+
+def _bin_counts(df, spec):
+    digest = df.attrs.get("source_digest")
+    if digest is None:
+        return _filtered_bin_counts(df, spec)
+    return _cached_bin_counts(digest, spec, df)
+
+
+@st.cache_resource(max_entries=32, show_spinner=False)
+def _cached_bin_counts(digest, spec, _df):
+    if spec is None:
+        return _filtered_bin_counts(_df, None)
+    return _filtered_bin_counts(_df, spec, total=_cached_bin_counts(digest, None, _df))
+
+
+def _filtered_bin_counts(df, spec, total=None):
+    # A filter keeping most rows is counted as the totals minus the dropped rows
+    index = driver_index(df)
+    rows = filtered_rows(df, spec)
+    if total is None and (rows is None or len(rows) > len(df) // 2):
+        total = index.bin_counts()
+    if rows is None:
+        return total
+    if len(rows) <= len(df) // 2:
+        return index.bin_counts(rows)
+    dropped = np.ones(len(df), dtype=bool)
+    dropped[rows] = False
+    counts, defaults = index.bin_counts(np.flatnonzero(dropped))
+    return total[0] - counts, total[1] - defaults
+
+
+def _woe(counts, defaults, total_goods, total_defaults):
+    # Per-bin weight of evidence and IV contribution, given the totals of the bins' columns
+    good_share = (counts - defaults + WOE_SMOOTHING) / np.maximum(total_goods, 1)
+    bad_share = (defaults + WOE_SMOOTHING) / np.maximum(total_defaults, 1)
+    woe = np.log(good_share / bad_share)
+    return woe, (good_share - bad_share) * woe
+
+
+@st.cache_resource(max_entries=32, show_spinner=False)
+def _cached_driver_ranking(digest, spec, _df):
+    return _driver_ranking(_df, spec)
+
+
+def _driver_ranking(df, spec):
+    index = driver_index(df)
+    counts, defaults = _bin_counts(df, spec)
+    starts = index.offsets[:-1]
+    column_of_bin = np.repeat(np.arange(len(index.columns)), np.diff(index.offsets))
+
+    # Weight of evidence, with every column's shares normalized over its own bins
+    total_goods = np.add.reduceat(counts - defaults, starts)[column_of_bin]
+    total_defaults = np.add.reduceat(defaults, starts)[column_of_bin]
+    iv = np.add.reduceat(_woe(counts, defaults, total_goods, total_defaults)[1], starts)
+
+    # Mutual information between the bin and TARGET, from the joint frequencies
+    n = counts.sum() / len(index.columns)
+    p_default = defaults.sum() / len(index.columns) / n if n else 0.0
+    with np.errstate(invalid="ignore", divide="ignore"):
+        terms = 0.0
+        for joint, marginal in ((defaults, p_default), (counts - defaults, 1 - p_default)):
+            p_joint = joint / n
+            terms = terms + np.where(p_joint > 0, p_joint * np.log(p_joint / (counts / n * marginal)), 0.0)
+    mutual_info = np.add.reduceat(terms, starts)
+
+    ranking = pd.DataFrame({'iv': iv, 'mutual_info': mutual_info, 'bins': np.diff(index.offsets)},
+                           index=index.columns)
+    return ranking.sort_values('iv', ascending=False)
@@ -0,0 +1,244 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from utils.shared_store import shared_artifact
+
+# Sidebar multiselect filters: column -> label
+CATEGORY_FILTERS = {
+    'CODE_GENDER': "Gender",
+    'NAME_EDUCATION_TYPE': "Education",
+    'NAME_FAMILY_STATUS': "Family Status",
+    'NAME_HOUSING_TYPE': "Housing Type",
+}
+
+INCOME_LABELS = ['Low (0–2L)', 'Medium (2–5L)', 'High (5–10L)', 'Very High (10L+)']
+
+# Set bits per byte value, for counting rows in a packed bitset
+_POPCOUNT = np.array([bin(byte).count("1") for byte in range(256)], dtype=np.uint8)
+
+
+def income_bins(df: pd.DataFrame) -> list:
+    """Return the income bracket edges for the sidebar filter."""
+    max_income = df['AMT_INCOME_TOTAL'].max()
+    # Ensure the last bin is bigger than the previous one
+    if max_income <= 1000000:
+        max_income = 1000001  # Slightly larger than the previous boundary
+    return [0, 200000, 500000, 1000000, max_income]
+
+
+class FilterIndex:
+    """
+    Precomputed bitsets that answer any sidebar filter without scanning rows.
+
+    Every row is one bit; bitsets are packed 8 rows per byte. There is one
+    bitset per category value of each CATEGORY_FILTERS column and per
+    income bracket, and one cumulative bitset per age (rows with
+    AGE_YEARS <= age), so an age range is a single AND NOT. A filter ORs
+    the bitsets selected within a dimension and ANDs the dimensions, which
+    touches n_rows / 8 bytes per bitset involved.
+
+    Attributes:
+        n_rows (int): Rows in the indexed frame.
+        options (dict): column -> category values, in order of first appearance.
+        min_age, max_age (int): Range of AGE_YEARS.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.n_rows = len(df)
+        self.options = {}
+        self._codes = {}
+        self._code_of = {}
+        self._bitsets = {}
+        for col in CATEGORY_FILTERS:
+            codes = df[col].cat.codes.to_numpy()
+            present = pd.unique(codes[codes >= 0])
+            self.options[col] = list(df[col].cat.categories[present])
+            self._codes[col] = codes
+            self._code_of[col] = dict(zip(self.options[col], present))
+            self._bitsets[col] = {value: np.packbits(codes == code)
+                                  for value, code in self._code_of[col].items()}
+
+        self._ages = df['AGE_YEARS'].to_numpy()
+        self.min_age, self.max_age = int(self._ages.min()), int(self._ages.max())
+        self._age_at_most = np.stack([np.packbits(self._ages <= age)
+                                      for age in range(self.min_age, self.max_age + 1)])
+
+        # The sidebar's fixed INCOME_LABELS bands, not the quartile INCOME_BRACKET column
+        bands = pd.cut(df['AMT_INCOME_TOTAL'], bins=income_bins(df), labels=INCOME_LABELS)
+        self._codes['INCOME_BAND'] = bands.cat.codes.to_numpy()
+        self._code_of['INCOME_BAND'] = {label: code for code, label in enumerate(INCOME_LABELS)}
+        self._bitsets['INCOME_BAND'] = {label: np.packbits(self._codes['INCOME_BAND'] == code)
+                                        for label, code in self._code_of['INCOME_BAND'].items()}
+
+        self._all = np.packbits(np.ones(self.n_rows, dtype=bool))
+
+    def bits(self, selections: dict, age_range=None) -> np.ndarray:
+        """
+        Return the packed bitset of rows matching a filter.
+
+        Args:
+            selections (dict): column (a CATEGORY_FILTERS column or
+                'INCOME_BAND') -> selected values. An empty selection
+                does not filter that dimension.
+            age_range (tuple, optional): Inclusive (low, high) AGE_YEARS.
+
+        Returns:
+            np.ndarray: Packed uint8 bitset, one bit per row.
+        """
+        bits = self._all.copy()
+        for col, values in selections.items():
+            selected = self.dimension_bits(col, values)
+            if selected is not None:
+                bits &= selected
+        if age_range is not None:
+            selected = self.dimension_bits('AGE_YEARS', age_range)
+            if selected is not None:
+                bits &= selected
+        return bits
+
+    def dimension_bits(self, col, selection):
+        """
+        Return the packed bitset of one filter dimension.
+
+        Args:
+            col (str): A CATEGORY_FILTERS column, 'INCOME_BAND' or 'AGE_YEARS'.
+            selection: Selected values, or an inclusive (low, high) age range.
+
+        Returns:
+            np.ndarray | None: The bitset, or None if the selection keeps every row.
+        """
+        if col == 'AGE_YEARS':
+            low, high = selection
+            if low <= self.min_age and high >= self.max_age:
+                return None
+            bits = self._all.copy()
+            if high < self.max_age:
+                bits &= self._age_at_most_bits(high)
+            if low > self.min_age:
+                bits &= ~self._age_at_most_bits(low - 1)
+            return bits
+
+        if not len(selection):
+            return None
+        bitsets = self._bitsets[col]
+        bits = np.zeros_like(self._all)
+        for value in selection:
+            if value in bitsets:
+                bits |= bitsets[value]
+        return bits
+
+    def matches(self, col, selection, rows: np.ndarray) -> np.ndarray:
+        """
+        Evaluate one filter dimension on the given row positions only.
+
+        Returns:
+            np.ndarray: Boolean mask aligned with ``rows``.
+        """
+        if col == 'AGE_YEARS':
+            ages = self._ages[rows]
+            return (ages >= selection[0]) & (ages <= selection[1])
+        if not len(selection):
+            return np.ones(len(rows), dtype=bool)
+        codes = [self._code_of[col][value] for value in selection if value in self._code_of[col]]
+        return np.isin(self._codes[col][rows], codes)
+
+    def mask(self, selections: dict, age_range=None) -> np.ndarray:
+        """Return ``bits`` unpacked to a boolean row mask."""
+        return self.unpack(self.bits(selections, age_range))
+
+    def unpack(self, bits: np.ndarray) -> np.ndarray:
+        return np.unpackbits(bits, count=self.n_rows).view(bool)
+
+    def count(self, bits: np.ndarray) -> int:
+        """Number of rows in a bitset, without unpacking it."""
+        # Padding bits after the last row are never set: bits starts from _all and only narrows
+        return int(_POPCOUNT[bits].sum(dtype=np.int64))
+
+    def _age_at_most_bits(self, age):
+        if age < self.min_age:
+            return np.zeros_like(self._all)
+        return self._age_at_most[age - self.min_age]
+
+
+class FilterState:
+    """
+    One session's last filter, kept so a change only redoes what changed.
+
+    Holds the selection and bitset of every dimension and the row
+    positions of the combined result. When exactly one dimension changes
+    and its selection only narrows, the new predicate is evaluated on the
+    previously selected rows alone. Any other change recomputes the bitsets
+    of the changed dimensions and ANDs them with the cached ones.
+    """
+
+    def __init__(self, index: FilterIndex):
+        self.index = index
+        self.selections = {}
+        self._bits = {}
+        self.rows = np.arange(index.n_rows)
+
+    def apply(self, selections: dict) -> np.ndarray:
+        """
+        Update the state to a new filter.
+
+        Args:
+            selections (dict): Dimension -> selection, as for
+                ``FilterIndex.dimension_bits``.
+
+        Returns:
+            np.ndarray: Sorted positions of the rows that match.
+        """
+        changed = [col for col, selection in selections.items()
+                   if _key(selection) != _key(self.selections.get(col, ()))]
+        if not changed:
+            return self.rows
+
+        if len(changed) == 1 and self._narrows(changed[0], selections[changed[0]]):
+            col = changed[0]
+            self.rows = self.rows[self.index.matches(col, selections[col], self.rows)]
+            self._bits.pop(col, None)  # rebuilt from the index if a later change needs it
+        else:
+            for col in changed:
+                self._bits[col] = self.index.dimension_bits(col, selections[col])
+            bits = self.index._all.copy()
+            for col, selection in selections.items():
+                if col not in self._bits:
+                    self._bits[col] = self.index.dimension_bits(col, selection)
+                if self._bits[col] is not None:
+                    bits &= self._bits[col]
+            self.rows = np.flatnonzero(self.index.unpack(bits))
+
+        self.selections = {col: _key(selection) for col, selection in selections.items()}
+        return self.rows
+
+    def _narrows(self, col, selection) -> bool:
+        previous = self.selections.get(col)
+        if previous is None:
+            return False
+        if col == 'AGE_YEARS':
+            return previous[0] <= selection[0] and selection[1] <= previous[1]
+        # An empty selection keeps every row
+        return len(selection) > 0 and (not previous or set(selection) <= set(previous))
+
+
+def _key(selection):
+    return tuple(selection)
+
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+def _cached_index(digest: str, _df: pd.DataFrame) -> FilterIndex:
+    return shared_artifact(_df, "filter_index", FilterIndex)
+
+
+def filter_index(df: pd.DataFrame) -> FilterIndex:
+    """
+    Return the FilterIndex of a dataset, built once per dataset.
+
+    Frames from ``load_dataset`` are keyed by their source digest and share
+    one index across sessions; any other frame gets a fresh index.
+    """
+    digest = df.attrs.get("source_digest")
+    if digest is None:
+        return FilterIndex(df)
+    return _cached_index(digest, df)
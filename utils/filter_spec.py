@@ -0,0 +1,78 @@
+import math
+from dataclasses import dataclass
+
+# FilterSpec field -> (FilterIndex dimension, URL query parameter). The dimensions are
+# dataset columns, except INCOME_BAND: AMT_INCOME_TOTAL cut into the sidebar's
+# INCOME_LABELS bands, unrelated to the quartile INCOME_BRACKET column.
+DIMENSIONS = {
+    'gender': ('CODE_GENDER', 'gender'),
+    'education': ('NAME_EDUCATION_TYPE', 'education'),
+    'family_status': ('NAME_FAMILY_STATUS', 'family'),
+    'housing': ('NAME_HOUSING_TYPE', 'housing'),
+    'income_band': ('INCOME_BAND', 'income'),
+}
+
+
+@dataclass(frozen=True)
+class FilterSpec:
+    """
+    Canonical, hashable description of the global filters.
+
+    Selected values are stored as sorted tuples, and an age range covering
+    every age is stored as None, so two sidebars that keep the same rows
+    produce equal specs. Use a spec (with the dataset digest) as the key of
+    any cache of filtered frames, KPIs or charts.
+    """
+
+    gender: tuple = ()
+    education: tuple = ()
+    family_status: tuple = ()
+    housing: tuple = ()
+    income_band: tuple = ()
+    age_range: tuple | None = None
+
+    @classmethod
+    def create(cls, age_range=None, age_bounds=None, **selections) -> "FilterSpec":
+        """
+        Build a canonical spec from raw sidebar values.
+
+        Args:
+            age_range (tuple, optional): Inclusive (low, high) age.
+            age_bounds (tuple, optional): (min, max) age of the dataset; a
+                range covering it becomes None.
+            **selections: FilterSpec field -> selected values.
+        """
+        if age_range is not None:
+            age_range = (int(age_range[0]), int(age_range[1]))
+            if age_bounds is not None and age_range[0] <= age_bounds[0] and age_range[1] >= age_bounds[1]:
+                age_range = None
+        return cls(age_range=age_range,
+                   **{field: tuple(sorted(map(str, values))) for field, values in selections.items()})
+
+    def selections(self) -> dict:
+        """Return the spec as FilterIndex dimension -> selection."""
+        selections = {column: getattr(self, field) for field, (column, _) in DIMENSIONS.items()}
+        selections['AGE_YEARS'] = self.age_range or (-math.inf, math.inf)
+        return selections
+
+    def to_query_params(self) -> dict:
+        """Return the spec as URL query parameters (name -> list of values)."""
+        params = {param: list(getattr(self, field)) for field, (_, param) in DIMENSIONS.items()
+                  if getattr(self, field)}
+        if self.age_range is not None:
+            params['age'] = [str(age) for age in self.age_range]
+        return params
+
+    @classmethod
+    def from_query_params(cls, query_params) -> "FilterSpec":
+        """
+        Parse a spec from ``st.query_params`` (or any mapping with ``get_all``).
+
+        Unknown parameters are ignored and a malformed age range is dropped.
+        """
+        selections = {field: query_params.get_all(param) for field, (_, param) in DIMENSIONS.items()}
+        try:
+            age_range = tuple(int(age) for age in query_params.get_all('age'))
+        except ValueError:
+            age_range = ()
+        return cls.create(age_range=age_range if len(age_range) == 2 else None, **selections)
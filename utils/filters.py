@@ -1,73 +1,201 @@
+import os
+import threading
+from collections import OrderedDict
+
 import streamlit as st
 import pandas as pd
+import numpy as np
+
+from utils.filter_index import CATEGORY_FILTERS, INCOME_LABELS, FilterState, filter_index
+from utils.filter_spec import DIMENSIONS, FilterSpec
+from utils.load_data import freeze
+
+# Memory for filtered frames, shared by all sessions; override with HOME_CREDIT_FILTER_CACHE_MB
+FILTER_CACHE_BYTES = int(os.environ.get("HOME_CREDIT_FILTER_CACHE_MB", 256)) << 20
 
-def global_filters(df: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]:
+# Sidebar widget key of each FilterSpec field
+WIDGET_KEYS = {
+    'gender': 'gender_filter',
+    'education': 'education_filter',
+    'family_status': 'family_status_filter',
+    'housing': 'housing_filter',
+}
+
+def global_filters(df: pd.DataFrame) -> tuple[pd.DataFrame, FilterSpec]:
     """
     Display global filters and apply them to the DataFrame.
 
+    The sidebar produces a FilterSpec, which is mirrored to the URL query
+    parameters (and restored from them when a session starts). Filtered
+    frames are cached process-wide by dataset digest and spec, so every
+    page and session with the same filters shares one result (see
+    ``filtered_frame``).
+
+    Filters are answered from the dataset's FilterIndex (built once per
+    dataset), so no column is scanned on a rerun. The session's FilterState
+    remembers the last result, so changing one filter only redoes that
+    dimension, and narrowing it only rechecks the rows already selected.
+
     Args:
         df (pd.DataFrame): The original DataFrame with necessary columns.
 
     Returns:
-        tuple: (original DataFrame, filtered DataFrame)
+        tuple: (filtered DataFrame, FilterSpec of the applied filters)
     """
 
     st.sidebar.header("Global Filters")
+    index = filter_index(df)
+    columns = {field: column for field, (column, _) in DIMENSIONS.items()}
 
-    # Initialize session state for persistence across pages
+    # Initialize session state for persistence across pages, starting from the URL
     if 'filters_initialized' not in st.session_state:
         st.session_state.filters_initialized = True
-        st.session_state.age_range = (int(df['AGE_YEARS'].min()), int(df['AGE_YEARS'].max()))
-        st.session_state.income_bracket = []
-
-    # Gender filter
-    gender_options = df['CODE_GENDER'].dropna().unique()
-    gender = st.sidebar.multiselect("Gender", gender_options, key='gender_filter')
-
-    # Education filter
-    education_options = df['NAME_EDUCATION_TYPE'].dropna().unique()
-    education = st.sidebar.multiselect("Education", education_options, key='education_filter')
-
-    # Family Status filter
-    family_status_options = df['NAME_FAMILY_STATUS'].dropna().unique()
-    family_status = st.sidebar.multiselect("Family Status", family_status_options, key='family_status_filter')
-
-    # Housing Type filter
-    housing_options = df['NAME_HOUSING_TYPE'].dropna().unique()
-    housing = st.sidebar.multiselect("Housing Type", housing_options, key='housing_filter')
+        spec = FilterSpec.from_query_params(st.query_params)
+        for field, key in WIDGET_KEYS.items():
+            options = index.options[columns[field]]
+            st.session_state[key] = [value for value in options if str(value) in getattr(spec, field)]
+        low, high = spec.age_range or (index.min_age, index.max_age)
+        st.session_state.age_range = (max(low, index.min_age), min(high, index.max_age))
+        st.session_state.income_bracket = [label for label in INCOME_LABELS if label in spec.income_band]
+
+    # Gender, Education, Family Status and Housing Type filters
+    selections = {field: st.sidebar.multiselect(CATEGORY_FILTERS[columns[field]], index.options[columns[field]],
+                                                key=key)
+                  for field, key in WIDGET_KEYS.items()}
 
     # Age Range filter
-    min_age = int(df['AGE_YEARS'].min())
-    max_age = int(df['AGE_YEARS'].max())
-    age_range = st.sidebar.slider("Age Range", min_value=min_age, max_value=max_age,
+    age_range = st.sidebar.slider("Age Range", min_value=index.min_age, max_value=index.max_age,
                                   value=st.session_state.age_range, key='age_range_filter')
     st.session_state.age_range = age_range
 
-   
     # Income Bracket filter
-    max_income = df['AMT_INCOME_TOTAL'].max()
-    # Ensure the last bin is bigger than the previous one
-    if max_income <= 1000000:
-        max_income = 1000001  # Slightly larger than the previous boundary
-
-    bins = [0, 200000, 500000, 1000000, max_income]
-    labels = ['Low (0–2L)', 'Medium (2–5L)', 'High (5–10L)', 'Very High (10L+)']
-
-    df['income_bracket'] = pd.cut(df['AMT_INCOME_TOTAL'], bins=bins, labels=labels)
-
-    income_options = labels
-    income_bracket = st.sidebar.multiselect("Income Bracket", income_options,
+    income_bracket = st.sidebar.multiselect("Income Bracket", INCOME_LABELS,
                                             default=st.session_state.income_bracket, key='income_bracket_filter')
     st.session_state.income_bracket = income_bracket
 
+    spec = FilterSpec.create(age_range=age_range, age_bounds=(index.min_age, index.max_age),
+                             income_band=income_bracket, **selections)
+    st.session_state.filter_spec = spec
+
+    params = spec.to_query_params()
+    if {key: st.query_params.get_all(key) for key in st.query_params} != params:
+        st.query_params.from_dict(params)
+
     # Apply filters
-    filtered_df = df[
-        (df['CODE_GENDER'].isin(gender) if gender else True) &
-        (df['NAME_EDUCATION_TYPE'].isin(education) if education else True) &
-        (df['NAME_FAMILY_STATUS'].isin(family_status) if family_status else True) &
-        (df['NAME_HOUSING_TYPE'].isin(housing) if housing else True) &
-        (df['AGE_YEARS'].between(age_range[0], age_range[1])) &
-        (df['income_bracket'].isin(income_bracket) if income_bracket else True)
-    ]
-
-    return filtered_df
\ No newline at end of file
+    if st.session_state.get('filter_state') is None or st.session_state.filter_state.index is not index:
+        st.session_state.filter_state = FilterState(index)
+    state = st.session_state.filter_state
+
+    digest = df.attrs.get("source_digest")
+    if digest is None:
+        return df.iloc[state.apply(spec.selections())], spec
+    rows = _filtered_rows(digest, spec, lambda: state.apply(spec.selections()))
+    return _filtered_frame(digest, spec, df, rows), spec
+
+
+def filtered_rows(df: pd.DataFrame, spec: FilterSpec = None):
+    """
+    Return the positions in df of the rows a FilterSpec keeps.
+
+    Shares the process-wide cache ``global_filters`` fills, so this is
+    usually a lookup. Returns None (every row) if spec is None.
+    """
+    if spec is None:
+        return None
+    compute = lambda: np.flatnonzero(filter_index(df).mask(spec.selections()))
+    digest = df.attrs.get("source_digest")
+    if digest is None:
+        return compute()
+    return _filtered_rows(digest, spec, compute)
+
+
+def filtered_frame(df: pd.DataFrame, spec: FilterSpec) -> pd.DataFrame:
+    """
+    Return the rows a FilterSpec keeps, as ``global_filters`` does.
+
+    Shares the process-wide cache ``global_filters`` fills, so every page,
+    session and background job with the same filter gets the same frame.
+    A filter keeping every row returns df itself rather than a copy; the
+    others are kept in a FrameCache of FILTER_CACHE_BYTES.
+    """
+    digest = df.attrs.get("source_digest")
+    if digest is None:
+        return df.iloc[filtered_rows(df, spec)]
+    return _filtered_frame(digest, spec, df, filtered_rows(df, spec))
+
+
+@st.cache_resource(max_entries=32, show_spinner=False)
+def _filtered_rows(digest: str, spec: FilterSpec, _compute):
+    rows = _compute()
+    rows.flags.writeable = False
+    return rows
+
+
+class FrameCache:
+    """
+    Least-recently-used store of filtered frames, bounded in bytes.
+
+    Like ``ChartCache``, thread-safe, and sessions missing the same key at
+    once build it only once. Frames larger than max_bytes are not kept.
+
+    Attributes:
+        max_bytes (int): Total frame size kept; the oldest frames are evicted beyond it.
+        size (int): Bytes currently held.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._frames = OrderedDict()
+        self._building = {}
+        self._lock = threading.Lock()
+
+    def get_or_build(self, key, build) -> pd.DataFrame:
+        """Return the frame stored under key, calling ``build()`` to make it on a miss."""
+        with self._lock:
+            entry = self._frames.get(key)
+            if entry is not None:
+                self._frames.move_to_end(key)
+                return entry[0]
+            building = self._building.setdefault(key, threading.Lock())
+        try:
+            with building:
+                with self._lock:
+                    entry = self._frames.get(key)
+                if entry is not None:
+                    return entry[0]
+                frame = build()
+                self._put(key, frame, int(frame.memory_usage(index=True, deep=False).sum()))
+                return frame
+        finally:
+            with self._lock:
+                if self._building.get(key) is building:
+                    del self._building[key]
+
+    def _put(self, key, frame, nbytes):
+        if nbytes > self.max_bytes:
+            return
+        with self._lock:
+            self._frames[key] = (frame, nbytes)
+            self.size += nbytes
+            while self.size > self.max_bytes:
+                _, (_, evicted) = self._frames.popitem(last=False)
+                self.size -= evicted
+
+    def stats(self) -> dict:
+        """Return the entry count and bytes held."""
+        with self._lock:
+            return {'entries': len(self._frames), 'bytes': self.size}
+
+
+@st.cache_resource(show_spinner=False)
+def frame_cache() -> FrameCache:
+    """Return the process-wide cache of filtered frames."""
+    return FrameCache(FILTER_CACHE_BYTES)
+
+
+def _filtered_frame(digest: str, spec: FilterSpec, df: pd.DataFrame, rows) -> pd.DataFrame:
+    if len(rows) == len(df):
+        return df  # Every row: the shared dataset itself, not a copy of it
+    # Shared by every session, so read-only like the dataset itself
+    return frame_cache().get_or_build((digest, spec), lambda: freeze(df.iloc[rows]))
@@ -0,0 +1,93 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from utils.filter_spec import FilterSpec
+from utils.filters import filtered_rows
+from utils.shared_store import shared_artifact
+
+# Default number of equal-width bins, as in the page charts
+HISTOGRAM_BINS = 30
+
+# Columns with pre-binned histograms -> explicit bin edges (None: HISTOGRAM_BINS over the full range)
+HISTOGRAM_EDGES = {
+    'AGE_YEARS': None,
+    'AMT_INCOME_TOTAL': None,
+    'AMT_CREDIT': None,
+    'AMT_ANNUITY': None,
+    'EMPLOYMENT_YEARS': [0, 1, 3, 5, 10, 20, 30, 40, 50],
+    'CNT_CHILDREN': list(range(22)),  # One bin per number of children, up to 20
+}
+
+
+class HistogramIndex:
+    """
+    Fixed bin edges and per-row bin codes for the charted numeric columns.
+
+    Edges are set once per dataset, so every filter is binned the same way
+    and a histogram is one ``np.bincount`` over the selected rows' codes.
+    Values outside the edges, and missing values, get the extra code
+    ``len(edges) - 1`` and are not counted, as with ``ax.hist``.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.edges = {}
+        self.codes = {}
+        for col, edges in HISTOGRAM_EDGES.items():
+            x = df[col].to_numpy()
+            if edges is None:
+                edges = np.histogram_bin_edges(x[~np.isnan(x)], bins=HISTOGRAM_BINS)
+            edges = np.asarray(edges, dtype=np.float64)
+            n_bins = len(edges) - 1
+            codes = np.searchsorted(edges, x, side="right") - 1
+            codes[x == edges[-1]] = n_bins - 1  # the last bin includes its right edge
+            codes[(codes < 0) | (codes >= n_bins)] = n_bins
+            self.edges[col] = edges
+            self.codes[col] = codes.astype(np.uint8 if n_bins < 255 else np.int32)
+        self.target = df['TARGET'].to_numpy().astype(np.intp)
+
+    def counts(self, col: str, rows=None, by_target=False) -> np.ndarray:
+        """
+        Count the rows in each bin of a column.
+
+        Args:
+            col (str): A HISTOGRAM_EDGES column.
+            rows (np.ndarray, optional): Positions of the rows to count; all rows if None.
+            by_target (bool): Return one row of counts per TARGET value (0, 1).
+
+        Returns:
+            np.ndarray: Counts of shape (n_bins,), or (2, n_bins) by target.
+        """
+        codes = self.codes[col] if rows is None else self.codes[col][rows]
+        size = len(self.edges[col])  # n_bins + the slot for values left out
+        if not by_target:
+            return np.bincount(codes, minlength=size)[:-1]
+        target = self.target if rows is None else self.target[rows]
+        counts = np.bincount(codes + size * target, minlength=2 * size)
+        return counts.reshape(2, size)[:, :-1]
+
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+def _cached_histograms(digest: str, _df: pd.DataFrame) -> HistogramIndex:
+    return shared_artifact(_df, "histograms", HistogramIndex)
+
+
+def histogram(df: pd.DataFrame, col: str, spec: FilterSpec = None, by_target=False):
+    """
+    Return the pre-binned histogram of a column over the rows a filter keeps.
+
+    Draw it with ``ax.hist(edges[:-1], bins=edges, weights=counts)``, which
+    plots one bar per bin instead of re-binning every row.
+
+    Args:
+        df (pd.DataFrame): The full dataset from ``load_dataset``.
+        col (str): A HISTOGRAM_EDGES column.
+        spec (FilterSpec, optional): Filter to apply; all rows if None.
+        by_target (bool): Split the counts by TARGET (see ``HistogramIndex.counts``).
+
+    Returns:
+        tuple: (counts, edges)
+    """
+    digest = df.attrs.get("source_digest")
+    index = HistogramIndex(df) if digest is None else _cached_histograms(digest, df)
+    return index.counts(col, filtered_rows(df, spec), by_target), index.edges[col]
@@ -0,0 +1,284 @@
+import altair as alt
+import numpy as np
+import pandas as pd
+
+from utils.boxplots import box_colors, box_labels
+from utils.density import iso_proportion_levels
+from utils.filter_spec import FilterSpec
+from utils.filters import filtered_rows
+from utils.scatter import scatter_grid, stratified_sample
+
+# Vega-Lite charts are sent with their data, so they are kept to a few thousand rows:
+# scatters with more points than this are sent as a grid ...
+INTERACTIVE_MAX_POINTS = 5000
+
+# ... of this many cells per axis
+INTERACTIVE_GRID_BINS = 50
+
+# Joint densities are sent at 1/DENSITY_STRIDE of their grid resolution per axis
+DENSITY_STRIDE = 4
+
+# Vega color schemes closest to the Matplotlib colormaps the pages use
+SCHEMES = {'coolwarm': ('redblue', True), 'Blues': ('blues', False)}
+
+
+def _scale(cmap, domain=None, type="linear"):
+    scheme, reverse = SCHEMES.get(cmap, (cmap, False))
+    return alt.Scale(scheme=scheme, reverse=reverse, domain=alt.Undefined if domain is None else domain, type=type)
+
+
+def _series_color(labels, colors, title=None):
+    # One color per series; clicking the legend highlights a series
+    legend = alt.Legend(title=title) if len(labels) > 1 else None
+    return alt.Color('series:N', scale=alt.Scale(domain=list(labels), range=list(colors)), legend=legend)
+
+
+def _legend_toggle(chart, field='series'):
+    selection = alt.selection_point(fields=[field], bind='legend')
+    return chart.add_params(selection).encode(opacity=alt.condition(selection, alt.value(1.0), alt.value(0.2)))
+
+
+def histogram_chart(counts, edges, colors, x_title, y_title="Count", title=None, labels=None, stack=True):
+    """
+    Bars of pre-binned counts, as from ``utils.histograms.histogram``.
+
+    Args:
+        counts (np.ndarray): Counts per bin, or one row of counts per series.
+        edges (np.ndarray): Bin edges.
+        colors (list): Color per series.
+        x_title (str): Horizontal axis title.
+        y_title (str): Vertical axis title.
+        title (str, optional): Chart title.
+        labels (list, optional): Series names, for the legend.
+        stack (bool): Stack the series; otherwise they overlap.
+    """
+    counts = np.atleast_2d(counts)
+    labels = labels or [y_title]
+    data = pd.concat([pd.DataFrame({'start': edges[:-1], 'end': edges[1:], 'count': row, 'series': label})
+                      for row, label in zip(counts, labels)], ignore_index=True)
+    chart = alt.Chart(data, title=title).mark_bar(stroke="black", strokeWidth=0.5).encode(
+        x=alt.X('start:Q', title=x_title), x2='end',
+        y=alt.Y('count:Q', title=y_title, stack=True if stack else None),
+        color=_series_color(labels, colors),
+        tooltip=[alt.Tooltip('series:N', title=' '), alt.Tooltip('start:Q', title="From", format=",.4~g"),
+                 alt.Tooltip('end:Q', title="To", format=",.4~g"), alt.Tooltip('count:Q', title=y_title, format=",")],
+    )
+    return (_legend_toggle(chart) if len(labels) > 1 else chart).interactive(bind_y=False)
+
+
+def bar_chart(values: pd.Series, colors, x_title, y_title, title=None, horizontal=False):
+    """
+    One bar per category of a small Series (counts, rates), in its order.
+
+    Args:
+        values (pd.Series): Value per category.
+        colors (list): One color, or one per category.
+        x_title (str): Category axis title.
+        y_title (str): Value axis title.
+        title (str, optional): Chart title.
+        horizontal (bool): Draw horizontal bars.
+    """
+    data = pd.DataFrame({'category': values.index.astype(str), 'value': values.to_numpy()})
+    order = list(data['category'])
+    category = alt.X('category:N', sort=order, title=x_title)
+    value = alt.Y('value:Q', title=y_title)
+    if horizontal:
+        category, value = alt.Y('category:N', sort=order, title=x_title), alt.X('value:Q', title=y_title)
+    color = (alt.Color('category:N', scale=alt.Scale(domain=order, range=list(colors)), legend=None)
+             if len(colors) > 1 else alt.value(colors[0]))
+    return alt.Chart(data, title=title).mark_bar().encode(
+        category, value, color=color,
+        tooltip=[alt.Tooltip('category:N', title=x_title), alt.Tooltip('value:Q', title=y_title, format=",.4~f")],
+    )
+
+
+def stacked_bar_chart(frame: pd.DataFrame, colors, x_title, y_title, title=None):
+    """Stacked bars of a small frame: one bar per index value, one segment per column."""
+    labels = [str(column) for column in frame.columns]
+    data = frame.set_axis(labels, axis=1).rename_axis('category').reset_index().melt(
+        'category', var_name='series', value_name='value')
+    data['category'] = data['category'].astype(str)
+    chart = alt.Chart(data, title=title).mark_bar().encode(
+        alt.X('category:N', sort=list(frame.index.astype(str)), title=x_title),
+        alt.Y('value:Q', title=y_title),
+        color=_series_color(labels, colors),
+        tooltip=[alt.Tooltip('category:N', title=x_title), alt.Tooltip('series:N', title=' '),
+                 alt.Tooltip('value:Q', title=y_title, format=",")],
+    )
+    return _legend_toggle(chart)
+
+
+def _box_layers(data, x, colors, width):
+    # Whiskers, box and median of summary rows with 'series', lo, q1, med, q3, hi
+    base = alt.Chart(data).encode(x=x)
+    tooltip = [alt.Tooltip('series:N', title=' ')] + [alt.Tooltip(f'{field}:Q', title=name, format=",.4~f")
+                                                      for field, name in [('hi', "Upper whisker"), ('q3', "Q3"),
+                                                                          ('med', "Median"), ('q1', "Q1"),
+                                                                          ('lo', "Lower whisker")]]
+    whiskers = base.mark_rule(color="black").encode(y='lo:Q', y2='hi:Q')
+    box = base.mark_bar(size=width, stroke="black").encode(
+        y='q1:Q', y2='q3:Q', color=_series_color(list(data['series']), colors), tooltip=tooltip)
+    median = base.mark_tick(size=width, color="black", thickness=2).encode(y='med:Q')
+    return [whiskers, box, median]
+
+
+def box_chart(stats: list, colors, y_title, x_title=None, title=None, labels=None):
+    """
+    Boxplots drawn from precomputed statistics, as from ``grouped_box_stats``.
+
+    Args:
+        stats (list): ``box_stats`` dicts.
+        colors (list | dict): Box colors (see ``utils.boxplots.box_colors``).
+        y_title (str): Value axis title.
+        x_title (str, optional): Group axis title.
+        title (str, optional): Chart title.
+        labels (dict, optional): Group name per group value, replacing the value.
+
+    With no boxes (the filter kept no rows), the chart only shows a note.
+    """
+    title = alt.Undefined if title is None else title
+    if not stats:
+        return alt.Chart(pd.DataFrame({'note': ["No data"]}), title=title).mark_text().encode(text='note:N')
+    labels = [str(label) for label in box_labels(stats, labels)]
+    data = pd.DataFrame({'series': labels, 'lo': [box['whislo'] for box in stats],
+                         'q1': [box['q1'] for box in stats], 'med': [box['med'] for box in stats],
+                         'q3': [box['q3'] for box in stats], 'hi': [box['whishi'] for box in stats]})
+    x = alt.X('series:N', sort=labels, title=x_title)
+    layers = _box_layers(data, x, box_colors(stats, colors), width=40)
+    layers[0] = layers[0].encode(y=alt.Y('lo:Q', title=y_title))
+    counts = [len(box['fliers']) for box in stats]
+    if sum(counts):
+        fliers = pd.DataFrame({'series': np.repeat(labels, counts),
+                               'value': np.concatenate([box['fliers'] for box in stats])})
+        layers.append(alt.Chart(fliers).mark_point(size=12, color="gray").encode(
+            x=x, y='value:Q', tooltip=[alt.Tooltip('value:Q', title="Outlier", format=",.4~f")]))
+    return alt.layer(*layers, title=title)
+
+
+def violin_chart(violins: list, colors, y_title, x_title=None, title=None, labels=None, width=0.8):
+    """
+    Violins from precomputed densities, as from ``utils.density.violin_densities``.
+
+    Uses the same area scaling as ``utils.density.draw_violins``.
+    """
+    labels = [str(violin['label']) for violin in violins] if labels is None else labels
+    peak = max((v['density'].max() for v in violins if v['density'] is not None), default=1)
+    shapes = pd.concat([pd.DataFrame({'series': label, 'value': violin['support'],
+                                      'left': position - violin['density'] / peak * width / 2,
+                                      'right': position + violin['density'] / peak * width / 2})
+                        for position, (label, violin) in enumerate(zip(labels, violins))
+                        if violin['density'] is not None], ignore_index=True)
+    label_expr = " : ".join(f"datum.value == {position} ? '{label}'" for position, label in enumerate(labels)) + " : ''"
+    x = alt.X('left:Q', title=x_title, scale=alt.Scale(domain=[-0.5, len(labels) - 0.5]),
+              axis=alt.Axis(values=list(range(len(labels))), labelExpr=label_expr, grid=False))
+    area = alt.Chart(shapes).mark_area(orient="horizontal", stroke="#444444", strokeWidth=1).encode(
+        y=alt.Y('value:Q', title=y_title), x=x, x2='right', color=_series_color(labels, colors),
+        detail='series:N')
+    summary = pd.DataFrame({'series': labels, 'position': range(len(labels)),
+                            'lo': [v['stats']['whislo'] for v in violins], 'q1': [v['stats']['q1'] for v in violins],
+                            'med': [v['stats']['med'] for v in violins], 'q3': [v['stats']['q3'] for v in violins],
+                            'hi': [v['stats']['whishi'] for v in violins]})
+    base = alt.Chart(summary).encode(x='position:Q')
+    tooltip = [alt.Tooltip('series:N', title=' ')] + [alt.Tooltip(f'{field}:Q', title=name, format=",.4~f")
+                                                      for field, name in [('q3', "Q3"), ('med', "Median"), ('q1', "Q1")]]
+    layers = [area, base.mark_rule(color="#444444", strokeWidth=2).encode(y='lo:Q', y2='hi:Q'),
+              base.mark_rule(color="#444444", strokeWidth=8).encode(y='q1:Q', y2='q3:Q', tooltip=tooltip),
+              base.mark_point(color="white", filled=True, size=30).encode(y='med:Q')]
+    return alt.layer(*layers, title=title)
+
+
+def scatter_chart(df: pd.DataFrame, x: str, y: str, x_title, y_title, spec: FilterSpec = None, hue: str = None,
+                  cmap="coolwarm", sample=0, bins=INTERACTIVE_GRID_BINS, title=None):
+    """
+    Scatter of two columns, sent as a grid of cells when there are many points.
+
+    The interactive counterpart of ``utils.scatter.draw_scatter``: up to
+    INTERACTIVE_MAX_POINTS rows are sent as points, otherwise a cached
+    ``scatter_grid`` of mean hue (or counts) per cell, with an optional
+    stratified sample of points on top.
+    """
+    rows = filtered_rows(df, spec)
+    rows = np.arange(len(df)) if rows is None else rows
+    hue_title = hue or "Count"
+    if len(rows) > INTERACTIVE_MAX_POINTS:
+        grid = scatter_grid(df, x, y, spec, hue, bins)
+        counts = grid['counts']
+        y_index, x_index = np.nonzero(counts)
+        cells = pd.DataFrame({'x0': grid['x_edges'][x_index], 'x1': grid['x_edges'][x_index + 1],
+                              'y0': grid['y_edges'][y_index], 'y1': grid['y_edges'][y_index + 1],
+                              'count': counts[y_index, x_index]})
+        if hue is not None:
+            cells['value'] = grid['mean'][y_index, x_index]
+            color = alt.Color('value:Q', title=hue, scale=_scale(cmap, domain=[0, 1]))
+        else:
+            color = alt.Color('count:Q', title="Count", scale=_scale(cmap or "Blues", type="log"))
+        tooltip = [alt.Tooltip('count:Q', title="Applicants", format=",")]
+        if hue is not None:
+            tooltip.append(alt.Tooltip('value:Q', title=f"Mean {hue}", format=".3f"))
+        layers = [alt.Chart(cells).mark_rect().encode(
+            x=alt.X('x0:Q', title=x_title), x2='x1', y=alt.Y('y0:Q', title=y_title), y2='y1',
+            color=color, tooltip=tooltip)]
+        rows = stratified_sample(df, sample, spec, by=hue) if sample else rows[:0]
+    else:
+        layers = []
+    points = pd.DataFrame({'x': df[x].to_numpy()[rows], 'y': df[y].to_numpy()[rows]})
+    if hue is not None:
+        points['value'] = df[hue].to_numpy()[rows]
+    if len(points) or not layers:
+        point_color = (alt.Color('value:Q', title=hue_title, scale=_scale(cmap, domain=[0, 1]))
+                       if hue is not None else alt.value("#1f77b4"))
+        layers.append(alt.Chart(points).mark_circle(size=12 if layers else 20, opacity=0.7).encode(
+            x=alt.X('x:Q', title=x_title), y=alt.Y('y:Q', title=y_title), color=point_color,
+            tooltip=[alt.Tooltip('x:Q', title=x_title, format=",.4~f"), alt.Tooltip('y:Q', title=y_title, format=",.4~f")]))
+    return alt.layer(*layers, title=title).interactive()
+
+
+def density_chart(joint, x_title, y_title, cmap="Blues", levels=10, thresh=0.05, title=None):
+    """
+    Joint density banded at the iso-proportion levels of ``draw_density_contours``.
+
+    The grid from ``utils.density.joint_density`` is sent at 1/DENSITY_STRIDE
+    of its resolution per axis, leaving out the cells below the lowest level.
+    """
+    if joint is None:
+        return alt.Chart(pd.DataFrame()).mark_rect()
+    xx, yy, density = joint
+    bounds = iso_proportion_levels(density, levels, thresh)
+    xs, ys = xx[0, ::DENSITY_STRIDE], yy[::DENSITY_STRIDE, 0]
+    coarse = density[::DENSITY_STRIDE, ::DENSITY_STRIDE]
+    band = np.searchsorted(bounds, coarse, side="right")
+    y_index, x_index = np.nonzero(band)
+    step_x, step_y = xs[1] - xs[0], ys[1] - ys[0]
+    cells = pd.DataFrame({'x0': xs[x_index] - step_x / 2, 'x1': xs[x_index] + step_x / 2,
+                          'y0': ys[y_index] - step_y / 2, 'y1': ys[y_index] + step_y / 2,
+                          'band': band[y_index, x_index], 'density': coarse[y_index, x_index]})
+    return alt.Chart(cells, title=title).mark_rect().encode(
+        x=alt.X('x0:Q', title=x_title), x2='x1', y=alt.Y('y0:Q', title=y_title), y2='y1',
+        color=alt.Color('band:O', title="Density level", scale=_scale(cmap), legend=None),
+        tooltip=[alt.Tooltip('density:Q', title="Density", format=".3~e")],
+    ).interactive()
+
+
+def heatmap_chart(matrix: pd.DataFrame, cmap="coolwarm", title=None):
+    """Annotated heatmap of a small square matrix, e.g. correlations."""
+    order = [str(column) for column in matrix.columns]
+    data = matrix.set_axis(order, axis=0).set_axis(order, axis=1).rename_axis('row').reset_index().melt(
+        'row', var_name='column', value_name='value')
+    base = alt.Chart(data, title=title).encode(alt.X('column:N', sort=order, title=None),
+                                               alt.Y('row:N', sort=order, title=None))
+    cells = base.mark_rect().encode(color=alt.Color('value:Q', title=None, scale=_scale(cmap, domain=[-1, 1])),
+                                    tooltip=['row:N', 'column:N', alt.Tooltip('value:Q', format=".2f")])
+    text = base.mark_text(fontSize=10).encode(text=alt.Text('value:Q', format=".2f"))
+    return cells + text
+
+
+def pie_chart(values: pd.Series, colors, title=None):
+    """Pie of a small Series of counts, with shares in the tooltip."""
+    data = pd.DataFrame({'series': values.index.astype(str), 'value': values.to_numpy()})
+    data['share'] = data['value'] / data['value'].sum()
+    chart = alt.Chart(data, title=title).mark_arc().encode(
+        theta='value:Q', color=_series_color(list(data['series']), colors),
+        tooltip=[alt.Tooltip('series:N', title=' '), alt.Tooltip('value:Q', title="Count", format=",.0f"),
+                 alt.Tooltip('share:Q', title="Share", format=".1%")],
+    )
+    return _legend_toggle(chart)
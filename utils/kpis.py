@@ -0,0 +1,252 @@
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from utils.cube import dataset_cube
+from utils.filter_spec import FilterSpec
+from utils.sampling import APPROXIMATE_MIN_ROWS, CONFIDENCE_Z, refinements, sample_rows
+
+
+@dataclass(frozen=True)
+class Metric:
+    """
+    Declaration of one KPI: what it reads, over which rows, and how it reduces.
+
+    Attributes:
+        input (str): A column, or a key of DERIVED_INPUTS.
+        reduction (str): 'mean', 'sum', 'median' or 'nunique'. Missing
+            values are skipped, as in pandas.
+        rows (str): 'all', 'repaid' (TARGET == 0) or 'defaulters' (TARGET == 1).
+        scale (float): Multiplier applied to the result, e.g. 100 for percents.
+    """
+
+    input: str
+    reduction: str = "mean"
+    rows: str = "all"
+    scale: float = 1.0
+
+
+# Row-level expressions metrics can read besides plain columns
+DERIVED_INPUTS = {
+    'REPAID': lambda df: 1 - df['TARGET'],
+    'HIGH_CREDIT': lambda df: df['AMT_CREDIT'] > 1000000,
+}
+
+METRICS = {
+    # Overview
+    'total_applicants': Metric('SK_ID_CURR', 'nunique'),
+    'default_rate': Metric('TARGET', scale=100),
+    'repaid_rate': Metric('REPAID', scale=100),
+    'median_age': Metric('AGE_YEARS', 'median'),
+    'median_income': Metric('AMT_INCOME_TOTAL', 'median'),
+    # Financial health
+    'avg_income': Metric('AMT_INCOME_TOTAL'),
+    'avg_credit': Metric('AMT_CREDIT'),
+    'avg_annuity': Metric('AMT_ANNUITY'),
+    'avg_goods_price': Metric('AMT_GOODS_PRICE'),
+    'avg_debt_to_income': Metric('DTI', scale=100),
+    'avg_loan_to_income': Metric('LOAN_TO_INCOME', scale=100),
+    'avg_income_repaid': Metric('AMT_INCOME_TOTAL', rows='repaid'),
+    'avg_income_defaulters': Metric('AMT_INCOME_TOTAL', rows='defaulters'),
+    'avg_credit_repaid': Metric('AMT_CREDIT', rows='repaid'),
+    'avg_credit_defaulters': Metric('AMT_CREDIT', rows='defaulters'),
+    'pct_high_credit': Metric('HIGH_CREDIT', scale=100),
+}
+
+# Metrics shown on the Overview and Financial health pages
+OVERVIEW_KPIS = ('total_applicants', 'default_rate', 'repaid_rate', 'median_age', 'median_income', 'avg_credit')
+FINANCIAL_KPIS = (
+    'avg_income', 'median_income', 'avg_credit', 'avg_annuity', 'avg_goods_price',
+    'avg_debt_to_income', 'avg_loan_to_income', 'avg_income_repaid', 'avg_income_defaulters',
+    'avg_credit_repaid', 'avg_credit_defaulters', 'pct_high_credit',
+)
+
+# Row sets, in the order of the weight columns used by evaluate()
+ROW_SETS = ['all', 'repaid', 'defaulters']
+
+
+def evaluate(df: pd.DataFrame, names) -> dict:
+    """
+    Compute registered metrics in one fused pass over df.
+
+    Every mean and sum is read off a single matrix product: the row-set
+    weights (all, repaid, defaulters) times the stacked metric inputs, with
+    a second product counting the non-missing values. Medians and distinct
+    counts are computed once per input and row set.
+
+    Args:
+        df (pd.DataFrame): The (filtered) rows.
+        names: Names of METRICS entries.
+
+    Returns:
+        dict: name -> value (NaN where no rows qualify).
+    """
+    metrics = {name: METRICS[name] for name in names}
+    target = df['TARGET'].to_numpy().astype(np.float64)
+    weights = np.column_stack([np.ones_like(target), 1 - target, target])
+
+    columns = {}
+    def values(input):
+        if input not in columns:
+            series = DERIVED_INPUTS[input](df) if input in DERIVED_INPUTS else df[input]
+            columns[input] = series.to_numpy().astype(np.float64)
+        return columns[input]
+
+    summed = sorted({m.input for m in metrics.values() if m.reduction in ("mean", "sum")})
+    if summed:
+        x = np.column_stack([values(input) for input in summed])
+        present = ~np.isnan(x)
+        sums = weights.T @ np.where(present, x, 0.0)
+        counts = weights.T @ present
+    results = {}
+    for name, metric in metrics.items():
+        row_set = ROW_SETS.index(metric.rows)
+        if metric.reduction in ("mean", "sum"):
+            col = summed.index(metric.input)
+            value = sums[row_set, col]
+            if metric.reduction == "mean":
+                value = value / counts[row_set, col] if counts[row_set, col] else np.nan
+        else:
+            x = values(metric.input)
+            if metric.rows != "all":
+                x = x[weights[:, row_set] > 0]
+            x = x[~np.isnan(x)]
+            if metric.reduction == "median":
+                value = np.median(x) if len(x) else np.nan
+            else:
+                value = len(pd.unique(x))
+        results[name] = value * metric.scale if metric.scale != 1 else value
+    return results
+
+
+@st.cache_resource(max_entries=256, show_spinner=False)
+def _cached_kpis(digest: str, spec: FilterSpec, names: tuple, _df: pd.DataFrame) -> dict:
+    return evaluate(_df, names)
+
+
+def compute_kpis(filtered_df: pd.DataFrame, spec: FilterSpec, names) -> dict:
+    """
+    Return metrics of the filtered rows, memoized per dataset and filter.
+
+    Args:
+        filtered_df (pd.DataFrame): Rows returned by ``global_filters``.
+        spec (FilterSpec): The filter that produced them.
+        names: Names of METRICS entries.
+
+    Returns:
+        dict: name -> value.
+    """
+    digest = filtered_df.attrs.get("source_digest")
+    if digest is None:
+        return evaluate(filtered_df, names)
+    return dict(_cached_kpis(digest, spec, tuple(names), filtered_df))
+
+
+def estimate(sample: pd.DataFrame, names, population: dict) -> tuple[dict, dict]:
+    """
+    Estimate metrics from a TARGET-stratified sample, with 95% confidence intervals.
+
+    Each stratum (TARGET value) is weighted by its exact number of rows
+    in the population (post-stratification), so rates of TARGET itself
+    are exact. Means and sums get the stratified-sampling variance, and
+    medians Woodruff's interval, from the weighted sample distribution.
+    Distinct counts cannot be estimated from a sample and are left out.
+
+    Args:
+        sample (pd.DataFrame): Sampled rows of the population.
+        names: Names of METRICS entries.
+        population (dict): TARGET value -> number of rows in the population.
+
+    Returns:
+        tuple: (values, intervals): name -> estimate, and name -> (low, high).
+    """
+    target = sample['TARGET'].to_numpy()
+    values, intervals = {}, {}
+    for name in names:
+        metric = METRICS[name]
+        if metric.reduction == "nunique":
+            continue
+        series = DERIVED_INPUTS[metric.input](sample) if metric.input in DERIVED_INPUTS else sample[metric.input]
+        x = series.to_numpy().astype(np.float64)
+        strata = {'all': (0, 1), 'repaid': (0,), 'defaulters': (1,)}[metric.rows]
+        groups = [(population.get(h, 0), x[(target == h) & ~np.isnan(x)]) for h in strata]
+        groups = [(size, group) for size, group in groups if size > 0 and len(group)]
+        if not groups:
+            values[name], intervals[name] = np.nan, (np.nan, np.nan)
+            continue
+        if metric.reduction == "median":
+            value, low, high = _stratified_median(groups)
+        else:
+            total = sum(size for size, _ in groups)
+            value = sum(size / total * group.mean() for size, group in groups)
+            variance = sum((size / total) ** 2 * _sample_variance(group) / len(group) * (1 - len(group) / size)
+                           for size, group in groups)
+            half_width = CONFIDENCE_Z * np.sqrt(variance)
+            value, low, high = value, value - half_width, value + half_width
+            if metric.reduction == "sum":
+                value, low, high = value * total, low * total, high * total
+        values[name] = value * metric.scale
+        intervals[name] = (low * metric.scale, high * metric.scale)
+    return values, intervals
+
+
+def _sample_variance(x):
+    return x.var(ddof=1) if len(x) > 1 else 0.0
+
+
+def _stratified_median(groups):
+    # Weighted median of the strata, and Woodruff's interval: the quantiles at 0.5 -/+ z * se(0.5)
+    total = sum(size for size, _ in groups)
+    x = np.concatenate([group for _, group in groups])
+    weights = np.concatenate([np.full(len(group), size / total / len(group)) for size, group in groups])
+    order = np.argsort(x, kind="stable")
+    x, cdf = x[order], np.cumsum(weights[order])
+    se = np.sqrt(sum((size / total) ** 2 * 0.25 / len(group) for size, group in groups))
+    quantile = lambda p: x[min(np.searchsorted(cdf, p), len(x) - 1)]
+    return quantile(0.5), quantile(max(0.5 - CONFIDENCE_Z * se, 0)), quantile(min(0.5 + CONFIDENCE_Z * se, 1))
+
+
+def approximate_kpis(df: pd.DataFrame, filtered_df: pd.DataFrame, spec: FilterSpec, names):
+    """
+    Return metrics of the filtered rows at once, estimated first when the filter keeps many rows.
+
+    Filters keeping up to APPROXIMATE_MIN_ROWS rows are computed exactly,
+    as by ``compute_kpis``. For larger ones, the exact values are computed
+    on a background thread; until they are ready, the metrics are
+    estimated from the dataset's TARGET-stratified sample (see
+    ``estimate``), with the exact stratum sizes from the cube.
+
+    Args:
+        df (pd.DataFrame): The full dataset from ``load_dataset``.
+        filtered_df (pd.DataFrame): Rows returned by ``global_filters``.
+        spec (FilterSpec): The filter that produced them.
+        names: Names of METRICS entries.
+
+    Returns:
+        tuple: (values, intervals, pending): name -> value; name -> 95%
+        (low, high) of each estimated metric ({} once exact); and the
+        future of the exact values, or None if they were returned.
+    """
+    names = tuple(names)
+    digest = filtered_df.attrs.get("source_digest")
+    if digest is None or len(filtered_df) <= APPROXIMATE_MIN_ROWS:
+        return compute_kpis(filtered_df, spec, names), {}, None
+    future = refinements().submit(("kpis", digest, spec, names), lambda: evaluate(filtered_df, names))
+    if future.done():
+        return dict(future.result()), {}, None
+
+    totals = dataset_cube(df).totals(spec)
+    population = {0: totals['count'] - totals['TARGET'], 1: totals['TARGET']}
+    values, intervals = estimate(df.iloc[sample_rows(df, spec)], names, population)
+    values.update(compute_kpis(filtered_df, spec, [name for name in names if name not in values]))
+    return values, intervals, future
+
+
+def interval_help(intervals: dict, name: str, fmt: str):
+    """Tooltip giving the 95% interval of an estimated metric (None if it is exact), e.g. for st.metric."""
+    if name not in intervals:
+        return None
+    low, high = intervals[name]
+    return f"Estimated from a sample: 95% CI {fmt.format(low)} to {fmt.format(high)}. The exact value follows shortly."
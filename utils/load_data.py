@@ -1,47 +1,528 @@
+import functools
+import hashlib
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
 import pandas as pd
 import numpy as np
+import streamlit as st
 
-def load_and_preprocess(file_path="application_train.csv"):
-    df = pd.read_csv(file_path)
+from utils.schema import SPARSE_COLUMNS, read_application_csv
+from utils.shared_store import read_shared, shared_dataset, shared_enabled, write_shared
+from utils.snapshot import read_snapshot, write_snapshot
 
-    # ---- Feature engineering ----
-    df['AGE_YEARS'] = -(df['DAYS_BIRTH'] / 365.25).astype(int)
-    df['EMPLOYMENT_YEARS'] = -(df['DAYS_EMPLOYED'] / 365.25)
-    df['EMPLOYMENT_YEARS'] = df['EMPLOYMENT_YEARS'].clip(lower=0, upper=60)  # handle "not employed" codes
+DEFAULT_DATA_PATH = "application_train.csv"
+
+# Bump when load_and_preprocess changes its output; stale snapshots are rebuilt
+PREPROCESS_VERSION = 3
+
+# Modules in utils/ whose source is part of the snapshot version stamp
+PIPELINE_FILES = ["load_data.py", "schema.py", "streaming.py"]
+
+# Columns with more than this % missing are dropped
+MISSING_THRESHOLD = 60
+
+# Categories under this share of rows are merged into RARE_LABEL
+RARE_THRESHOLD = 0.01
+RARE_LABEL = "Other"
+
+WINSORIZE_COLUMNS = ['AMT_INCOME_TOTAL', 'AMT_CREDIT', 'AMT_ANNUITY']
+WINSORIZE_LIMITS = (0.01, 0.99)
+
+INCOME_BRACKETS = ["Low", "Mid", "High"]
+
+# DataFrame methods that change the frame they are called on when given inplace=True
+INPLACE_METHODS = ("bfill", "clip", "drop", "drop_duplicates", "dropna", "eval", "ffill", "fillna", "interpolate",
+                   "mask", "query", "rename", "rename_axis", "replace", "reset_index", "set_index", "sort_index",
+                   "sort_values", "where")
+
+# Where the columns are handed to the pool's workers; memory-backed where there is one
+SCRATCH_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else None
+
+# (path, size, mtime) -> digest, so the default file is only hashed when it changes
+_path_digests = {}
+
+
+
+def load_and_preprocess(file_path=DEFAULT_DATA_PATH, workers=1):
+    """
+    Read and preprocess an application CSV.
 
+    Imputation, rare-category merging and winsorizing only look at one
+    column at a time, so with ``workers > 1`` they run on column shards in
+    a process pool (see ``preprocess_columns``). The serial path is the
+    reference; both produce the same frame. The app always runs serially;
+    the pool is for offline scripts such as ``benchmarks/preprocess.py``.
+
+    Args:
+        file_path: A CSV path or file-like object.
+        workers (int, optional): Worker processes. Defaults to 1.
+
+    Returns:
+        pd.DataFrame: The preprocessed DataFrame.
+    """
+    df = read_application_csv(file_path, skip_columns=skipped_columns(file_path))
+    df = add_features(df)
+    df = drop_sparse_columns(df)
+    if workers > 1:
+        df = preprocess_columns(df, workers)
+    else:
+        df = impute_missing(df)
+        df = merge_rare_categories(df)
+        df = winsorize(df)
+    df = add_income_bracket(df)
+    return df
+
+
+# ---- Feature engineering ----
+def add_features(df: pd.DataFrame) -> pd.DataFrame:
+    # Stages work on shallow copies: only the columns they set are new arrays
+    df = df.copy(deep=False)
+    df['AGE_YEARS'] = -(df['DAYS_BIRTH'] / 365.25).astype(int)
+    df['EMPLOYMENT_YEARS'] = (-(df['DAYS_EMPLOYED'] / 365.25)).clip(lower=0, upper=60)  # handle "not employed" codes
     df['DTI'] = df['AMT_ANNUITY'] / df['AMT_INCOME_TOTAL']
     df['LOAN_TO_INCOME'] = df['AMT_CREDIT'] / df['AMT_INCOME_TOTAL']
     df['ANNUITY_TO_CREDIT'] = df['AMT_ANNUITY'] / df['AMT_CREDIT']
+    return df
+
+
+# ---- Missing values ----
+def skipped_columns(source) -> frozenset:
+    """
+    Return the columns not worth parsing from a source.
+
+    Only the default training file is known to leave SPARSE_COLUMNS over
+    MISSING_THRESHOLD, so only it is read without them. Uploads and other
+    paths are parsed in full, and ``drop_sparse_columns`` drops whichever
+    of their columns are actually sparse.
+    """
+    if isinstance(source, (str, os.PathLike)) and os.path.abspath(source) == os.path.abspath(DEFAULT_DATA_PATH):
+        return SPARSE_COLUMNS
+    return frozenset()
+
+
+def drop_sparse_columns(df: pd.DataFrame, missing_pct=None) -> pd.DataFrame:
+    if missing_pct is None:
+        missing_pct = df.isnull().mean() * 100
+    return df.drop(columns=missing_pct[missing_pct > MISSING_THRESHOLD].index)
+
+
+def imputation_values(df: pd.DataFrame) -> dict:
+    """Return the fill value (median or mode) for every column with missing values."""
+    missing = df.columns[df.isnull().any()]
+    numeric = [col for col in missing if pd.api.types.is_numeric_dtype(df[col])]
+    categorical = [col for col in missing if col not in numeric]
+
+    values = df[numeric].median().to_dict()
+    counts = category_counts(df, categorical)
+    # argmax takes the first category on ties, like Series.mode()[0]
+    values.update({col: df[col].cat.categories[counts[col].argmax()] for col in categorical})
+    return values
+
+
+def impute_missing(df: pd.DataFrame, values=None) -> pd.DataFrame:
+    if values is None:
+        values = imputation_values(df)
+    return df.fillna(values)
+
+
+# ---- Standardize rare categories ----
+def rare_category_labels(df: pd.DataFrame) -> dict:
+    """
+    Return, per categorical column, the label each category maps to.
+
+    Categories below RARE_THRESHOLD of rows map to RARE_LABEL.
+    """
+    columns = df.select_dtypes(include="category").columns
+    counts = category_counts(df, columns)
+    labels = {}
+    for col in columns:
+        freqs = counts[col] / len(df)
+        categories = df[col].cat.categories.astype(object)
+        labels[col] = pd.Series(np.where(freqs < RARE_THRESHOLD, RARE_LABEL, categories), index=categories)
+    return labels
+
+
+def merge_rare_categories(df: pd.DataFrame, labels=None) -> pd.DataFrame:
+    if labels is None:
+        labels = rare_category_labels(df)
+    df = df.copy(deep=False)
+    for col, mapping in labels.items():
+        df[col] = recode(df[col], mapping)
+    return df
+
+
+def recode(series: pd.Series, mapping: pd.Series) -> pd.Series:
+    """
+    Relabel a categorical Series through a category -> label mapping.
+
+    Works on category codes only. Unused labels are dropped and the rest
+    are kept in sorted order, the order the original string columns had.
+    """
+    codes = series.cat.codes.to_numpy()
+    mapped = mapping.reindex(series.cat.categories).to_numpy()
+    used = np.zeros(len(mapped), dtype=bool)
+    used[codes[codes >= 0]] = True
+    categories = sorted(set(mapped[used]))
+    lookup = pd.Index(categories).get_indexer(mapped)
+    new_codes = np.where(codes >= 0, lookup[codes], -1)
+    return pd.Series(pd.Categorical.from_codes(new_codes, categories), index=series.index, name=series.name)
+
+
+# ---- Outlier handling (winsorize 1%) ----
+def winsorize(df: pd.DataFrame, bounds=None) -> pd.DataFrame:
+    if bounds is None:
+        bounds = df[WINSORIZE_COLUMNS].quantile(list(WINSORIZE_LIMITS))
+    # Plain Python floats, so float32 columns are not upcast by the clip
+    lower, upper = bounds.iloc[0].to_dict(), bounds.iloc[1].to_dict()
+    df = df.copy(deep=False)
+    for col in bounds.columns:
+        df[col] = df[col].clip(lower[col], upper[col])
+    return df
+
+
+# ---- Income brackets ----
+def add_income_bracket(df: pd.DataFrame, quartiles=None) -> pd.DataFrame:
+    if quartiles is None:
+        quartiles = df['AMT_INCOME_TOTAL'].quantile([0.25, 0.75]).to_numpy()
+    # <= q1 -> Low, <= q3 -> Mid, else High
+    codes = np.searchsorted(quartiles, df['AMT_INCOME_TOTAL'].to_numpy(), side="left")
+    df = df.copy(deep=False)
+    df['INCOME_BRACKET'] = pd.Categorical.from_codes(codes, INCOME_BRACKETS)
+    return df
+
+
+# ---- Parallel per-column stages ----
+def preprocess_columns(df: pd.DataFrame, workers: int) -> pd.DataFrame:
+    """
+    Impute, merge rare categories and winsorize column shards in parallel.
+
+    Only columns those stages change are sent to the pool. They are
+    written once to a scratch file in SCRATCH_DIR (see
+    ``utils.shared_store.write_shared``), which every worker maps to read
+    its shard. Workers are started with forkserver, or spawn where it is
+    not available, never by forking: the Streamlit server is
+    multithreaded, and a forked child could inherit a lock held by
+    another thread. The forkserver imports this module once, so workers
+    start without importing it again.
+
+    Workers re-import the caller's ``__main__``, so call this only from a
+    script guarded by ``if __name__ == "__main__"``. Not from a Streamlit
+    page: the script runner installs the page as ``__main__``, and every
+    worker would run the page again. The results are put back in the original column order.
+
+    Args:
+        df (pd.DataFrame): Frame after ``drop_sparse_columns``.
+        workers (int): Number of worker processes.
+
+    Returns:
+        pd.DataFrame: The same frame ``winsorize(merge_rare_categories(
+        impute_missing(df)))`` returns.
+    """
+    changed = (df.isnull().any()
+               | df.columns.isin(df.select_dtypes(include="category").columns)
+               | df.columns.isin(WINSORIZE_COLUMNS))
+    shards = [list(shard) for shard in np.array_split(df.columns[changed], workers) if len(shard)]
+
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload([__name__])
+    else:
+        context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory(dir=SCRATCH_DIR) as scratch:
+        path = os.path.join(scratch, "columns.bin")
+        write_shared(path, df.loc[:, changed])
+        with ProcessPoolExecutor(len(shards), mp_context=context) as pool:
+            results = list(pool.map(_preprocess_shard, shards, [path] * len(shards)))
+
+    df = df.copy(deep=False)
+    for result in results:
+        for col in result.columns:
+            df[col] = result[col]
+    return df
+
+
+def _preprocess_shard(columns, path):
+    shard = read_shared(path)[columns]
+    shard = impute_missing(shard)
+    shard = merge_rare_categories(shard)
+    winsorized = [col for col in WINSORIZE_COLUMNS if col in columns]
+    if winsorized:
+        shard = winsorize(shard, shard[winsorized].quantile(list(WINSORIZE_LIMITS)))
+    return shard
+
+
+def category_counts(df: pd.DataFrame, columns) -> dict:
+    """
+    Count the categories of several categorical columns in one bincount.
+
+    Returns:
+        dict: column -> array of counts aligned with its categories
+        (missing values are not counted).
+    """
+    if len(columns) == 0:
+        return {}
+    sizes = np.array([len(df[col].cat.categories) + 1 for col in columns])
+    offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    codes = np.column_stack([df[col].cat.codes.to_numpy(np.int32) for col in columns])
+    codes = np.where(codes < 0, sizes - 1, codes) + offsets  # missing -> last slot of each column
+    counts = np.bincount(codes.ravel(), minlength=sizes.sum())
+    return {col: counts[start:start + size - 1] for col, start, size in zip(columns, offsets, sizes)}
+
+
+def source_digest(source=DEFAULT_DATA_PATH) -> str:
+    """
+    Return the SHA-256 content hash of a dataset source.
+
+    Paths are hashed again only when their size or mtime changes, and
+    uploads once per upload (by ``file_id``, in the session state), so
+    reruns do not reread the data.
+
+    Args:
+        source: A path to a CSV file or a file-like object (e.g. the file
+            returned by ``st.file_uploader``).
+
+    Returns:
+        str: Hex digest of the source bytes.
+    """
+    if hasattr(source, "getvalue"):
+        file_id = getattr(source, "file_id", None)
+        if file_id is None:
+            return hashlib.sha256(source.getvalue()).hexdigest()
+        digests = st.session_state.setdefault("upload_digests", {})
+        if file_id not in digests:
+            digests[file_id] = hashlib.sha256(source.getvalue()).hexdigest()
+        return digests[file_id]
+
+    stat = os.stat(source)
+    stamp = (os.path.abspath(source), stat.st_size, stat.st_mtime_ns)
+    if stamp not in _path_digests:
+        sha = hashlib.sha256()
+        with open(source, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                sha.update(block)
+        _path_digests[stamp] = sha.hexdigest()
+    return _path_digests[stamp]
+
+
+def preprocess_version() -> str:
+    """
+    Return the version stamp for snapshots of the preprocessed dataset.
+
+    Combines PREPROCESS_VERSION with a hash of the PIPELINE_FILES sources, so
+    any edit to the pipeline invalidates existing snapshots.
+    """
+    sha = hashlib.sha256()
+    for name in PIPELINE_FILES:
+        with open(os.path.join(os.path.dirname(__file__), name), "rb") as f:
+            sha.update(f.read())
+    return f"v{PREPROCESS_VERSION}-{sha.hexdigest()[:8]}"
+
+
+class FrozenFrame(pd.DataFrame):
+    """
+    A DataFrame shared by every session, which cannot be changed in place.
+
+    Its column buffers are read-only (see ``freeze``), so writing values
+    into them raises ValueError, through the frame or one of its column
+    Series. Every way of changing the frame object itself raises
+    TypeError: setting columns or values (``[]``, ``.loc``, ``.iloc``,
+    ``.at``, ``.iat``), ``insert``, ``del``, ``pop``, ``update``,
+    ``inplace=True`` methods and assigning the index or columns. A column
+    Series is not linked back to the frame, so changing its dtype cannot
+    reach the shared columns either. Whatever is derived from it (a
+    selection, ``.copy()``, ``.assign()``) is a plain DataFrame, so a page
+    that needs extra columns builds them on a frame of its own.
+    """
+
+    @property
+    def _constructor(self):
+        return pd.DataFrame
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError("The shared dataset is read-only; derive a new frame (e.g. with .assign()) instead")
+
+    __setitem__ = __delitem__ = insert = isetitem = update = _read_only
+
+    def __getitem__(self, key):
+        return _unlinked(super().__getitem__(key))
+
+    @property
+    def columns(self):
+        return super().columns
+
+    @columns.setter
+    def columns(self, value):
+        self._read_only()
+
+    @property
+    def index(self):
+        return super().index
+
+    @index.setter
+    def index(self, value):
+        self._read_only()
+
+    @property
+    def loc(self):
+        return _ReadOnlyIndexer(self, super().loc)
 
-    # ---- Missing values ----
-    missing = df.isnull().mean() * 100
-    cols_to_drop = missing[missing > 60].index
-    df = df.drop(columns=cols_to_drop)
+    @property
+    def iloc(self):
+        return _ReadOnlyIndexer(self, super().iloc)
 
+    @property
+    def at(self):
+        return _ReadOnlyIndexer(self, super().at)
+
+    @property
+    def iat(self):
+        return _ReadOnlyIndexer(self, super().iat)
+
+
+def _refuse_inplace(method):
+    @functools.wraps(method)
+    def guarded(self, *args, **kwargs):
+        if kwargs.get("inplace"):
+            self._read_only()
+        return method(self, *args, **kwargs)
+    return guarded
+
+
+for _name in INPLACE_METHODS:
+    if hasattr(pd.DataFrame, _name):  # Older or newer pandas may lack one; the rest still apply
+        setattr(FrozenFrame, _name, _refuse_inplace(getattr(pd.DataFrame, _name)))
+
+
+def _unlinked(result):
+    # A shallow copy of a column Series shares its read-only buffer but not pandas' link back to the frame
+    return result.copy(deep=False) if isinstance(result, pd.Series) else result
+
+
+class _ReadOnlyIndexer:
+    # .loc, .iloc, .at or .iat of a FrozenFrame: reads pass through, writes raise
+    def __init__(self, frame, indexer):
+        self._frame = frame
+        self._indexer = indexer
+
+    def __getitem__(self, key):
+        return _unlinked(self._indexer[key])
+
+    def __setitem__(self, key, value):
+        self._frame._read_only()
+
+    def __call__(self, axis=None):
+        return _ReadOnlyIndexer(self._frame, self._indexer(axis))
+
+    def __getattr__(self, name):
+        return getattr(self._indexer, name)
+
+
+def freeze(df: pd.DataFrame) -> FrozenFrame:
+    """
+    Wrap the columns of a frame, without copying them, in a read-only FrozenFrame.
+
+    Each numpy column is taken with ``to_numpy()`` (a view) and marked
+    read-only, and each category is rebuilt around its ``cat.codes`` (a
+    read-only view). The frame is assembled from those views, so every
+    array it stores derives from a read-only one. Other extension columns
+    (e.g. nullable types) are kept as they are.
+    """
+    columns = {}
     for col in df.columns:
-        if df[col].dtype == "object":
-            df[col] = df[col].fillna(df[col].mode()[0])
+        series = df[col]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            columns[col] = pd.Categorical.from_codes(series.cat.codes.to_numpy(), dtype=series.dtype)
+        elif isinstance(series.dtype, np.dtype):
+            values = series.to_numpy()
+            values.flags.writeable = False
+            columns[col] = values
         else:
-            df[col] = df[col].fillna(df[col].median())
+            columns[col] = series.array
+    frozen = FrozenFrame(columns, index=df.index, copy=False)
+    frozen.attrs = dict(df.attrs)
+    return frozen
 
-    # ---- Standardize rare categories ----
-    for col in df.select_dtypes(include="object").columns:
-        freqs = df[col].value_counts(normalize=True)
-        rare = freqs[freqs < 0.01].index
-        df[col] = df[col].replace(rare, "Other")
 
-    # ---- Outlier handling (winsorize 1%) ----
-    for col in ['AMT_INCOME_TOTAL', 'AMT_CREDIT', 'AMT_ANNUITY']:
-        lower, upper = df[col].quantile([0.01, 0.99])
-        df[col] = np.clip(df[col], lower, upper)
+@st.cache_resource(max_entries=4, show_spinner="Loading dataset...")
+def _cached_dataset(digest: str, _source) -> pd.DataFrame:
+    version = preprocess_version()
+    if shared_enabled():
+        df = shared_dataset(digest, version, lambda: _preprocessed(digest, _source, version))
+    else:
+        df = _preprocessed(digest, _source, version)
+    df.attrs["source_digest"] = digest
+    return freeze(df)
 
-    # ---- Income brackets ----
-    q1, q2, q3 = df['AMT_INCOME_TOTAL'].quantile([0.25, 0.5, 0.75])
-    def income_bracket(x):
-        if x <= q1: return "Low"
-        elif x <= q3: return "Mid"
-        else: return "High"
-    df['INCOME_BRACKET'] = df['AMT_INCOME_TOTAL'].apply(income_bracket)
 
+def _preprocessed(digest, source, version):
+    # Imported here: utils.streaming is built on the stages defined in this module
+    from utils.streaming import preprocess_in_chunks, should_stream
+
+    df = read_snapshot(digest, version)
+    if df is None and should_stream(source):
+        preprocess_in_chunks(source, digest, version)
+        df = read_snapshot(digest, version)
+    if df is None:
+        if hasattr(source, "seek"):
+            source.seek(0)
+        df = load_and_preprocess(source)
+        try:
+            write_snapshot(df, digest, version)
+        except OSError:
+            pass  # Snapshots only speed up cold starts; a read-only disk is fine
     return df
 
+
+def load_dataset(source=None) -> pd.DataFrame:
+    """
+    Load the preprocessed dataset through the process-wide cache.
+
+    The result is shared by every session and keyed by the content hash of
+    the source, so reruns and page switches never parse the CSV again. Cold
+    starts memory-map the on-disk snapshot instead of re-running the
+    preprocessing when one exists for the same source and pipeline version.
+    Files over STREAMING_THRESHOLD_BYTES are preprocessed chunk by chunk
+    straight into the snapshot, so they never have to fit in memory as CSV.
+    Once a dataset is loaded, the artifacts the pages share are precomputed
+    in the background (see ``utils.warmup``).
+    With HOME_CREDIT_SHARED_DIR set, the processes of a host map one
+    published copy of the dataset instead of each loading their own (see
+    ``utils.shared_store``).
+
+    Args:
+        source: A CSV path or uploaded file. Defaults to the file uploaded on
+            the Home page, or ``application_train.csv`` if there is none.
+
+    Returns:
+        pd.DataFrame: The preprocessed, read-only DataFrame.
+    """
+    if source is None:
+        source = st.session_state.get("dataset_source") or DEFAULT_DATA_PATH
+    df = _cached_dataset(source_digest(source), source)
+
+    # Imported here: utils.warmup is built on modules that import this one
+    from utils.warmup import start_warmup
+    start_warmup(df)
+    return df
+
+
+def invalidate_dataset(source=None):
+    """
+    Drop cached datasets so the next ``load_dataset`` call rebuilds them.
+
+    Only the in-memory frames are dropped. The on-disk snapshot, the
+    shared store and the caches derived from a dataset (filtered rows and
+    frames, filter index, cube, KPIs, chart images...) are keyed by its
+    content digest, so they are never stale; they are left to age out of
+    their bounded caches.
+
+    Args:
+        source: Only drop the entry for this source. Drops everything if None.
+    """
+    if source is None:
+        _cached_dataset.clear()
+    else:
+        _cached_dataset.clear(source_digest(source), None)
@@ -0,0 +1,278 @@
+import ast
+import io
+import operator
+import tokenize
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from utils.filter_spec import FilterSpec
+from utils.filters import filtered_rows
+
+# Comparison operators a rule may use -> (canonical name, function)
+COMPARISONS = {
+    ast.Lt: ('<', operator.lt),
+    ast.LtE: ('<=', operator.le),
+    ast.Gt: ('>', operator.gt),
+    ast.GtE: ('>=', operator.ge),
+    ast.Eq: ('==', operator.eq),
+    ast.NotEq: ('!=', operator.ne),
+}
+OPERATORS = dict(COMPARISONS.values())
+
+# Operator with its sides swapped, for literals written on the left (e.g. 30 > AGE_YEARS)
+FLIPPED = {'<': '>', '<=': '>=', '>': '<', '>=': '<=', '==': '==', '!=': '!='}
+
+# pandas-style boolean operators, rewritten to Python's so they bind looser than comparisons
+BOOLEAN_TOKENS = {'&': 'and', '|': 'or', '~': 'not'}
+
+
+def parse_rule(text: str) -> tuple:
+    """
+    Parse a rule such as ``DTI > 0.3 & AGE_YEARS < 30 & NAME_EDUCATION_TYPE == 'Higher education'``.
+
+    Rules compare a column with a literal (``<``, ``<=``, ``>``, ``>=``,
+    ``==``, ``!=``, chained as in ``20 <= AGE_YEARS < 30``, or ``in`` /
+    ``not in`` a list of literals) and combine comparisons with ``&``,
+    ``|``, ``~`` (or ``and``, ``or``, ``not``) and parentheses. As in
+    ``DataFrame.query``, ``&`` and ``|`` bind looser than comparisons.
+
+    The result is a canonical tree of tuples: the operands of ``&`` and
+    ``|`` are flattened and sorted, so equivalent rules, and the shared
+    parts of different rules, get equal (hashable) nodes.
+
+    Raises:
+        ValueError: If the rule is not valid.
+    """
+    try:
+        tree = ast.parse(_python_booleans(text).strip(), mode="eval")
+        return _canonical(tree.body)
+    except (SyntaxError, tokenize.TokenError) as error:
+        raise ValueError(f"Invalid rule {text!r}: {error.msg if isinstance(error, SyntaxError) else error}")
+    except ValueError as error:
+        raise ValueError(f"Invalid rule {text!r}: {error}")
+
+
+def _python_booleans(text):
+    tokens = []
+    for token in tokenize.generate_tokens(io.StringIO(text).readline):
+        if token.type == tokenize.OP and token.string in BOOLEAN_TOKENS:
+            token = (tokenize.NAME, BOOLEAN_TOKENS[token.string])
+        tokens.append(token[:2])
+    return tokenize.untokenize(tokens)
+
+
+def _canonical(node):
+    if isinstance(node, ast.BoolOp):
+        kind = 'and' if isinstance(node.op, ast.And) else 'or'
+        return _combine(kind, [_canonical(value) for value in node.values])
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+        operand = _canonical(node.operand)
+        return operand[1] if operand[0] == 'not' else ('not', operand)
+    if isinstance(node, ast.Compare):
+        operands = [node.left] + node.comparators
+        return _combine('and', [_comparison(left, op, right)
+                                for left, op, right in zip(operands, node.ops, operands[1:])])
+    raise ValueError(f"unsupported expression {ast.unparse(node)!r}")
+
+
+def _combine(kind, children):
+    flat = []
+    for child in children:
+        flat.extend(child[1] if child[0] == kind else [child])
+    flat = sorted(set(flat), key=repr)
+    return flat[0] if len(flat) == 1 else (kind, tuple(flat))
+
+
+def _comparison(left, op, right):
+    if isinstance(op, (ast.In, ast.NotIn)):
+        if not isinstance(left, ast.Name):
+            raise ValueError(f"'in' needs a column on its left, got {ast.unparse(left)!r}")
+        if not isinstance(right, (ast.List, ast.Tuple, ast.Set)):
+            raise ValueError(f"'in' needs a list of values, got {ast.unparse(right)!r}")
+        values = tuple(sorted({_literal(element) for element in right.elts}, key=repr))
+        node = ('in', left.id, values)
+        return ('not', node) if isinstance(op, ast.NotIn) else node
+    if type(op) not in COMPARISONS:
+        raise ValueError(f"unsupported operator in {ast.unparse(ast.Compare(left, [op], [right]))!r}")
+    name = COMPARISONS[type(op)][0]
+    if isinstance(left, ast.Name):
+        return ('cmp', left.id, name, _literal(right))
+    if isinstance(right, ast.Name):
+        return ('cmp', right.id, FLIPPED[name], _literal(left))
+    raise ValueError(f"a comparison needs a column, in {ast.unparse(ast.Compare(left, [op], [right]))!r}")
+
+
+def _literal(node):
+    try:
+        value = ast.literal_eval(node)
+    except ValueError:
+        raise ValueError(f"expected a number or a quoted string, got {ast.unparse(node)!r}") from None
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        raise ValueError(f"expected a number or a quoted string, got {ast.unparse(node)!r}")
+    return float(value) if isinstance(value, int) else value
+
+
+class RuleEvaluator:
+    """
+    Evaluate parsed rules as boolean masks over a set of rows.
+
+    Given the batch of rules up front, the evaluator counts how often each
+    node is needed (sub-predicates and the leading operands of ``&`` and
+    ``|``) and memoizes only those needed more than once, so a shared
+    ``AGE_YEARS < 30`` is computed once without keeping a mask for every
+    node of the batch. ``release`` drops a memoized mask once the last
+    rule that needs it has been evaluated. Each column is extracted once;
+    categorical columns are compared through their integer codes.
+    """
+
+    def __init__(self, df: pd.DataFrame, rows=None, rules=()):
+        self.df = df
+        self.rows = rows
+        self._masks = {}
+        self._columns = {}
+        uses, last_rule = {}, {}
+        for position, rule in enumerate(rules):
+            self._count_uses(rule, position, uses, last_rule)
+        # Rule position -> nodes memoized until that rule has been evaluated
+        self._last_uses = {}
+        for node, count in uses.items():
+            if count > 1:
+                self._last_uses.setdefault(last_rule[node], []).append(node)
+        self._shared = {node for nodes in self._last_uses.values() for node in nodes}
+
+    def _count_uses(self, node, position, uses, last_rule):
+        # Mirrors _evaluate: the operands of a node already counted are read from its memoized mask
+        uses[node] = uses.get(node, 0) + 1
+        last_rule[node] = position
+        if uses[node] > 1:
+            return
+        kind = node[0]
+        if kind in ('and', 'or'):
+            children = node[1]
+            rest = children[0] if len(children) == 2 else (kind, children[:-1])
+            self._count_uses(rest, position, uses, last_rule)
+            self._count_uses(children[-1], position, uses, last_rule)
+        elif kind == 'not':
+            self._count_uses(node[1], position, uses, last_rule)
+
+    def mask(self, node: tuple) -> np.ndarray:
+        """Return the mask of a parsed rule; do not modify it."""
+        mask = self._masks.get(node)
+        if mask is None:
+            mask = self._evaluate(node)
+            if node in self._shared:
+                self._masks[node] = mask
+        return mask
+
+    def release(self, position: int):
+        """Drop the memoized masks no rule after ``rules[position]`` needs."""
+        for node in self._last_uses.pop(position, ()):
+            self._masks.pop(node, None)
+
+    def _evaluate(self, node):
+        kind = node[0]
+        if kind in ('and', 'or'):
+            # Folding left to right makes every prefix a node, which other rules may share
+            children = node[1]
+            rest = children[0] if len(children) == 2 else (kind, children[:-1])
+            combine = np.logical_and if kind == 'and' else np.logical_or
+            return combine(self.mask(rest), self.mask(children[-1]))
+        if kind == 'not':
+            return ~self.mask(node[1])
+        if kind == 'in':
+            _, column, values = node
+            codes, categories = self._column(column)
+            if categories is None:
+                for value in values:
+                    self._check_comparable(column, codes, value)
+                return np.isin(codes, list(values))
+            return np.isin(codes, categories.get_indexer([v for v in values if v in categories]))
+        _, column, name, value = node
+        codes, categories = self._column(column)
+        if categories is not None:
+            if name not in ('==', '!='):
+                raise ValueError(f"column {column!r} is categorical; use ==, != or in")
+            code = categories.get_loc(value) if value in categories else -2  # absent: matches nothing
+            return OPERATORS[name](codes, code)
+        self._check_comparable(column, codes, value)
+        return OPERATORS[name](codes, value)
+
+    @staticmethod
+    def _check_comparable(column, values, value):
+        if isinstance(value, str) != (values.dtype == object):
+            raise ValueError(f"cannot compare column {column!r} with {value!r}")
+
+    def _column(self, column):
+        # (values or category codes, categories or None) over the evaluated rows
+        entry = self._columns.get(column)
+        if entry is None:
+            if column not in self.df.columns:
+                raise ValueError(f"unknown column {column!r}")
+            series = self.df[column]
+            if isinstance(series.dtype, pd.CategoricalDtype):
+                values, categories = series.cat.codes.to_numpy(), series.cat.categories
+            else:
+                values, categories = series.to_numpy(), None
+            entry = self._columns[column] = (values if self.rows is None else values[self.rows], categories)
+        return entry
+
+
+def evaluate_rules(df: pd.DataFrame, rules, spec: FilterSpec = None) -> pd.DataFrame:
+    """
+    Score candidate rules against TARGET in one batch.
+
+    All rules are evaluated by one RuleEvaluator, so they share the masks
+    of their common sub-predicates. Cached process-wide per dataset,
+    filter and rule list.
+
+    Args:
+        df (pd.DataFrame): The full dataset from ``load_dataset``.
+        rules (list): Rule texts (see ``parse_rule``).
+        spec (FilterSpec, optional): Filter to apply; all rows if None.
+
+    Returns:
+        pd.DataFrame: Indexed by rule, with 'count' (rows matched),
+        'coverage' (share of the rows), 'defaults', 'default_rate' and
+        'lift' (default rate over that of all the rows).
+
+    Raises:
+        ValueError: If a rule is invalid or reads an unknown column.
+    """
+    rules = tuple(rules)
+    digest = df.attrs.get("source_digest")
+    if digest is None:
+        return _evaluate_rules(df, rules, spec)
+    return _cached_evaluate_rules(digest, spec, rules, df)
+
+
+@st.cache_resource(max_entries=32, show_spinner=False)
+def _cached_evaluate_rules(digest, spec, rules, _df):
+    return _evaluate_rules(_df, rules, spec)
+
+
+def _evaluate_rules(df, rules, spec):
+    parsed = [parse_rule(rule) for rule in rules]
+    rows = filtered_rows(df, spec)
+    evaluator = RuleEvaluator(df, rows, parsed)
+    target = df['TARGET'].to_numpy().astype(np.float64)
+    target = target if rows is None else target[rows]
+    n, base_rate = len(target), target.mean() if len(target) else np.nan
+
+    counts, defaults = [], []
+    for position, (rule, node) in enumerate(zip(rules, parsed)):
+        try:
+            mask = evaluator.mask(node)
+        except ValueError as error:
+            raise ValueError(f"Invalid rule {rule!r}: {error}")
+        counts.append(np.count_nonzero(mask))
+        defaults.append(target @ mask)
+        evaluator.release(position)
+    counts, defaults = np.array(counts, dtype=np.int64), np.array(defaults)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        rate = defaults / counts
+        return pd.DataFrame({'count': counts, 'coverage': counts / n if n else np.nan,
+                             'defaults': defaults.astype(np.int64), 'default_rate': rate,
+                             'lift': rate / base_rate},
+                            index=pd.Index(rules, name='rule'))
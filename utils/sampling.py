@@ -0,0 +1,129 @@
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from utils.filter_spec import FilterSpec
+from utils.filters import filtered_rows
+from utils.shared_store import shared_artifact
+
+# Sizes of the nested TARGET-stratified samples kept per dataset
+SAMPLE_SIZES = (10000, 100000)
+
+# Smallest sample share of a filter worth estimating from; larger samples are tried first if needed
+SAMPLE_MIN_ROWS = 5000
+
+# Filters keeping more rows than this are answered from a sample first; override with HOME_CREDIT_APPROXIMATE_ROWS
+APPROXIMATE_MIN_ROWS = int(os.environ.get("HOME_CREDIT_APPROXIMATE_ROWS", 250000))
+
+# Two-sided 95% normal quantile, for confidence intervals
+CONFIDENCE_Z = 1.96
+
+# Exact results computed in the background and kept for later reruns
+REFINEMENT_SLOTS = 64
+
+
+class StratifiedSamples:
+    """
+    Nested samples of a dataset, stratified by TARGET.
+
+    Every row gets a random key once, and a stratum's sample of k rows is
+    its k rows with the smallest keys: what a reservoir sampler keeps in
+    one pass. So the samples of all sizes are nested, and a sample's rows
+    that pass a filter are a uniform sample of the filtered rows of each
+    stratum. Each stratum gets a share of every sample proportional to
+    its size, and at least one row.
+
+    Attributes:
+        rows (dict): sample size -> sorted row positions.
+        strata (np.ndarray): TARGET of every row.
+    """
+
+    def __init__(self, df: pd.DataFrame, sizes=SAMPLE_SIZES, seed=0):
+        self.strata = df['TARGET'].to_numpy()
+        keys = np.random.default_rng(seed).random(len(df))
+        ordered = []
+        for value in np.unique(self.strata):
+            members = np.flatnonzero(self.strata == value)
+            ordered.append(members[np.argsort(keys[members], kind="stable")])
+        self.rows = {}
+        for size in sizes:
+            shares = [members[:max(1, round(size * len(members) / len(df)))] for members in ordered]
+            self.rows[size] = np.sort(np.concatenate(shares))
+
+    def sample(self, rows=None, min_rows=SAMPLE_MIN_ROWS) -> np.ndarray:
+        """
+        Return the sample positions among some rows (e.g. a filter's).
+
+        The smallest sample with at least ``min_rows`` rows among them is
+        used, or the largest sample if none has that many.
+        """
+        for size in sorted(self.rows):
+            sample = self.rows[size] if rows is None else np.intersect1d(self.rows[size], rows, assume_unique=True)
+            if len(sample) >= min_rows:
+                break
+        return sample
+
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+def _cached_samples(digest: str, _df: pd.DataFrame) -> StratifiedSamples:
+    return shared_artifact(_df, "samples", StratifiedSamples)
+
+
+def stratified_samples(df: pd.DataFrame) -> StratifiedSamples:
+    """Return the StratifiedSamples of a dataset, built once per dataset."""
+    digest = df.attrs.get("source_digest")
+    if digest is None:
+        return StratifiedSamples(df)
+    return _cached_samples(digest, df)
+
+
+def sample_rows(df: pd.DataFrame, spec: FilterSpec = None) -> np.ndarray:
+    """Return the positions of a TARGET-stratified sample of the rows a filter keeps."""
+    return stratified_samples(df).sample(filtered_rows(df, spec))
+
+
+class Refinements:
+    """
+    Exact results computed on a background thread, by key.
+
+    A key is submitted once: later requests for it get the same future,
+    finished or not. The most recent REFINEMENT_SLOTS futures are kept.
+    """
+
+    def __init__(self, slots=REFINEMENT_SLOTS):
+        self.slots = slots
+        self._futures = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="refine")
+
+    def submit(self, key, compute):
+        """Return the future of ``compute()`` for key, starting it if needed."""
+        with self._lock:
+            future = self._futures.get(key)
+            if future is None:
+                future = self._futures[key] = self._executor.submit(compute)
+                while len(self._futures) > self.slots:
+                    self._futures.popitem(last=False)
+            self._futures.move_to_end(key)
+            return future
+
+
+@st.cache_resource(show_spinner=False)
+def refinements() -> Refinements:
+    """Return the process-wide background refinements."""
+    return Refinements()
+
+
+def rerun_when_done(future, interval=0.5):
+    """Poll a background computation and rerun the page once it has finished."""
+    @st.fragment(run_every=interval)
+    def poll():
+        if future.done():
+            st.rerun()
+
+    poll()
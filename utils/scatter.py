@@ -0,0 +1,171 @@
+import os
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+from matplotlib.colors import LogNorm
+
+from utils.filter_spec import FilterSpec
+from utils.filters import filtered_rows
+
+# Scatters with more points than this are drawn as an aggregated grid
+SCATTER_MAX_POINTS = int(os.environ.get("HOME_CREDIT_SCATTER_POINTS", 20000))
+
+# Grid cells per axis in aggregated mode
+SCATTER_GRID_BINS = 100
+
+# Points in the optional sample drawn over an aggregated scatter
+OVERLAY_SAMPLE = 2000
+
+
+def scatter_grid(df: pd.DataFrame, x: str, y: str, spec: FilterSpec = None, hue: str = None,
+                 bins=SCATTER_GRID_BINS) -> dict:
+    """
+    Aggregate the points of a scatter into a 2-D grid.
+
+    Rows missing x or y are dropped, as ``ax.scatter`` does. Cached
+    process-wide per dataset, filter, columns and bins.
+
+    Args:
+        df (pd.DataFrame): The full dataset from ``load_dataset``.
+        x (str): Column on the horizontal axis.
+        y (str): Column on the vertical axis.
+        spec (FilterSpec, optional): Filter to apply; all rows if None.
+        hue (str, optional): Numeric column averaged per cell, e.g. TARGET
+            for the default rate.
+        bins: Number of cells per axis, or a pair of (number or edges) per
+            axis; must be hashable.
+
+    Returns:
+        dict: 'x_edges', 'y_edges', 'counts' (shape (ny, nx), for
+        ``ax.pcolormesh``) and, with a hue, 'mean' (NaN in empty cells).
+    """
+    digest = df.attrs.get("source_digest")
+    if digest is None:
+        return _scatter_grid(df, x, y, spec, hue, bins)
+    return _cached_scatter_grid(digest, x, y, spec, hue, bins, df)
+
+
+@st.cache_resource(max_entries=32, show_spinner=False)
+def _cached_scatter_grid(digest, x, y, spec, hue, bins, _df):
+    return _scatter_grid(_df, x, y, spec, hue, bins)
+
+
+def _scatter_grid(df, x, y, spec, hue, bins):
+    rows = filtered_rows(df, spec)
+    xv, yv = _column(df, x, rows), _column(df, y, rows)
+    keep = ~(np.isnan(xv) | np.isnan(yv))
+    xv, yv = xv[keep], yv[keep]
+    x_bins, y_bins = bins if isinstance(bins, tuple) else (bins, bins)
+    x_edges = np.histogram_bin_edges(xv, bins=x_bins)
+    y_edges = np.histogram_bin_edges(yv, bins=y_bins)
+    nx, ny = len(x_edges) - 1, len(y_edges) - 1
+    cells = _bin(yv, y_edges) * nx + _bin(xv, x_edges)
+    counts = np.bincount(cells, minlength=nx * ny).reshape(ny, nx)
+    grid = {'x_edges': x_edges, 'y_edges': y_edges, 'counts': counts}
+    if hue is not None:
+        sums = np.bincount(cells, weights=_column(df, hue, rows)[keep], minlength=nx * ny).reshape(ny, nx)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            grid['mean'] = sums / counts
+    return grid
+
+
+def _bin(values, edges):
+    # Same bins as np.histogram: right-open, except the last one
+    return np.clip(np.searchsorted(edges, values, side="right") - 1, 0, len(edges) - 2)
+
+
+def _column(df, column, rows):
+    values = df[column].to_numpy()
+    return (values if rows is None else values[rows]).astype(np.float64)
+
+
+def stratified_sample(df: pd.DataFrame, n: int, spec: FilterSpec = None, by: str = None, seed=0) -> np.ndarray:
+    """
+    Return the positions of about n rows kept by a filter, sampled per stratum.
+
+    Each value of ``by`` gets a share of the sample proportional to its
+    size, and at least one row, so rare groups (e.g. defaulters) still
+    show up. The sample is deterministic for a given seed.
+
+    Args:
+        df (pd.DataFrame): The full dataset from ``load_dataset``.
+        n (int): Approximate sample size.
+        spec (FilterSpec, optional): Filter to apply; all rows if None.
+        by (str, optional): Column to stratify on; a plain random sample if None.
+        seed (int): Seed of the random generator.
+
+    Returns:
+        np.ndarray: Sorted row positions.
+    """
+    rows = filtered_rows(df, spec)
+    rows = np.arange(len(df)) if rows is None else rows
+    rng = np.random.default_rng(seed)
+    if len(rows) <= n:
+        return rows
+    if by is None:
+        return np.sort(rng.choice(rows, n, replace=False))
+    strata = df[by].to_numpy()[rows]
+    sample = []
+    for value in pd.unique(strata):
+        members = rows[strata == value]
+        size = min(len(members), max(1, round(n * len(members) / len(rows))))
+        sample.append(rng.choice(members, size, replace=False))
+    return np.sort(np.concatenate(sample))
+
+
+def draw_scatter(ax, df: pd.DataFrame, x: str, y: str, spec: FilterSpec = None, hue: str = None,
+                 cmap=None, max_points=None, sample=0, jitter=0.0, bins=SCATTER_GRID_BINS, **kwargs):
+    """
+    Scatter two columns, aggregating into a grid when there are many points.
+
+    Up to ``max_points`` rows are drawn as points with ``ax.scatter``.
+    Beyond that, the rows are aggregated into a grid drawn with
+    ``ax.pcolormesh``: the mean hue per cell (e.g. the default rate) when a
+    hue is given, else the point counts on a log scale. The drawing cost
+    then no longer grows with the data. ``sample`` adds a stratified sample
+    of that many points over the grid.
+
+    Args:
+        ax: Matplotlib axes.
+        df (pd.DataFrame): The full dataset from ``load_dataset``.
+        x (str): Column on the horizontal axis.
+        y (str): Column on the vertical axis.
+        spec (FilterSpec, optional): Filter to apply; all rows if None.
+        hue (str, optional): Numeric column coloring the points or cells.
+        cmap (optional): Colormap for the hue ("Blues" for counts if None).
+        max_points (int, optional): Threshold; SCATTER_MAX_POINTS if None.
+        sample (int): Points of the overlay sample in aggregated mode.
+        jitter (float): Uniform noise added to x for drawn points.
+        bins: Grid cells, as in ``scatter_grid``.
+        **kwargs: Passed to ``ax.scatter`` for drawn points, e.g. alpha.
+
+    Returns:
+        The mappable, for ``fig.colorbar``.
+    """
+    max_points = SCATTER_MAX_POINTS if max_points is None else max_points
+    rows = filtered_rows(df, spec)
+    if (len(df) if rows is None else len(rows)) <= max_points:
+        return _draw_points(ax, df, rows, x, y, hue, cmap, jitter, **kwargs)
+
+    grid = scatter_grid(df, x, y, spec, hue, bins)
+    if hue is None:
+        counts = np.ma.masked_equal(grid['counts'], 0)
+        mesh = ax.pcolormesh(grid['x_edges'], grid['y_edges'], counts, cmap=cmap or "Blues", norm=LogNorm())
+    else:
+        hue_values = df[hue].to_numpy()
+        mesh = ax.pcolormesh(grid['x_edges'], grid['y_edges'], np.ma.masked_invalid(grid['mean']), cmap=cmap,
+                             vmin=np.nanmin(hue_values), vmax=np.nanmax(hue_values))
+    if sample:
+        _draw_points(ax, df, stratified_sample(df, sample, spec, by=hue), x, y, hue, cmap, jitter,
+                     **{**kwargs, 's': 4, 'edgecolors': "none"})
+    return mesh
+
+
+def _draw_points(ax, df, rows, x, y, hue, cmap, jitter, **kwargs):
+    xv, yv = _column(df, x, rows), _column(df, y, rows)
+    if jitter:
+        xv = xv + np.random.default_rng(0).uniform(-jitter, jitter, size=len(xv))
+    if hue is None:
+        return ax.scatter(xv, yv, **kwargs)
+    return ax.scatter(xv, yv, c=_column(df, hue, rows), cmap=cmap, **kwargs)
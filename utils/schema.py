@@ -0,0 +1,98 @@
+import pandas as pd
+
+# ---- Declared column types for the Home Credit application files ----
+
+# Housing statistics reported as _AVG, _MODE and _MEDI variants
+BUILDING_STATS = [
+    'APARTMENTS', 'BASEMENTAREA', 'YEARS_BEGINEXPLUATATION', 'YEARS_BUILD',
+    'COMMONAREA', 'ELEVATORS', 'ENTRANCES', 'FLOORSMAX', 'FLOORSMIN',
+    'LANDAREA', 'LIVINGAPARTMENTS', 'LIVINGAREA', 'NONLIVINGAPARTMENTS',
+    'NONLIVINGAREA',
+]
+
+CATEGORICAL_COLUMNS = [
+    'NAME_CONTRACT_TYPE', 'CODE_GENDER', 'FLAG_OWN_CAR', 'FLAG_OWN_REALTY',
+    'NAME_TYPE_SUITE', 'NAME_INCOME_TYPE', 'NAME_EDUCATION_TYPE',
+    'NAME_FAMILY_STATUS', 'NAME_HOUSING_TYPE', 'OCCUPATION_TYPE',
+    'WEEKDAY_APPR_PROCESS_START', 'ORGANIZATION_TYPE', 'FONDKAPREMONT_MODE',
+    'HOUSETYPE_MODE', 'WALLSMATERIAL_MODE', 'EMERGENCYSTATE_MODE',
+]
+
+# 0/1 indicator columns, always present in application_train.csv
+FLAG_COLUMNS = (
+    ['TARGET', 'FLAG_MOBIL', 'FLAG_EMP_PHONE', 'FLAG_WORK_PHONE', 'FLAG_CONT_MOBILE',
+     'FLAG_PHONE', 'FLAG_EMAIL', 'REG_REGION_NOT_LIVE_REGION', 'REG_REGION_NOT_WORK_REGION',
+     'LIVE_REGION_NOT_WORK_REGION', 'REG_CITY_NOT_LIVE_CITY', 'REG_CITY_NOT_WORK_CITY',
+     'LIVE_CITY_NOT_WORK_CITY']
+    + [f'FLAG_DOCUMENT_{i}' for i in range(2, 22)]
+)
+
+# Columns that are complete in application_train.csv and fit in a small integer
+INTEGER_COLUMNS = {
+    'SK_ID_CURR': 'int32',
+    'CNT_CHILDREN': 'int8',
+    'DAYS_BIRTH': 'int32',
+    'DAYS_EMPLOYED': 'int32',
+    'DAYS_ID_PUBLISH': 'int32',
+    'REGION_RATING_CLIENT': 'int8',
+    'REGION_RATING_CLIENT_W_CITY': 'int8',
+    'HOUR_APPR_PROCESS_START': 'int8',
+}
+
+# float32 keeps ~7 significant digits: enough for money amounts, scores and counts
+FLOAT32_COLUMNS = (
+    ['AMT_INCOME_TOTAL', 'AMT_CREDIT', 'AMT_ANNUITY', 'AMT_GOODS_PRICE',
+     'REGION_POPULATION_RELATIVE', 'DAYS_REGISTRATION', 'DAYS_LAST_PHONE_CHANGE',
+     'OWN_CAR_AGE', 'CNT_FAM_MEMBERS', 'EXT_SOURCE_1', 'EXT_SOURCE_2', 'EXT_SOURCE_3',
+     'TOTALAREA_MODE', 'OBS_30_CNT_SOCIAL_CIRCLE', 'DEF_30_CNT_SOCIAL_CIRCLE',
+     'OBS_60_CNT_SOCIAL_CIRCLE', 'DEF_60_CNT_SOCIAL_CIRCLE']
+    + [f'AMT_REQ_CREDIT_BUREAU_{p}' for p in ['HOUR', 'DAY', 'WEEK', 'MON', 'QRT', 'YEAR']]
+    + [f'{stat}_{agg}' for stat in BUILDING_STATS for agg in ['AVG', 'MODE', 'MEDI']]
+)
+
+DTYPES = {
+    **{col: 'category' for col in CATEGORICAL_COLUMNS},
+    **{col: 'int8' for col in FLAG_COLUMNS},
+    **INTEGER_COLUMNS,
+    **{col: 'float32' for col in FLOAT32_COLUMNS},
+}
+
+# Over 60% missing in application_train.csv, so always removed by the missing-value
+# drop in load_and_preprocess. That file is read without them (see
+# load_data.skipped_columns); any other file is parsed in full.
+SPARSE_COLUMNS = frozenset(
+    ['OWN_CAR_AGE', 'FONDKAPREMONT_MODE']
+    + [f'{stat}_{agg}' for stat in ['COMMONAREA', 'NONLIVINGAPARTMENTS', 'LIVINGAPARTMENTS',
+                                   'FLOORSMIN', 'YEARS_BUILD']
+       for agg in ['AVG', 'MODE', 'MEDI']]
+)
+
+
+def read_application_csv(file_path, chunksize=None, skip_columns=frozenset()):
+    """
+    Read an application CSV with the declared column types.
+
+    Columns not declared here (e.g. in a custom upload) keep pandas'
+    inferred types, except that string columns become categories.
+
+    Args:
+        file_path: A CSV path or file-like object.
+        chunksize (int, optional): If given, return an iterator of DataFrames
+            with at most this many rows instead of one DataFrame.
+        skip_columns (frozenset, optional): Columns never parsed.
+
+    Returns:
+        pd.DataFrame | Iterator[pd.DataFrame]: The typed DataFrame(s).
+    """
+    reader = pd.read_csv(file_path, dtype=DTYPES, usecols=lambda col: col not in skip_columns,
+                         chunksize=chunksize)
+    if chunksize is None:
+        return _strings_to_categories(reader)
+    return (_strings_to_categories(chunk) for chunk in reader)
+
+
+def _strings_to_categories(df):
+    strings = df.select_dtypes(include="object").columns
+    if len(strings):
+        df[strings] = df[strings].astype("category")
+    return df
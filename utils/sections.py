@@ -0,0 +1,31 @@
+import streamlit as st
+
+
+def lazy_section(title: str, body, key: str, expanded=False):
+    """
+    Display a collapsible section that only runs its charts while open.
+
+    The section is a Streamlit fragment headed by a toggle: opening or
+    closing it, or using a widget inside it, reruns just the section,
+    not the page. A closed section costs nothing on page reruns (e.g. a
+    filter change), and an open one redraws only the charts whose inputs
+    changed, since the rest come from the chart cache. Whether a section
+    is open is kept in the session, so it survives page switches.
+
+    Args:
+        title (str): Label of the toggle heading the section.
+        body (callable): Draws the section's content; takes no arguments.
+        key (str): Unique name of the section, e.g. "overview/distributions".
+        expanded (bool): Whether the section starts open.
+    """
+    state_key = f"section_open/{key}"
+    st.session_state.setdefault(state_key, expanded)
+
+    @st.fragment
+    def section():
+        is_open = st.toggle(f"**{title}**", value=st.session_state[state_key], key=f"section_toggle/{key}")
+        st.session_state[state_key] = is_open
+        if is_open:
+            body()
+
+    section()
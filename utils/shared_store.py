@@ -0,0 +1,319 @@
+import atexit
+import contextlib
+import glob
+import hashlib
+import mmap
+import os
+import pickle
+import shutil
+import sys
+
+try:
+    import fcntl
+except ImportError:  # Not on Windows; shared mode is for POSIX hosts, e.g. with /dev/shm
+    fcntl = None
+
+import numpy as np
+import pandas as pd
+
+# Directory datasets are published to, e.g. /dev/shm/home-credit; unset, every process keeps its own copy
+SHARED_DIR = os.environ.get("HOME_CREDIT_SHARED_DIR")
+
+# Published buffers start at multiples of this, so the mapped arrays are aligned
+BUFFER_ALIGNMENT = 64
+
+# File naming the generation new workers attach to; replaced atomically on publish
+CURRENT_FILE = "CURRENT"
+
+DATASET_FILE = "dataset.bin"
+
+# Part of every generation's name: the pickles are only read back with the same pandas and numpy
+RUNTIME_STAMP = hashlib.md5(f"{pd.__version__} {np.__version__}".encode()).hexdigest()[:8]
+
+# Generations this process holds a reference to, removed at exit
+_attached = set()
+
+
+def shared_enabled() -> bool:
+    """Whether datasets are published to and attached from SHARED_DIR."""
+    return bool(SHARED_DIR)
+
+
+def write_shared(path: str, obj):
+    """
+    Write an object so that ``read_shared`` maps its arrays instead of copying them.
+
+    The object is pickled (protocol 5) with its numpy buffers out of band,
+    and the buffers are written after the pickle, aligned. The file is
+    written under a temporary name and renamed into place.
+    """
+    buffers = []
+    payload = pickle.dumps(obj, protocol=5, buffer_callback=buffers.append)
+    raw = [buffer.raw() for buffer in buffers]
+    header = pickle.dumps((payload, [len(part) for part in raw]))
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(len(header).to_bytes(8, "little"))
+            f.write(header)
+            for part in raw:
+                f.write(b"\0" * (-f.tell() % BUFFER_ALIGNMENT))
+                f.write(part)
+        os.replace(tmp_path, path)
+    except BaseException:
+        _remove(tmp_path)
+        raise
+
+
+def read_shared(path: str):
+    """
+    Load an object written by ``write_shared``, its numpy arrays mapped from the file.
+
+    The arrays are read-only views of the mapping, so every process
+    reading the file shares one copy of its pages. The mapping stays
+    valid after the file is removed.
+    """
+    with open(path, "rb") as f:
+        view = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+    size = int.from_bytes(view[:8], "little")
+    payload, sizes = pickle.loads(view[8:8 + size])
+    position, buffers = 8 + size, []
+    for size in sizes:
+        position += -position % BUFFER_ALIGNMENT
+        buffers.append(view[position:position + size])
+        position += size
+    return pickle.loads(payload, buffers=buffers)
+
+
+class SharedGeneration:
+    """
+    One published dataset: its preprocessed frame and the artifacts built from it.
+
+    A generation is a directory of SHARED_DIR named after the source
+    digest, pipeline version and RUNTIME_STAMP. Files are only added
+    to it, under temporary names renamed into place, so readers never
+    see a partial file. Each process attached to it holds a reference (a
+    file named after its pid under ``refs/``); ``collect_garbage`` only
+    removes generations that are not current and have no live process
+    attached.
+
+    Attributes:
+        path (str): The generation's directory.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    @classmethod
+    def of(cls, digest: str, version: str) -> "SharedGeneration":
+        """Return the generation of a source digest and pipeline version (published or not)."""
+        return cls(os.path.join(SHARED_DIR, f"{digest[:16]}-{version}-{RUNTIME_STAMP}"))
+
+    @property
+    def name(self) -> str:
+        """Directory name, as written to CURRENT."""
+        return os.path.basename(self.path)
+
+    def exists(self) -> bool:
+        """Whether the generation has been published."""
+        return os.path.exists(os.path.join(self.path, DATASET_FILE))
+
+    def attach(self) -> pd.DataFrame:
+        """
+        Reference the generation from this process and map its frame.
+
+        Returns:
+            pd.DataFrame: The published frame, with read-only columns
+            backed by the shared files; attrs["shared_generation"] is
+            the generation's path.
+        """
+        with _store_lock(exclusive=False):
+            return self._attach()
+
+    def _attach(self):
+        # Under the store lock, so the generation cannot be collected before it is referenced
+        open(os.path.join(self.path, "refs", str(os.getpid())), "w").close()
+        _attached.add(self.path)
+        df = read_shared(os.path.join(self.path, DATASET_FILE))
+        df.attrs["shared_generation"] = self.path
+        return df
+
+    def artifact(self, name: str, build):
+        """
+        Return a published artifact, building and publishing it first if needed.
+
+        The first process to ask builds it while the others wait for it,
+        then every process maps the same file.
+
+        Args:
+            name (str): File name of the artifact, e.g. "filter_index".
+            build (callable): Builds it; takes no arguments.
+        """
+        path = os.path.join(self.path, f"{name}.bin")
+        if not os.path.exists(path):
+            with _locked(os.path.join(self.path, f"{name}.lock")):
+                if not os.path.exists(path):
+                    write_shared(path, build())
+        return read_shared(path)
+
+    def live_references(self) -> list:
+        """Return the pids of the live processes attached, dropping the references of dead ones."""
+        pids = []
+        for ref in glob.glob(os.path.join(self.path, "refs", "*")):
+            pid = int(os.path.basename(ref))
+            if _alive(pid):
+                pids.append(pid)
+            else:
+                _remove(ref)
+        return pids
+
+
+def publish(digest: str, version: str, build) -> pd.DataFrame:
+    """
+    Publish a dataset to SHARED_DIR, unless it is already there, make it current and attach it.
+
+    Only one process publishes at a time; the others wait and find the
+    generation published. The frame is written into a temporary
+    directory renamed into place, then CURRENT is replaced, so other
+    processes see either the old generation or the complete new one.
+    The generation is attached before the store lock is released, so
+    another process cannot collect it in between.
+
+    Args:
+        digest (str): Content hash of the source.
+        version (str): Preprocessing version.
+        build (callable): Returns the preprocessed frame; only called if
+            the generation is not published yet.
+
+    Returns:
+        pd.DataFrame: The published frame (see ``SharedGeneration.attach``).
+    """
+    generation = SharedGeneration.of(digest, version)
+    with _store_lock(exclusive=True):
+        if not generation.exists():
+            tmp_path = f"{generation.path}.{os.getpid()}.tmp"
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            os.makedirs(os.path.join(tmp_path, "refs"))
+            try:
+                write_shared(os.path.join(tmp_path, DATASET_FILE), build())
+                os.replace(tmp_path, generation.path)
+            except BaseException:
+                shutil.rmtree(tmp_path, ignore_errors=True)
+                raise
+        current_tmp = os.path.join(SHARED_DIR, f"{CURRENT_FILE}.{os.getpid()}.tmp")
+        with open(current_tmp, "w") as f:
+            f.write(generation.name)
+        os.replace(current_tmp, os.path.join(SHARED_DIR, CURRENT_FILE))
+        _collect_garbage()
+        return generation._attach()
+
+
+def current_generation():
+    """Return the SharedGeneration last published, or None if there is none."""
+    try:
+        with open(os.path.join(SHARED_DIR, CURRENT_FILE)) as f:
+            return SharedGeneration(os.path.join(SHARED_DIR, f.read().strip()))
+    except (OSError, TypeError):
+        return None
+
+
+def shared_dataset(digest: str, version: str, build) -> pd.DataFrame:
+    """
+    Attach the published dataset of a source, publishing it first if no process has.
+
+    Args:
+        digest (str): Content hash of the source.
+        version (str): Preprocessing version.
+        build (callable): Returns the preprocessed frame (see ``publish``).
+
+    Returns:
+        pd.DataFrame: The frame mapped from shared memory (see ``SharedGeneration.attach``).
+    """
+    generation = SharedGeneration.of(digest, version)
+    try:
+        return generation.attach()
+    except FileNotFoundError:
+        return publish(digest, version, build)  # Not published yet, or collected since
+
+
+def shared_artifact(df: pd.DataFrame, name: str, build):
+    """
+    Return an object built from a dataset, shared between processes when the dataset is.
+
+    For a frame from ``shared_dataset``, the object is published next to
+    it (see ``SharedGeneration.artifact``), so it is built once per host
+    rather than once per process. It must not hold a reference to the
+    frame. Otherwise it is just ``build(df)``.
+
+    Args:
+        df (pd.DataFrame): The full dataset from ``load_dataset``.
+        name (str): Name of the artifact, e.g. "filter_index".
+        build (callable): Builds it from df, e.g. FilterIndex.
+    """
+    path = df.attrs.get("shared_generation")
+    if path is None:
+        return build(df)
+    return SharedGeneration(path).artifact(f"{name}-{_source_stamp(build)}", lambda: build(df))
+
+
+def collect_garbage():
+    """Remove the generations that are not current and have no live process attached."""
+    with _store_lock(exclusive=True):
+        _collect_garbage()
+
+
+def _collect_garbage():
+    current = current_generation()
+    for path in glob.glob(os.path.join(SHARED_DIR, "*")):
+        if not os.path.isdir(path):
+            continue
+        if path.endswith(".tmp"):
+            # A publisher that died mid-write; live publishers hold the store lock
+            shutil.rmtree(path, ignore_errors=True)
+        elif (current is None or path != current.path) and not SharedGeneration(path).live_references():
+            shutil.rmtree(path, ignore_errors=True)
+
+
+@contextlib.contextmanager
+def _locked(path, exclusive=True):
+    with open(path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _store_lock(exclusive):
+    # Publishing and collecting are exclusive; attaching only excludes them
+    os.makedirs(SHARED_DIR, mode=0o700, exist_ok=True)
+    return _locked(os.path.join(SHARED_DIR, ".lock"), exclusive)
+
+
+def _source_stamp(function):
+    # Artifacts are pickles of objects defined next to their builder, so a code change must not reuse them
+    with open(sys.modules[function.__module__].__file__, "rb") as f:
+        return hashlib.md5(f.read()).hexdigest()[:8]
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+@atexit.register
+def _release():
+    for path in _attached:
+        _remove(os.path.join(path, "refs", str(os.getpid())))
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
@@ -0,0 +1,138 @@
+import glob
+import os
+
+import pandas as pd
+import pyarrow as pa
+
+# Where preprocessed snapshots are kept; override with HOME_CREDIT_SNAPSHOT_DIR
+SNAPSHOT_DIR = os.environ.get("HOME_CREDIT_SNAPSHOT_DIR", ".snapshots")
+
+# Oldest snapshots beyond this count are removed when a new one is written
+MAX_SNAPSHOTS = 8
+
+
+def snapshot_path(digest: str, version: str) -> str:
+    """Return the snapshot file path for a source digest and pipeline version."""
+    return os.path.join(SNAPSHOT_DIR, f"{digest[:16]}-{version}.arrow")
+
+
+def read_snapshot(digest: str, version: str):
+    """
+    Memory-map a preprocessed snapshot written by ``write_snapshot``.
+
+    Numeric columns are returned zero-copy, backed by the mapped file.
+
+    Args:
+        digest (str): Content hash of the source CSV.
+        version (str): Preprocessing version the snapshot must match.
+
+    Returns:
+        pd.DataFrame | None: The snapshot, or None if it is missing, stale or
+        unreadable.
+    """
+    path = snapshot_path(digest, version)
+    if not os.path.exists(path):
+        return None
+
+    try:
+        reader = pa.ipc.open_file(pa.memory_map(path, "r"))
+        metadata = reader.schema.metadata or {}
+        if (metadata.get(b"source_digest") != digest.encode()
+                or metadata.get(b"preprocess_version") != version.encode()):
+            return None
+        table = reader.read_all()
+    except (OSError, pa.ArrowInvalid):
+        return None
+
+    return table.to_pandas(split_blocks=True)
+
+
+def write_snapshot(df: pd.DataFrame, digest: str, version: str) -> str:
+    """
+    Write a preprocessed DataFrame as an uncompressed Arrow IPC file.
+
+    The file is stamped with the source digest and preprocessing version and
+    is written atomically, so readers never see a partial snapshot.
+
+    Args:
+        df (pd.DataFrame): The preprocessed DataFrame.
+        digest (str): Content hash of the source CSV.
+        version (str): Version of the preprocessing pipeline that produced df.
+
+    Returns:
+        str: Path of the written snapshot.
+    """
+    with SnapshotWriter(digest, version) as writer:
+        writer.write(df)
+    return writer.path
+
+
+class SnapshotWriter:
+    """
+    Write a snapshot incrementally, one DataFrame chunk at a time.
+
+    Every chunk must have the same columns and dtypes (including the same
+    categories for categorical columns). The snapshot only replaces an
+    existing one once the writer is closed without an error.
+
+    Usage:
+        with SnapshotWriter(digest, version) as writer:
+            for chunk in chunks:
+                writer.write(chunk)
+    """
+
+    def __init__(self, digest: str, version: str):
+        self.digest = digest
+        self.version = version
+        self.path = snapshot_path(digest, version)
+        self._tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        self._schema = None
+        self._sink = None
+        self._writer = None
+
+    def write(self, df: pd.DataFrame):
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        if self._writer is None:
+            self._schema = table.schema.with_metadata({
+                **(table.schema.metadata or {}),
+                b"source_digest": self.digest.encode(),
+                b"preprocess_version": self.version.encode(),
+            })
+            os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+            self._sink = pa.OSFile(self._tmp_path, "wb")
+            self._writer = pa.ipc.new_file(self._sink, self._schema)
+        self._writer.write_table(table.replace_schema_metadata(self._schema.metadata))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._writer is None:
+            return False
+        self._writer.close()
+        self._sink.close()
+        if exc_type is not None:
+            _remove(self._tmp_path)
+            return False
+        os.replace(self._tmp_path, self.path)
+        _prune_snapshots(self.digest, self.path)
+        return False
+
+
+def _prune_snapshots(digest: str, keep: str):
+    # Drop snapshots of this source from older pipeline versions, then the oldest overall
+    snapshots = glob.glob(os.path.join(SNAPSHOT_DIR, "*.arrow"))
+    for path in snapshots:
+        if path != keep and os.path.basename(path).startswith(digest[:16]):
+            _remove(path)
+
+    snapshots = sorted(glob.glob(os.path.join(SNAPSHOT_DIR, "*.arrow")), key=os.path.getmtime)
+    for path in snapshots[:-MAX_SNAPSHOTS]:
+        _remove(path)
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
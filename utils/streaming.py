@@ -0,0 +1,226 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from utils.load_data import (
+    INCOME_BRACKETS, MISSING_THRESHOLD, RARE_LABEL, RARE_THRESHOLD, WINSORIZE_COLUMNS,
+    WINSORIZE_LIMITS, add_features, add_income_bracket, category_counts, impute_missing,
+    merge_rare_categories, skipped_columns, winsorize,
+)
+from utils.schema import read_application_csv
+from utils.snapshot import SnapshotWriter
+
+# Rows per chunk; peak memory is a few chunks' worth whatever the file size
+CHUNK_ROWS = 100_000
+
+# Files larger than this are preprocessed out of core by load_dataset
+STREAMING_THRESHOLD_BYTES = int(os.environ.get("HOME_CREDIT_STREAMING_BYTES", 1 << 30))
+
+
+class QuantileSketch:
+    """
+    Mergeable, memory-bounded summary of a numeric column's distribution.
+
+    Value counts are kept exactly while the column has at most ``max_exact``
+    distinct values, so medians of flags, counts and day columns are exact.
+    Past that, values are snapped to log-spaced buckets and every quantile is
+    within ``relative_accuracy`` of the true value; the number of buckets
+    depends only on the range of the data, not on the number of rows.
+    """
+
+    def __init__(self, relative_accuracy=0.001, max_exact=4096):
+        self.relative_accuracy = relative_accuracy
+        self.max_exact = max_exact
+        self.exact = True
+        self.counts = pd.Series(dtype="float64")
+
+    @property
+    def count(self) -> float:
+        return self.counts.sum()
+
+    def update(self, values):
+        values = np.asarray(values, dtype="float64")
+        values = values[~np.isnan(values)]
+        if not self.exact:
+            values = self._bucket(values)
+        keys, counts = np.unique(values, return_counts=True)
+        self._add(pd.Series(counts, index=keys, dtype="float64"))
+
+    def merge(self, other: "QuantileSketch"):
+        counts = other.counts
+        if not other.exact and self.exact:
+            self._collapse()
+        elif other.exact and not self.exact:
+            counts = self._rebucket(counts)
+        self._add(counts)
+
+    def with_value(self, value, count) -> "QuantileSketch":
+        """Return a copy with ``count`` more occurrences of ``value``, e.g. imputed rows."""
+        sketch = QuantileSketch(self.relative_accuracy, self.max_exact)
+        sketch.merge(self)
+        if count:
+            key = value if sketch.exact else sketch._bucket(np.array([value]))[0]
+            sketch._add(pd.Series([float(count)], index=[key]))
+        return sketch
+
+    def quantile(self, q):
+        """Linearly interpolated quantile(s), as Series.quantile computes them."""
+        counts = self.counts.sort_index()
+        keys = counts.index.to_numpy()
+        cumulative = np.cumsum(counts.to_numpy())
+        position = (cumulative[-1] - 1) * np.asarray(q, dtype="float64")
+        below, above = np.floor(position), np.ceil(position)
+        low = keys[np.searchsorted(cumulative, below, side="right")]
+        high = keys[np.searchsorted(cumulative, above, side="right")]
+        return low + (high - low) * (position - below)
+
+    def _add(self, counts):
+        self.counts = self.counts.add(counts, fill_value=0)
+        if self.exact and len(self.counts) > self.max_exact:
+            self._collapse()
+
+    def _collapse(self):
+        self.exact = False
+        self.counts = self._rebucket(self.counts)
+
+    def _rebucket(self, counts):
+        return counts.groupby(self._bucket(counts.index.to_numpy())).sum()
+
+    def _bucket(self, values):
+        gamma = (1 + self.relative_accuracy) / (1 - self.relative_accuracy)
+        magnitude = np.abs(values)
+        with np.errstate(divide="ignore"):
+            exponent = np.ceil(np.log(magnitude) / np.log(gamma))
+        centers = np.sign(values) * 2 * gamma ** exponent / (gamma + 1)
+        return np.where(magnitude > 0, centers, 0.0)
+
+
+def fit_in_chunks(file_path, chunksize=CHUNK_ROWS) -> dict:
+    """
+    First pass: stream the CSV once and fit every preprocessing parameter.
+
+    Only mergeable statistics are kept between chunks (missing counts,
+    category counts and one QuantileSketch per numeric column), so memory
+    does not grow with the number of rows.
+
+    Args:
+        file_path: Path of the application CSV.
+        chunksize (int): Rows per chunk.
+
+    Returns:
+        dict: Parameters for ``transform_chunk``.
+    """
+    rows = 0
+    missing = pd.Series(dtype="float64")
+    sketches = {}
+    categories = {}
+    dtypes = {}
+
+    for chunk in read_application_csv(file_path, chunksize=chunksize, skip_columns=skipped_columns(file_path)):
+        chunk = add_features(chunk)
+        rows += len(chunk)
+        missing = missing.add(chunk.isnull().sum(), fill_value=0)
+
+        categorical = chunk.select_dtypes(include="category").columns
+        for col, counts in category_counts(chunk, categorical).items():
+            counts = pd.Series(counts, index=chunk[col].cat.categories.astype(object), dtype="float64")
+            categories[col] = counts.add(categories[col], fill_value=0) if col in categories else counts
+
+        for col in chunk.columns.drop(categorical):
+            dtypes[col] = np.result_type(dtypes.get(col, chunk[col].dtype), chunk[col].dtype)
+            sketches.setdefault(col, QuantileSketch()).update(chunk[col].to_numpy())
+
+    missing_pct = missing / rows * 100
+    drop = missing_pct.index[missing_pct > MISSING_THRESHOLD]
+    categories = {col: counts.sort_index() for col, counts in categories.items() if col not in drop}
+    sketches = {col: sketch for col, sketch in sketches.items() if col not in drop}
+
+    # ---- Imputation: medians from the sketches, modes from the category counts ----
+    fill_values = {}
+    for col in missing.index[missing > 0].drop(drop, errors="ignore"):
+        if col in sketches:
+            fill_values[col] = float(sketches[col].quantile(0.5))
+        else:
+            fill_values[col] = categories[col].idxmax()  # first category on ties, like mode()[0]
+
+    # ---- Rare categories, counted after imputation ----
+    labels = {}
+    for col, counts in categories.items():
+        if col in fill_values:
+            counts = counts.copy()
+            counts[fill_values[col]] += missing[col]
+        freqs = counts / rows
+        labels[col] = pd.Series(np.where(freqs < RARE_THRESHOLD, RARE_LABEL, counts.index), index=counts.index)
+    merged = {col: sorted(set(labels[col][categories[col] > 0])) for col in labels}
+
+    # ---- Winsorizing bounds and income quartiles, on imputed values ----
+    imputed = {col: sketches[col].with_value(fill_values.get(col), missing[col])
+               for col in WINSORIZE_COLUMNS}
+    bounds = pd.DataFrame({col: imputed[col].quantile(list(WINSORIZE_LIMITS)) for col in WINSORIZE_COLUMNS},
+                          index=list(WINSORIZE_LIMITS))
+    lower, upper = bounds['AMT_INCOME_TOTAL']
+    quartiles = np.clip(imputed['AMT_INCOME_TOTAL'].quantile([0.25, 0.75]), lower, upper)
+
+    return {
+        "rows": rows,
+        "drop": list(drop),
+        "categories": {col: list(counts.index) for col, counts in categories.items()},
+        "fill_values": fill_values,
+        "labels": labels,
+        "merged_categories": merged,
+        "bounds": bounds,
+        "quartiles": quartiles,
+        "dtypes": {col: dtype for col, dtype in dtypes.items() if col not in drop},
+    }
+
+
+def transform_chunk(chunk: pd.DataFrame, params: dict) -> pd.DataFrame:
+    """
+    Second pass: apply the fitted preprocessing to one chunk.
+
+    Every transformed chunk has the same columns, dtypes and categories, so
+    chunks can be appended to one columnar file.
+    """
+    chunk = add_features(chunk).drop(columns=params["drop"])
+    for col, categories in params["categories"].items():
+        chunk[col] = chunk[col].cat.set_categories(categories)
+    chunk = impute_missing(chunk, params["fill_values"])
+    chunk = merge_rare_categories(chunk, params["labels"])
+    for col, categories in params["merged_categories"].items():
+        chunk[col] = chunk[col].cat.set_categories(categories)
+    chunk = winsorize(chunk, params["bounds"])
+    chunk = add_income_bracket(chunk, params["quartiles"])
+    chunk['INCOME_BRACKET'] = chunk['INCOME_BRACKET'].cat.set_categories(INCOME_BRACKETS)
+    return chunk.astype(params["dtypes"])
+
+
+def preprocess_in_chunks(file_path, digest: str, version: str, chunksize=CHUNK_ROWS) -> str:
+    """
+    Preprocess a CSV of any size into a snapshot, never holding it in memory.
+
+    Runs ``fit_in_chunks`` and then streams the file a second time, writing
+    each transformed chunk to the Arrow snapshot for ``digest``. Medians and
+    quantiles come from sketches, so they can differ slightly from
+    ``load_and_preprocess`` on columns with many distinct values.
+
+    Args:
+        file_path: Path of the application CSV.
+        digest (str): Content hash of the CSV.
+        version (str): Preprocessing version to stamp on the snapshot.
+        chunksize (int): Rows per chunk.
+
+    Returns:
+        str: Path of the written snapshot.
+    """
+    params = fit_in_chunks(file_path, chunksize)
+    with SnapshotWriter(digest, version) as writer:
+        for chunk in read_application_csv(file_path, chunksize=chunksize,
+                                          skip_columns=skipped_columns(file_path)):
+            writer.write(transform_chunk(chunk, params))
+    return writer.path
+
+
+def should_stream(source) -> bool:
+    """Return True for file paths too large to preprocess in memory."""
+    return isinstance(source, (str, os.PathLike)) and os.path.getsize(source) > STREAMING_THRESHOLD_BYTES
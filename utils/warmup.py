@@ -0,0 +1,187 @@
+import os
+import threading
+from collections import Counter
+from dataclasses import dataclass
+
+import pandas as pd
+import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+from utils.boxplots import grouped_box_stats
+from utils.correlation import corr_stats, correlation
+from utils.cube import dataset_cube
+from utils.density import joint_density, violin_densities
+from utils.drivers import driver_ranking
+from utils.filter_index import filter_index
+from utils.filter_spec import FilterSpec
+from utils.histograms import histogram
+from utils.kpis import FINANCIAL_KPIS, OVERVIEW_KPIS, approximate_kpis
+from utils.scatter import SCATTER_GRID_BINS, scatter_grid
+
+# Set HOME_CREDIT_WARMUP=0 to compute everything on demand instead
+WARMUP_ENABLED = os.environ.get("HOME_CREDIT_WARMUP", "1") != "0"
+
+# Pages in the order they are warmed until visits have been counted
+PAGES = ['overview', 'risk', 'demographics', 'financial', 'correlations']
+
+
+@dataclass(frozen=True)
+class WarmupTask:
+    """
+    One artifact to precompute.
+
+    Attributes:
+        page (str): Page that shows it (a PAGES entry), or None if all pages use it.
+        name (str): Description, e.g. "histogram AGE_YEARS".
+        compute (callable): Computes it through its cached function; takes no arguments.
+    """
+
+    page: str
+    name: str
+    compute: object
+
+
+def warmup_tasks(df: pd.DataFrame) -> list:
+    """
+    Return the WarmupTasks of a dataset: what the pages compute with the default (empty) filters.
+
+    Each task calls the same cached function, with the same arguments, as
+    the page, so what it computes is what the page looks up.
+    """
+    spec = FilterSpec()
+
+    def kpis(names):
+        values, _, pending = approximate_kpis(df, df, spec, names)  # The empty spec keeps every row
+        return values if pending is None else pending.result()
+
+    tasks = [
+        (None, "filter index", lambda: filter_index(df)),
+        (None, "cube", lambda: dataset_cube(df)),
+        (None, "histograms", lambda: histogram(df, 'AGE_YEARS')),
+        ('overview', "overview KPIs", lambda: kpis(OVERVIEW_KPIS)),
+        ('risk', "box AMT_INCOME_TOTAL by TARGET",
+         lambda: grouped_box_stats(df, 'AMT_INCOME_TOTAL', by='TARGET', spec=spec)),
+        ('risk', "box AMT_CREDIT by TARGET", lambda: grouped_box_stats(df, 'AMT_CREDIT', by='TARGET', spec=spec)),
+        ('risk', "violins AGE_YEARS by TARGET", lambda: violin_densities(df, 'AGE_YEARS', by='TARGET', spec=spec)),
+        ('demographics', "box AGE_YEARS by TARGET", lambda: grouped_box_stats(df, 'AGE_YEARS', by='TARGET', spec=spec)),
+        ('demographics', "correlation statistics", lambda: corr_stats(df)),
+        ('financial', "financial KPIs", lambda: kpis(FINANCIAL_KPIS)),
+        ('financial', "density AMT_INCOME_TOTAL x AMT_CREDIT",
+         lambda: joint_density(df, 'AMT_INCOME_TOTAL', 'AMT_CREDIT', spec)),
+        ('correlations', "unfiltered correlations", lambda: correlation(df, spec=spec)),
+        ('correlations', "drivers", lambda: driver_ranking(df, spec)),
+        ('correlations', "box AMT_CREDIT by NAME_EDUCATION_TYPE",
+         lambda: grouped_box_stats(df, 'AMT_CREDIT', by='NAME_EDUCATION_TYPE', spec=spec)),
+        ('correlations', "box AMT_INCOME_TOTAL by NAME_FAMILY_STATUS",
+         lambda: grouped_box_stats(df, 'AMT_INCOME_TOTAL', by='NAME_FAMILY_STATUS', spec=spec)),
+    ]
+    for column in ['AMT_INCOME_TOTAL', 'AMT_CREDIT']:
+        tasks.append(('overview', f"box {column}", lambda column=column: grouped_box_stats(df, column, spec=spec)))
+
+    # Scatters are only aggregated (and their grids used) beyond SCATTER_MAX_POINTS rows; the grids are cheap
+    scatters = [('financial', 'AMT_INCOME_TOTAL', 'AMT_CREDIT'), ('financial', 'AMT_INCOME_TOTAL', 'AMT_ANNUITY'),
+                ('correlations', 'AGE_YEARS', 'AMT_CREDIT'), ('correlations', 'AGE_YEARS', 'AMT_INCOME_TOTAL')]
+    for page, x, y in scatters:
+        tasks.append((page, f"scatter {x} x {y}", lambda x=x, y=y: scatter_grid(df, x, y, spec, hue='TARGET')))
+    tasks.append(('correlations', "scatter EMPLOYMENT_YEARS x TARGET",
+                  lambda: scatter_grid(df, 'EMPLOYMENT_YEARS', 'TARGET', spec,
+                                       bins=(SCATTER_GRID_BINS, (-0.25, 0.25, 0.75, 1.25)))))
+    return [WarmupTask(*task) for task in tasks]
+
+
+class WarmupScheduler:
+    """
+    Precompute a dataset's shared artifacts on a background thread.
+
+    Tasks call the cached functions the pages call, so a page asking for
+    an artifact being warmed waits for that computation (Streamlit holds
+    a lock per cache key) instead of starting its own, and finds the
+    finished ones in the cache. The tasks all pages share go first, then
+    each page's, most visited page first. The next task is picked when
+    the previous one finishes, so a page visited meanwhile moves up.
+
+    A failed task is skipped: the page computes it again and shows the error.
+
+    Attributes:
+        done (list): Names of the finished tasks, in order.
+        failed (dict): Name -> exception of the failed tasks.
+    """
+
+    def __init__(self, tasks, visits: Counter = None):
+        self.visits = Counter() if visits is None else visits
+        self.done = []
+        self.failed = {}
+        self._pending = list(tasks)
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="warmup", daemon=True)
+
+    def start(self) -> "WarmupScheduler":
+        """Start the background thread, attached to the current script run if there is one."""
+        ctx = get_script_run_ctx(suppress_warning=True)
+        if ctx is not None:
+            add_script_run_ctx(self._thread, ctx)
+        self._thread.start()
+        return self
+
+    def join(self, timeout=None) -> bool:
+        """Wait for the remaining tasks; return whether they have all run."""
+        self._thread.join(timeout)
+        return not self._thread.is_alive()
+
+    def _priority(self, task):
+        if task.page is None:
+            return (0, 0, 0)
+        rank = PAGES.index(task.page) if task.page in PAGES else len(PAGES)
+        return (1, -self.visits[task.page], rank)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._pending:
+                    return
+                task = min(self._pending, key=self._priority)
+                self._pending.remove(task)
+            try:
+                task.compute()
+            except Exception as error:
+                self.failed[task.name] = error
+            else:
+                self.done.append(task.name)
+
+    def stats(self) -> dict:
+        """Return the numbers of pending, finished and failed tasks."""
+        with self._lock:
+            return {'pending': len(self._pending), 'done': len(self.done), 'failed': len(self.failed)}
+
+
+@st.cache_resource(show_spinner=False)
+def page_visits() -> Counter:
+    """Return the process-wide count of sessions that opened each page."""
+    return Counter()
+
+
+def record_visit(page: str):
+    """Count a page's first view in the session, to warm the most visited pages first."""
+    visited = st.session_state.setdefault('visited_pages', set())
+    if page not in visited:
+        visited.add(page)
+        page_visits()[page] += 1
+
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+def _cached_warmup(digest: str, _df: pd.DataFrame) -> WarmupScheduler:
+    return WarmupScheduler(warmup_tasks(_df), page_visits()).start()
+
+
+def start_warmup(df: pd.DataFrame):
+    """
+    Start warming a dataset's caches in the background, once per dataset.
+
+    Returns:
+        WarmupScheduler: The dataset's scheduler, or None if the dataset
+        is not cached (no source digest) or warm-up is disabled.
+    """
+    digest = df.attrs.get("source_digest")
+    if digest is None or not WARMUP_ENABLED:
+        return None
+    return _cached_warmup(digest, df)